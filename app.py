@@ -1,14 +1,33 @@
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, g, Response, send_file
 import pandas as pd
 import numpy as np
 import json
 import pickle
-import xgboost as xgb
-from sklearn.preprocessing import StandardScaler
+import hashlib
 import os
+import io
 import warnings
 import re
 import random
+import time
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataset_store import DatasetStore, TARGET_COLUMN
+from intent_index import IntentIndex
+from binned_forest import bin_ensemble, compile_member
+from tree_compiler import CompiledForest, COMPILED_ARTIFACT_NAME
+from prediction_cache import PredictionCache
+from micro_batcher import MicroBatcher
+import binary_format
+from metrics import MetricsRegistry, SamplingProfiler, timed
+from preprocessing import fit_preprocessing, load_preprocessing, ARTIFACT_NAME as PREPROCESSING_ARTIFACT
+from jobs import JobManager, QueueFull
+from flow_aggregator import FlowAggregator
+from feature_pruning import ensemble_used_features
+from cascade import EarlyExitCascade, member_rounds, staged_proba
+from model_registry import ModelRegistry, resolve_model_dir
+from drift_monitor import DriftMonitor
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
@@ -16,8 +35,102 @@ app.secret_key = 'iot_device_identification_secret_key_2024'
 
 # Global variables for models and scaler
 models = []
+# Number of identical files each unique ensemble member stands for
+model_weights = []
+# Per-member load statistics printed at startup
+model_report = []
+# Ensemble member names used as metric labels
+model_names = []
 scaler = None
+# Scaler statistics in FEATURE_DTYPE, for the manual scaling paths
+scaler_mean = scaler_scale = None
+# Split-bin encoder shared by the BinnedForest members (IOT_INFERENCE_PRECISION=binned)
+feature_binner = None
 feature_columns = None
+# Reference dataset, parsed once and shared by load_model and the dataset endpoints
+dataset_store = DatasetStore()
+# 'sklearn' scores through the pickled wrappers, 'native' through Booster.inplace_predict,
+# 'compiled' through the pure-NumPy CompiledForest
+INFERENCE_BACKEND = os.environ.get('IOT_INFERENCE_BACKEND', 'sklearn')
+# Where the native/compiled backends get their trees: 'pickle' (trained model final),
+# 'json' (best_xgb_model.json) or, for 'compiled' only, 'compiled' (trained model final/compiled_forest.npz)
+BOOSTER_SOURCE = os.environ.get('IOT_BOOSTER_SOURCE', 'pickle')
+# Numeric path: 'float64' (default), 'float32' (features, scaling and probabilities stay float32)
+# or, with the compiled backend only, 'binned' (raw values map to uint8 split bins, scored by
+# BinnedForest; matches compiled exactly with less working memory)
+INFERENCE_PRECISION = os.environ.get('IOT_INFERENCE_PRECISION', 'float64')
+FEATURE_DTYPE = np.float32 if INFERENCE_PRECISION == 'float32' else np.float64
+PROBA_DTYPE = np.float32 if INFERENCE_PRECISION == 'float32' else np.float64
+# Prediction cache in front of the ensemble; IOT_CACHE_SIZE=0 (default) disables it
+CACHE_SIZE = int(os.environ.get('IOT_CACHE_SIZE', '0'))
+CACHE_TTL = float(os.environ.get('IOT_CACHE_TTL', '300'))
+# Decimals to round raw features to before hashing; unset means exact matches only
+CACHE_DECIMALS = int(os.environ['IOT_CACHE_DECIMALS']) if os.environ.get('IOT_CACHE_DECIMALS') else None
+prediction_cache = PredictionCache(CACHE_SIZE, CACHE_TTL, CACHE_DECIMALS) if CACHE_SIZE > 0 else None
+# Micro-batching of concurrent single-row predictions; IOT_MICROBATCH_WAIT_MS=0 (default) disables it
+MICROBATCH_WAIT_MS = float(os.environ.get('IOT_MICROBATCH_WAIT_MS', '0'))
+MICROBATCH_MAX_ROWS = int(os.environ.get('IOT_MICROBATCH_MAX_ROWS', '64'))
+# The lambda defers the lookup of predict_proba_rows, defined further down
+micro_batcher = (MicroBatcher(lambda X: predict_proba_rows(X), MICROBATCH_MAX_ROWS, MICROBATCH_WAIT_MS)
+                 if MICROBATCH_WAIT_MS > 0 else None)
+# Hot-path latency metrics served in Prometheus text format at /metrics
+metrics_registry = MetricsRegistry()
+request_seconds = metrics_registry.histogram('iot_request_seconds', 'HTTP request latency', ['endpoint'])
+requests_total = metrics_registry.counter('iot_requests_total', 'HTTP requests by endpoint and status', ['endpoint', 'status'])
+stage_seconds = metrics_registry.histogram('iot_stage_seconds', 'Time spent in each prediction stage', ['stage'])
+model_seconds = metrics_registry.histogram('iot_model_predict_seconds', 'predict_proba time per ensemble member', ['model'])
+predicted_rows = metrics_registry.counter('iot_predicted_rows_total', 'Rows classified', ['endpoint'])
+# Sampling profiler, controllable over HTTP only when IOT_ENABLE_PROFILER=1
+profiler = SamplingProfiler()
+PROFILER_ENABLED = os.environ.get('IOT_ENABLE_PROFILER') == '1'
+# Upper bound on rows accepted by /predict/batch in a single request
+MAX_BATCH_ROWS = 100000
+# Upper bound on /predict/batch body size, enforced before anything is parsed
+MAX_BATCH_BYTES = int(os.environ.get('IOT_MAX_BATCH_BYTES', str(256 * 1024 * 1024)))
+# Background jobs for large uploads: a small worker pool and bounded queue so /predict stays responsive
+JOBS_DIR = os.environ.get('IOT_JOBS_DIR', 'job_spool')
+JOB_WORKERS = int(os.environ.get('IOT_JOB_WORKERS', '1'))
+JOB_QUEUE_DEPTH = int(os.environ.get('IOT_JOB_QUEUE_DEPTH', '8'))
+JOB_CHUNK_SIZE = int(os.environ.get('IOT_JOB_CHUNK_SIZE', '2000'))
+JOB_RETENTION_S = float(os.environ.get('IOT_JOB_RETENTION_S', '86400'))
+job_manager = JobManager(JOBS_DIR, lambda frame: score_frame_locked(frame), JOB_WORKERS, JOB_QUEUE_DEPTH,
+                         JOB_CHUNK_SIZE, JOB_RETENTION_S)
+# Streaming per-device aggregation of packet events; built by load_model once feature_columns is known
+STREAM_WINDOW_S = float(os.environ.get('IOT_STREAM_WINDOW_S', '60'))
+STREAM_IDLE_S = float(os.environ.get('IOT_STREAM_IDLE_S', '120'))
+STREAM_MIN_PACKETS = int(os.environ.get('IOT_STREAM_MIN_PACKETS', '2'))
+flow_aggregator = None
+# Feature pruning: parse and scale only the columns the trees split on (IOT_FEATURE_PRUNING=1)
+FEATURE_PRUNING = os.environ.get('IOT_FEATURE_PRUNING') == '1'
+used_feature_idx = None
+input_columns = []
+# Early-exit cascade: score with these boosting-round prefixes first (IOT_CASCADE_ROUNDS=25,50) and stop
+# once the top-two probability margin reaches IOT_CASCADE_MARGIN; unset (default) always runs the full ensemble
+CASCADE_ROUNDS = [int(r) for r in os.environ.get('IOT_CASCADE_ROUNDS', '').split(',') if r.strip()]
+CASCADE_MARGIN = float(os.environ.get('IOT_CASCADE_MARGIN', '0.5'))
+cascade = EarlyExitCascade(CASCADE_ROUNDS, CASCADE_MARGIN) if CASCADE_ROUNDS else None
+# Hot reload: IOT_MODEL_DIR is watched every IOT_MODEL_WATCH_S seconds (0 = only on POST /models/reload,
+# which every worker follows through IOT_MODEL_DIR/.reload);
+# a new version must not lose more than IOT_RELOAD_MAX_ACCURACY_DROP holdout accuracy to be swapped in
+MODEL_ROOT = os.environ.get('IOT_MODEL_DIR', 'trained model final')
+MODEL_WATCH_S = float(os.environ.get('IOT_MODEL_WATCH_S', '0'))
+RELOAD_HOLDOUT_ROWS = int(os.environ.get('IOT_RELOAD_HOLDOUT_ROWS', '500'))
+RELOAD_MAX_ACCURACY_DROP = float(os.environ.get('IOT_RELOAD_MAX_ACCURACY_DROP', '0.05'))
+# Parallel ensemble: batches of at least IOT_PARALLEL_MIN_ROWS rows score their members concurrently
+# on IOT_PARALLEL_MEMBERS threads (0 = one member after another); xgboost releases the GIL
+PARALLEL_MEMBERS = int(os.environ.get('IOT_PARALLEL_MEMBERS', '0'))
+PARALLEL_MIN_ROWS = int(os.environ.get('IOT_PARALLEL_MIN_ROWS', '256'))
+# Drift monitoring (IOT_DRIFT_MONITOR=1): scaled vectors and predicted classes of live rows are folded
+# in batches of IOT_DRIFT_BATCH_ROWS (larger requests thinned to about IOT_DRIFT_MAX_BATCH_ROWS)
+# and compared with IOT_DRIFT_REFERENCE_ROWS reference rows
+DRIFT_MONITOR = os.environ.get('IOT_DRIFT_MONITOR') == '1'
+DRIFT_BATCH_ROWS = int(os.environ.get('IOT_DRIFT_BATCH_ROWS', '256'))
+DRIFT_MAX_BATCH_ROWS = int(os.environ.get('IOT_DRIFT_MAX_BATCH_ROWS', '512'))
+DRIFT_REFERENCE_ROWS = int(os.environ.get('IOT_DRIFT_REFERENCE_ROWS', '20000'))
+drift_monitor = None
+drift_columns = None
+# Chatbot: intents of the last IOT_CHAT_CACHE_SIZE distinct messages are memoized
+CHAT_CACHE_SIZE = int(os.environ.get('IOT_CHAT_CACHE_SIZE', '1024'))
 device_categories = [
     'baby_monitor', 'lights', 'motion_sensor', 'security_camera', 
     'smoke_detector', 'socket', 'thermostat', 'TV', 'watch'
@@ -73,158 +186,688 @@ chatbot_knowledge = {
     ]
 }
 
-def load_model():
-    """Load trained models (ensemble) from 'trained model final' ONLY and prepare feature columns"""
-    global models, scaler, feature_columns, device_categories
-    try:
-        models = []
-
-        # Enforce loading from the specific directory
-        trained_dir = os.path.join(os.getcwd(), 'trained model final')
-        if not os.path.isdir(trained_dir):
-            raise RuntimeError("Required directory 'trained model final' not found")
-
-        # Load label encoder if available to get class names
-        label_path = os.path.join(trained_dir, 'label_encoder.pkl')
-        if os.path.exists(label_path):
-            try:
-                with open(label_path, 'rb') as f:
-                    le = pickle.load(f)
-                if hasattr(le, 'classes_'):
-                    device_categories = [str(c) for c in le.classes_]
-            except Exception:
-                pass
-
-        # Load any sklearn-compatible models in directory (exclude label encoder)
-        for fname in os.listdir(trained_dir):
-            if not fname.lower().endswith('.pkl'):
-                continue
-            if 'label' in fname.lower():
+def load_ensemble_members(trained_dir):
+    """Unpickle each distinct model file once, deduplicating byte-identical files by SHA-256"""
+    members = []
+    weights = []
+    report = []
+    by_digest = {}
+
+    for fname in sorted(os.listdir(trained_dir)):
+        if not fname.lower().endswith('.pkl'):
+            continue
+        if 'label' in fname.lower():
+            continue
+        fpath = os.path.join(trained_dir, fname)
+        try:
+            start_time = time.perf_counter()
+            with open(fpath, 'rb') as f:
+                payload = f.read()
+            digest = hashlib.sha256(payload).hexdigest()
+
+            # Identical content: count it against the member already loaded
+            if digest in by_digest:
+                idx = by_digest[digest]
+                weights[idx] += 1
+                report[idx]['files'].append(fname)
                 continue
-            fpath = os.path.join(trained_dir, fname)
-            try:
-                with open(fpath, 'rb') as f:
-                    m = pickle.load(f)
-                # Must have predict_proba
-                if hasattr(m, 'predict_proba'):
-                    models.append(m)
-            except Exception:
+
+            m = pickle.loads(payload)
+            # Must have predict_proba
+            if not hasattr(m, 'predict_proba'):
                 continue
 
-        if not models:
-            raise RuntimeError("No sklearn-compatible models (.pkl with predict_proba) found in 'trained model final'")
+            booster_bytes = None
+            if hasattr(m, 'get_booster'):
+                booster_bytes = len(m.get_booster().save_raw())
+
+            by_digest[digest] = len(members)
+            members.append(m)
+            weights.append(1)
+            report.append({
+                'files': [fname],
+                'sha256': digest,
+                'file_bytes': len(payload),
+                'booster_bytes': booster_bytes,
+                'load_ms': (time.perf_counter() - start_time) * 1000
+            })
+        except Exception:
+            continue
+
+    for entry, weight in zip(report, weights):
+        entry['weight'] = weight
+    return members, weights, report
+
+def load_single_member(path, loader):
+    """Load one ensemble member from a standalone model file with the given loader"""
+    start_time = time.perf_counter()
+    with open(path, 'rb') as f:
+        payload = f.read()
+    member = loader(path)
+    report = [{
+        'files': [os.path.basename(path)],
+        'sha256': hashlib.sha256(payload).hexdigest(),
+        'file_bytes': len(payload),
+        'booster_bytes': None,
+        'load_ms': (time.perf_counter() - start_time) * 1000,
+        'weight': 1
+    }]
+    return [member], [1], report
+
+def print_model_report(report):
+    """Print the unique ensemble members with their size and load time"""
+    print(f"Ensemble members ({len(report)} unique):")
+    for entry in report:
+        size = entry['booster_bytes'] if entry['booster_bytes'] is not None else entry['file_bytes']
+        print(f"  - {', '.join(entry['files'])} (sha256 {entry['sha256'][:12]}, "
+              f"weight {entry['weight']}, {size / 1e6:.2f} MB, loaded in {entry['load_ms']:.1f} ms)")
+
+def load_model_state(trained_dir):
+    """Load one model version from trained_dir without touching the live globals; return its state dict"""
+    if not os.path.isdir(trained_dir):
+        raise RuntimeError(f"Required directory '{os.path.basename(trained_dir)}' not found")
+    if INFERENCE_PRECISION == 'binned' and INFERENCE_BACKEND != 'compiled':
+        # The NumPy tree walk is about 9x slower than xgboost; it only pays off against 'compiled'
+        raise RuntimeError("IOT_INFERENCE_PRECISION=binned requires IOT_INFERENCE_BACKEND=compiled")
+    categories = list(device_categories)
+
+    # Load label encoder if available to get class names
+    label_path = os.path.join(trained_dir, 'label_encoder.pkl')
+    if os.path.exists(label_path):
+        try:
+            with open(label_path, 'rb') as f:
+                le = pickle.load(f)
+            if hasattr(le, 'classes_'):
+                categories = [str(c) for c in le.classes_]
+        except Exception:
+            pass
+
+    json_path = os.path.join(os.getcwd(), 'best_xgb_model.json')
+    compiled_path = os.path.join(trained_dir, COMPILED_ARTIFACT_NAME)
+    if INFERENCE_BACKEND == 'native':
+        # booster_backend imports xgboost; the compiled backend must not pay for that at startup
+        from booster_backend import NativeBoosterMember, to_native_members
+    if INFERENCE_BACKEND == 'native' and BOOSTER_SOURCE == 'json':
+        # Native booster straight from the saved JSON model, no unpickling
+        members, weights, report = load_single_member(json_path, NativeBoosterMember.from_json)
+    elif INFERENCE_BACKEND == 'compiled' and BOOSTER_SOURCE == 'json':
+        members, weights, report = load_single_member(json_path, CompiledForest.from_json)
+    elif INFERENCE_BACKEND == 'compiled' and BOOSTER_SOURCE == 'compiled':
+        # Pre-compiled arrays from 'python tree_compiler.py'; needs NumPy only
+        members, weights, report = load_single_member(compiled_path, CompiledForest.load)
+    else:
+        # Load any sklearn-compatible models in directory (exclude label encoder),
+        # keeping one copy of byte-identical files and weighting it by its count
+        members, weights, report = load_ensemble_members(trained_dir)
+        if INFERENCE_BACKEND == 'native':
+            members = to_native_members(members)
+        elif INFERENCE_BACKEND == 'compiled':
+            members = [CompiledForest.from_model(m) if hasattr(m, 'get_booster') else m for m in members]
+
+    if not members:
+        raise RuntimeError(f"No sklearn-compatible models (.pkl with predict_proba) found in '{os.path.basename(trained_dir)}'")
+
+    # Prefer the persisted scaler/feature schema; fall back to fitting on the dataset
+    preprocessing_path = os.path.join(trained_dir, PREPROCESSING_ARTIFACT)
+    if os.path.exists(preprocessing_path):
+        fitted_scaler, columns = load_preprocessing(preprocessing_path)
+    else:
+        print(f"'{PREPROCESSING_ARTIFACT}' not found, fitting scaler on the reference dataset "
+              f"(run 'python preprocessing.py' to speed up startup)")
+        fitted_scaler, columns = fit_preprocessing(dataset_store.get_frame())
+
+    binner = None
+    if INFERENCE_PRECISION == 'binned':
+        # Every member becomes a compiled forest evaluated on the split bins of the raw features
+        forests = [compile_member(m) for m in members]
+        binner, members = bin_ensemble(forests, fitted_scaler.mean_, fitted_scaler.scale_)
 
-        # Load the dataset to get feature columns
-        df = pd.read_csv('iot_device_test_augmented_10k.csv')
-        feature_columns = [col for col in df.columns if col != 'device_category']
+    # Columns no tree splits on cannot change a prediction, so they need not be parsed or scaled
+    split_idx = ensemble_used_features(members)
+    used_idx = split_idx if FEATURE_PRUNING else None
+    monitor = build_drift_monitor(fitted_scaler, columns, split_idx, categories) if DRIFT_MONITOR else None
+    return {
+        'models': members,
+        'model_weights': weights,
+        'model_report': report,
+        'model_names': [entry['files'][0] for entry in report],
+        'scaler': fitted_scaler,
+        'feature_binner': binner,
+        'feature_columns': columns,
+        'device_categories': categories,
+        'used_feature_idx': used_idx,
+        'drift_monitor': monitor,
+        'drift_columns': split_idx if monitor is not None else None,
+        'input_columns': [columns[i] for i in used_idx] if used_idx is not None else list(columns)
+    }
 
-        # Create a scaler (fit on dataset features)
-        scaler = StandardScaler()
-        scaler.fit(df[feature_columns])
+def activate_model_state(state):
+    """Make a loaded model state live (called by the registry under its write lock)"""
+    global models, model_weights, model_report, model_names, scaler, feature_columns, device_categories
+    global flow_aggregator, used_feature_idx, input_columns, scaler_mean, scaler_scale, feature_binner
+    global drift_monitor, drift_columns
+    models = state['models']
+    model_weights = state['model_weights']
+    model_report = state['model_report']
+    model_names = state['model_names']
+    scaler = state['scaler']
+    scaler_mean = np.asarray(scaler.mean_, dtype=FEATURE_DTYPE)
+    scaler_scale = np.asarray(scaler.scale_, dtype=FEATURE_DTYPE)
+    feature_binner = state.get('feature_binner')
+    # Live statistics start over with each model version (its predicted classes differ)
+    drift_monitor = state.get('drift_monitor')
+    drift_columns = state.get('drift_columns')
+    feature_columns = state['feature_columns']
+    device_categories = state['device_categories']
+    used_feature_idx = state['used_feature_idx']
+    input_columns = state['input_columns']
 
-        print(f"Loaded {len(models)} model(s) from 'trained model final' with {len(feature_columns)} features")
+    # Cached probabilities belong to the previous models
+    if prediction_cache is not None:
+        prediction_cache.clear()
+    if flow_aggregator is None or flow_aggregator.feature_columns != list(feature_columns):
+        flow_aggregator = FlowAggregator(feature_columns, STREAM_WINDOW_S, STREAM_IDLE_S, STREAM_MIN_PACKETS)
+
+def build_drift_monitor(fitted_scaler, columns, split_idx, categories):
+    """Drift monitor over the columns the trees split on, referenced on scaled dataset rows when available"""
+    # Drift in a column no tree reads cannot change a prediction
+    monitored = np.arange(len(columns)) if split_idx is None else np.asarray(split_idx)
+    names = [columns[i] for i in monitored]
+    if not dataset_store.available():
+        return DriftMonitor.from_scaler(names, categories, batch_rows=DRIFT_BATCH_ROWS,
+                                        max_batch_rows=DRIFT_MAX_BATCH_ROWS)
+    frame = dataset_store.rows(dataset_store.stratified_indices(DRIFT_REFERENCE_ROWS))
+    values = frame.reindex(columns=columns).apply(pd.to_numeric, errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    scaled = fitted_scaler.transform(values)[:, monitored]
+    index_of = {c: i for i, c in enumerate(categories)}
+    labels = frame[TARGET_COLUMN].astype(str).map(lambda c: index_of.get(c, -1)).to_numpy()
+    return DriftMonitor.from_reference(scaled, labels, names, categories, batch_rows=DRIFT_BATCH_ROWS,
+                                       max_batch_rows=DRIFT_MAX_BATCH_ROWS)
+
+def state_predict_proba(state, frame):
+    """Ensemble probabilities for a DataFrame under a (possibly not yet active) model state"""
+    X = frame.reindex(columns=state['feature_columns']).apply(pd.to_numeric, errors='coerce')
+    values = X.fillna(0.0).to_numpy(dtype=float)
+    binner = state.get('feature_binner')
+    X_scaled = binner.transform(values) if binner is not None else state['scaler'].transform(values)
+    proba = sum(w * np.asarray(m.predict_proba(X_scaled), dtype=float)
+                for m, w in zip(state['models'], state['model_weights']))
+    n_classes = len(state['device_categories'])
+    proba = proba[:, :n_classes] if proba.shape[1] >= n_classes else np.pad(proba, ((0, 0), (0, n_classes - proba.shape[1])))
+    row_sum = proba.sum(axis=1, keepdims=True)
+    row_sum[row_sum == 0] = 1.0
+    return proba / row_sum
+
+def validate_model_state(state):
+    """Check a candidate version on a holdout sample before it may replace the active one"""
+    rng = np.random.default_rng(0)
+    if dataset_store.available():
+        # Stratified so every class is represented, reading only the sampled rows
+        holdout = dataset_store.rows(dataset_store.stratified_indices(RELOAD_HOLDOUT_ROWS))
+    else:
+        # Without the reference dataset, probe with rows around the candidate's scaler means
+        mean = state['scaler'].mean_
+        holdout = pd.DataFrame(mean + rng.standard_normal((RELOAD_HOLDOUT_ROWS, mean.shape[0])) * state['scaler'].scale_,
+                               columns=state['feature_columns'])
+
+    proba = state_predict_proba(state, holdout)
+    result = {'rows': len(holdout), 'ok': bool(np.isfinite(proba).all())}
+    if not result['ok']:
+        result['reason'] = 'non-finite probabilities'
+        return result
+
+    predicted = np.asarray(state['device_categories'], dtype=object)[np.argmax(proba, axis=1)]
+    if models:
+        current = {key: globals()[key] for key in ('models', 'model_weights', 'feature_columns', 'scaler',
+                                                    'feature_binner', 'device_categories')}
+        current_predicted = np.asarray(device_categories, dtype=object)[np.argmax(state_predict_proba(current, holdout), axis=1)]
+        result['agreement_with_active'] = float(np.mean(predicted == current_predicted))
+    if TARGET_COLUMN in holdout.columns:
+        labels = holdout[TARGET_COLUMN].astype(str).to_numpy()
+        result['accuracy'] = float(np.mean(predicted == labels))
+        if models:
+            result['active_accuracy'] = float(np.mean(current_predicted == labels))
+            if result['accuracy'] < result['active_accuracy'] - RELOAD_MAX_ACCURACY_DROP:
+                result['ok'] = False
+                result['reason'] = (f"holdout accuracy {result['accuracy']:.3f} is more than "
+                                    f"{RELOAD_MAX_ACCURACY_DROP} below the active model's {result['active_accuracy']:.3f}")
+    return result
+
+model_registry = ModelRegistry(MODEL_ROOT, load_model_state, validate_model_state, activate_model_state, MODEL_WATCH_S)
+
+def load_model():
+    """Load trained models (ensemble) from IOT_MODEL_DIR ('trained model final') and prepare feature columns"""
+    try:
+        start_time = time.perf_counter()
+        trained_dir = resolve_model_dir(os.path.join(os.getcwd(), MODEL_ROOT))
+        state = load_model_state(trained_dir)
+        print_model_report(state['model_report'])
+        print(f"Inference backend: {INFERENCE_BACKEND}")
+        if state['used_feature_idx'] is not None:
+            print(f"Feature pruning: {len(state['input_columns'])} of {len(state['feature_columns'])} features used by the ensemble")
+        elif FEATURE_PRUNING:
+            print("Feature pruning disabled: could not determine the features every member uses")
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        model_registry.activate(state, trained_dir, elapsed_ms)
+        print(f"Loaded {len(models)} unique model(s) ({sum(model_weights)} file(s)) from '{os.path.relpath(trained_dir)}' with {len(feature_columns)} features in {elapsed_ms:.1f} ms")
         print(f"Classes: {device_categories}")
         return True
     except Exception as e:
         print(f"Error loading model(s): {str(e)}")
         return False
 
-def predict_device_category(features):
-    """Predict device category from input features using ensemble average"""
+def set_inference_threads(nthread):
+    """Limit the threads every ensemble member may use per prediction call"""
+    for m in models:
+        if hasattr(m, 'set_nthread'):
+            m.set_nthread(nthread)
+        elif hasattr(m, 'get_booster'):
+            m.set_params(n_jobs=nthread)
+
+def memory_report():
+    """Return this process's memory use in kB (PSS splits shared pages across the processes mapping them)"""
+    report = {'pid': os.getpid()}
     try:
-        # Convert features to numpy array and reshape
-        features_array = np.array(features).reshape(1, -1)
-
-        # Scale the features
-        features_scaled = scaler.transform(features_array)
-
-        # Aggregate probabilities across models
-        proba_sum = None
-        for m in models:
-            proba = m.predict_proba(features_scaled)
-            # Ensure shape (1, n_classes)
-            proba = np.array(proba)
-            if proba.ndim == 1:
-                proba = proba.reshape(1, -1)
-            if proba_sum is None:
-                proba_sum = np.zeros_like(proba, dtype=float)
-            proba_sum += proba
-
-        avg_proba = proba_sum / max(len(models), 1)
-
-        # Align number of classes if needed
-        n_classes = len(device_categories)
-        if avg_proba.shape[1] != n_classes:
-            # If mismatch, truncate/pad
-            if avg_proba.shape[1] > n_classes:
-                avg_proba = avg_proba[:, :n_classes]
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    key = parts[0].rstrip(':').lower()
+                    if key in ('rss', 'pss', 'shared_clean', 'shared_dirty', 'private_clean', 'private_dirty'):
+                        report[f'{key}_kb'] = int(parts[1])
+    except OSError:
+        # Not Linux (or an old kernel): fall back to peak RSS
+        import resource
+        report['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return report
+
+def create_app():
+    """Application factory: load every artifact once and return the Flask app
+
+    Under gunicorn with preload_app this runs in the master, so forked workers
+    share the models, scaler and reference dataset copy-on-write.
+    """
+    if not models:
+        if not load_model():
+            raise RuntimeError("Failed to load model(s) from 'trained model final'")
+        # Load the reference dataset now too, so workers don't each parse their own copy
+        if dataset_store.available():
+            dataset_store.info()
+    return app
+
+def select_input_columns(features_matrix):
+    """Reduce full-width rows to input_columns when feature pruning is active"""
+    if used_feature_idx is not None and features_matrix.shape[1] == len(feature_columns):
+        return features_matrix[:, used_feature_idx]
+    return features_matrix
+
+def scale_features(features_array):
+    """Standardize rows given over feature_columns, or over input_columns when pruning
+
+    In binned mode the rows are mapped straight to split-bin codes instead; the
+    scaler is already folded into the bin edges.
+    """
+    if feature_binner is not None:
+        pruned = features_array.shape[1] != len(feature_columns)
+        return feature_binner.transform(features_array, used_feature_idx if pruned else None)
+    if used_feature_idx is None:
+        if FEATURE_DTYPE is np.float64:
+            return scaler.transform(features_array)
+        return (features_array - scaler_mean) / scaler_scale
+    # Same arithmetic as StandardScaler.transform on the used columns; unused ones stay 0 (never read)
+    used = select_input_columns(features_array)
+    scaled = np.zeros((used.shape[0], len(feature_columns)), dtype=FEATURE_DTYPE)
+    scaled[:, used_feature_idx] = (used - scaler_mean[used_feature_idx]) / scaler_scale[used_feature_idx]
+    return scaled
+
+def predict_proba_matrix(features_matrix):
+    """Score an (n_rows, n_features) matrix in one vectorized pass through the scaler and every ensemble member"""
+    features_array = np.asarray(features_matrix, dtype=FEATURE_DTYPE)
+    if features_array.ndim == 1:
+        features_array = features_array.reshape(1, -1)
+
+    # Scale the whole batch at once
+    with timed(stage_seconds, stage='scale'):
+        features_scaled = scale_features(features_array)
+    return ensemble_proba(features_scaled)
+
+def observe_drift(features_matrix, proba):
+    """Feed standardized rows and their predicted classes to the drift monitor, when it is enabled
+
+    Called with every scored row, cache hits included, so repeated traffic counts too.
+    """
+    if drift_monitor is None:
+        return
+    with timed(stage_seconds, stage='drift'):
+        features_array = np.asarray(features_matrix, dtype=FEATURE_DTYPE)
+        if features_array.ndim == 1:
+            features_array = features_array.reshape(1, -1)
+        # Only the monitored columns are standardized; pruned rows already hold exactly the split columns
+        columns = drift_columns if drift_columns is not None else slice(None)
+        raw = features_array[:, columns] if features_array.shape[1] == len(feature_columns) else features_array
+        drift_monitor.observe((raw - scaler_mean[columns]) / scaler_scale[columns], np.argmax(proba, axis=1))
+
+_member_pool = None
+_member_pool_pid = None
+_member_pool_lock = threading.Lock()
+
+def member_pool():
+    """Thread pool for parallel member evaluation, created lazily and again in each forked worker"""
+    global _member_pool, _member_pool_pid
+    if _member_pool is None or _member_pool_pid != os.getpid():
+        with _member_pool_lock:
+            if _member_pool is None or _member_pool_pid != os.getpid():
+                _member_pool = ThreadPoolExecutor(PARALLEL_MEMBERS, thread_name_prefix='ensemble-member')
+                _member_pool_pid = os.getpid()
+    return _member_pool
+
+def member_probabilities(features_scaled, member_proba=None):
+    """Every member's probabilities in one preallocated (n_members, n_rows, n_classes) buffer"""
+    members = list(models)
+    names = model_names if len(model_names) == len(members) else [f'model_{i}' for i in range(len(members))]
+    n_rows = features_scaled.shape[0]
+    buffer = [None]
+    buffer_lock = threading.Lock()
+
+    def evaluate(i):
+        m = members[i]
+        with timed(model_seconds, model=names[i]):
+            if member_proba is None:
+                proba = m.predict_proba(features_scaled)
             else:
-                pad = np.zeros((avg_proba.shape[0], n_classes - avg_proba.shape[1]))
-                avg_proba = np.concatenate([avg_proba, pad], axis=1)
+                proba = member_proba(m, features_scaled)
+        # Ensure shape (n_rows, n_classes)
+        proba = np.asarray(proba, dtype=PROBA_DTYPE).reshape(n_rows, -1)
+        # The class count is known once the first member returns
+        with buffer_lock:
+            if buffer[0] is None:
+                buffer[0] = np.empty((len(members), n_rows, proba.shape[1]), dtype=PROBA_DTYPE)
+        buffer[0][i] = proba
+
+    if PARALLEL_MEMBERS > 0 and len(members) > 1 and n_rows >= PARALLEL_MIN_ROWS:
+        # The calling thread scores the first member while the pool scores the rest
+        futures = [member_pool().submit(evaluate, i) for i in range(1, len(members))]
+        evaluate(0)
+        for future in futures:
+            future.result()
+    else:
+        for i in range(len(members)):
+            evaluate(i)
+    return buffer[0]
+
+def ensemble_proba(features_scaled, member_proba=None):
+    """Weighted ensemble probabilities for scaled rows; member_proba(m, X) overrides m.predict_proba(X)"""
+    weights = model_weights if len(model_weights) == len(models) else [1] * len(models)
+    with timed(stage_seconds, stage='ensemble'):
+        probas = member_probabilities(features_scaled, member_proba)
+        # Aggregate probabilities across models in member order, weighting deduplicated members in place
+        proba_sum = np.multiply(probas[0], weights[0])
+        for i in range(1, probas.shape[0]):
+            np.multiply(probas[i], weights[i], out=probas[i])
+            proba_sum += probas[i]
+
+    avg_proba = proba_sum / max(sum(weights), 1)
+
+    # Align number of classes if needed
+    n_classes = len(device_categories)
+    if avg_proba.shape[1] != n_classes:
+        # If mismatch, truncate/pad
+        if avg_proba.shape[1] > n_classes:
+            avg_proba = avg_proba[:, :n_classes]
+        else:
+            pad = np.zeros((avg_proba.shape[0], n_classes - avg_proba.shape[1]), dtype=avg_proba.dtype)
+            avg_proba = np.concatenate([avg_proba, pad], axis=1)
+
+    # Normalize to probabilities
+    row_sum = avg_proba.sum(axis=1, keepdims=True)
+    row_sum[row_sum == 0] = 1.0
+    return avg_proba / row_sum
+
+def cascade_stage_fns(early_exit):
+    """Stage functions for a cascade: one truncated ensemble per round prefix, then the full ensemble
+
+    Each stage evaluates only the rounds after the previous prefix, starting from the
+    per-member margins the previous stage carried for the rows still pending.
+    """
+    def stage(start, stop):
+        def score(X, margins):
+            carried = {}
+            def member_proba(m, Xs):
+                proba, carried[id(m)] = staged_proba(m, Xs, start, stop, (margins or {}).get(id(m)))
+                return proba
+            return ensemble_proba(X, member_proba), carried
+        return score
+    bounds = [0] + list(early_exit.stage_rounds) + [None]
+    return [stage(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
 
-        # Normalize to probabilities
-        row_sum = avg_proba.sum(axis=1, keepdims=True)
-        row_sum[row_sum == 0] = 1.0
-        avg_proba = avg_proba / row_sum
+def cascade_full_rounds():
+    """Boosting rounds of the deepest member, or None when no member is a tree model"""
+    rounds = [r for r in (member_rounds(m) for m in models) if r is not None]
+    return max(rounds) if rounds else None
+
+def predict_proba_cascade(features_matrix):
+    """Score rows through the early-exit cascade; confident rows skip the later boosting rounds"""
+    features_array = np.asarray(features_matrix, dtype=FEATURE_DTYPE)
+    if features_array.ndim == 1:
+        features_array = features_array.reshape(1, -1)
+    with timed(stage_seconds, stage='scale'):
+        features_scaled = scale_features(features_array)
+    proba, _ = cascade.run(features_scaled, cascade_stage_fns(cascade))
+    return proba
+
+def predict_proba_rows(features_matrix):
+    """Score rows through the prediction cache when it is enabled, otherwise straight through the ensemble"""
+    score = predict_proba_cascade if cascade is not None else predict_proba_matrix
+    if prediction_cache is None:
+        proba = score(features_matrix)
+    else:
+        # Cache keys cover only the columns that can affect the prediction
+        proba = prediction_cache.predict(select_input_columns(np.asarray(features_matrix, dtype=FEATURE_DTYPE)), score)
+    observe_drift(features_matrix, proba)
+    return proba
+
+def predict_device_category(features):
+    """Predict device category from input features using ensemble average"""
+    try:
+        row = select_input_columns(np.asarray(features, dtype=FEATURE_DTYPE).reshape(1, -1))
+        if micro_batcher is not None:
+            avg_proba = micro_batcher.predict(row[0]).reshape(1, -1)
+        else:
+            avg_proba = predict_proba_rows(row)
 
         # Get the predicted class
         predicted_class_idx = int(np.argmax(avg_proba[0]))
         predicted_class = device_categories[predicted_class_idx]
 
         # Build confidence dict
-        confidence_scores = {device_categories[i]: float(avg_proba[0][i]) for i in range(n_classes)}
+        confidence_scores = {device_categories[i]: float(avg_proba[0][i]) for i in range(len(device_categories))}
         return predicted_class, confidence_scores
     except Exception as e:
         print(f"Error in prediction: {str(e)}")
         return None, None
 
+def rows_to_matrix(rows):
+    """Convert a list of rows (feature lists or dicts keyed by feature name) into a feature matrix"""
+    if not rows:
+        return np.empty((0, len(input_columns)))
+
+    if all(isinstance(row, dict) for row in rows):
+        # Missing or unparseable values default to 0, like the /predict form
+        frame = pd.DataFrame.from_records(rows).reindex(columns=input_columns)
+        return frame_to_matrix(frame)
+
+    if all(isinstance(row, (list, tuple)) for row in rows):
+        # Positional rows follow feature_columns, or input_columns when pruning
+        width = len(rows[0])
+        if width not in (len(feature_columns), len(input_columns)) or any(len(row) != width for row in rows):
+            raise ValueError(f"Each row must have {len(feature_columns)} features in feature_columns order")
+        try:
+            matrix = np.asarray(rows, dtype=FEATURE_DTYPE)
+        except (TypeError, ValueError):
+            columns = feature_columns if width == len(feature_columns) else input_columns
+            return frame_to_matrix(pd.DataFrame(rows, columns=columns))
+        matrix[np.isnan(matrix)] = 0.0
+        return matrix
+
+    raise ValueError("Rows must all be lists of feature values or all be objects keyed by feature name")
+
+def frame_to_matrix(frame):
+    """Select input_columns from a DataFrame and coerce them to a FEATURE_DTYPE matrix"""
+    frame = frame.reindex(columns=input_columns)
+    frame = frame.apply(pd.to_numeric, errors='coerce')
+    return frame.fillna(0.0).to_numpy(dtype=FEATURE_DTYPE)
+
+def score_frame_locked(frame):
+    """score_frame under the model read lock, so a hot swap never lands mid-chunk"""
+    with model_registry.lock.reading():
+        return score_frame(frame)
+
+def score_frame(frame, keep_columns=(), probabilities=False):
+    """Classify every row of a DataFrame; return predicted_class and confidence (plus p_<class>) columns"""
+    features_matrix = frame_to_matrix(frame)
+    proba = predict_proba_matrix(features_matrix)
+    observe_drift(features_matrix, proba)
+    predicted_idx = np.argmax(proba, axis=1)
+
+    out = pd.DataFrame(index=frame.index)
+    for col in keep_columns:
+        if col in frame.columns:
+            out[col] = frame[col].to_numpy()
+    out['predicted_class'] = np.asarray(device_categories, dtype=object)[predicted_idx]
+    out['confidence'] = proba[np.arange(proba.shape[0]), predicted_idx]
+    if probabilities:
+        for i, category in enumerate(device_categories):
+            out[f'p_{category}'] = proba[:, i]
+    return out
+
+def align_binary_columns(names, matrix):
+    """Align a decoded binary matrix to input_columns (unnamed matrices may be full width or pruned)"""
+    if names is None and matrix.shape[1] == len(input_columns):
+        return matrix
+    return binary_format.align_columns(names, matrix, feature_columns if names is None else input_columns)
+
+class BodyTooLarge(Exception):
+    """Raised when a request body exceeds its byte limit"""
+
+def read_body(req, limit):
+    """Read the request body, raising BodyTooLarge as soon as it exceeds limit bytes"""
+    # A declared length is refused without reading; chunked bodies are read only up to the limit
+    if req.content_length is not None and req.content_length > limit:
+        raise BodyTooLarge()
+    chunks, size = [], 0
+    while True:
+        chunk = req.stream.read(min(1024 * 1024, limit + 1 - size))
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge()
+
+def parse_batch_request(req, body):
+    """Parse a JSON array, CSV, NDJSON, IOTF binary or Arrow IPC request body into a feature matrix"""
+    content_type = (req.mimetype or '').lower()
+
+    if content_type == binary_format.MIMETYPE:
+        # Zero-copy float32 view over the request body
+        names, matrix = binary_format.decode_matrix(body)
+        return align_binary_columns(names, matrix)
+
+    if content_type == binary_format.ARROW_MIMETYPE:
+        # Only the input columns are converted; label or other text columns are skipped
+        names, matrix = binary_format.decode_arrow(body, input_columns)
+        return align_binary_columns(names, matrix)
+
+    if content_type in ('text/csv', 'application/csv'):
+        # Only the input columns are parsed when pruning
+        wanted = set(input_columns)
+        frame = pd.read_csv(io.BytesIO(body), usecols=lambda col: col in wanted)
+        return frame_to_matrix(frame)
+
+    if content_type in ('application/x-ndjson', 'application/jsonl', 'application/json-seq'):
+        rows = [json.loads(line) for line in body.decode().splitlines() if line.strip()]
+        return rows_to_matrix(rows)
+
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        data = data.get('rows', data.get('instances'))
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of rows, or an object with a 'rows' array")
+    return rows_to_matrix(data)
+
 ############################################
 # Local Chatbot (trained on dataset knowledge)
 ############################################
 
+# Chatbot intents in priority order: the first intent with a keyword contained in the
+# message answers it; device intents are inserted after 'capabilities'
+CHAT_INTENTS_BEFORE_DEVICES = [
+    ('greetings', ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening']),
+    ('capabilities', ['what can you do', 'capabilities', 'help', 'assist', 'support'])
+]
+CHAT_INTENTS_AFTER_DEVICES = [
+    ('features', ['features', 'model', 'algorithm', 'machine learning', 'ml']),
+    ('security', ['security', 'threat', 'attack', 'vulnerability', 'protection']),
+    ('accuracy', ['accuracy', 'performance', 'results', 'prediction']),
+    ('dataset', ['dataset', 'data', 'training', 'samples']),
+    ('numerical', ['numerical', 'numbers', 'values', 'metrics']),
+    ('dsx', ['dsx'])
+]
+CHAT_FIXED_RESPONSES = {
+    'accuracy': "Our ensemble model achieves high accuracy in IoT device identification by analyzing 297 network traffic features. The model uses multiple XGBoost classifiers trained on diverse traffic patterns to ensure robust classification.",
+    'dataset': "Our model is trained on the IoT device test dataset with 10,000 samples across 9 device categories. The dataset includes 297 features extracted from network traffic including packet characteristics, HTTP patterns, SSL certificates, and timing information."
+}
+@functools.lru_cache(maxsize=4)
+def chat_intent_index(categories):
+    """Compile the intent index for a set of device categories (rebuilt when the classes change)"""
+    device_intents = [(('device', device), [device.replace('_', ' '), device]) for device in categories]
+    return IntentIndex(CHAT_INTENTS_BEFORE_DEVICES + device_intents + CHAT_INTENTS_AFTER_DEVICES)
+
+@functools.lru_cache(maxsize=CHAT_CACHE_SIZE)
+def chat_intent(message, categories):
+    """Memoized intent of a normalized message; None falls back to the default answers"""
+    return chat_intent_index(categories).match(message)
+
 def get_chatbot_response(user_message):
     """Generate intelligent response based on user input and dataset knowledge"""
-    user_message = user_message.lower().strip()
-    
-    # Greeting patterns
-    if any(word in user_message for word in ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening']):
-        return random.choice(chatbot_knowledge['greetings'])
-    
-    # Capability questions
-    if any(word in user_message for word in ['what can you do', 'capabilities', 'help', 'assist', 'support']):
-        return random.choice(chatbot_knowledge['capabilities'])
-    
-    # Device-specific questions
-    for device in device_categories:
-        if device.replace('_', ' ') in user_message or device in user_message:
-            return chatbot_knowledge['device_info'].get(device, f"I can help you identify {device} devices based on their network traffic patterns.")
-    
-    # Feature questions
-    if any(word in user_message for word in ['features', 'model', 'algorithm', 'machine learning', 'ml']):
-        return random.choice(chatbot_knowledge['features'])
-    
-    # Security questions
-    if any(word in user_message for word in ['security', 'threat', 'attack', 'vulnerability', 'protection']):
-        return random.choice(chatbot_knowledge['security'])
+    intent = chat_intent(user_message.lower().strip(), tuple(device_categories))
     
-    # Accuracy questions
-    if any(word in user_message for word in ['accuracy', 'performance', 'results', 'prediction']):
-        return "Our ensemble model achieves high accuracy in IoT device identification by analyzing 297 network traffic features. The model uses multiple XGBoost classifiers trained on diverse traffic patterns to ensure robust classification."
-    
-    # Dataset questions
-    if any(word in user_message for word in ['dataset', 'data', 'training', 'samples']):
-        return "Our model is trained on the IoT device test dataset with 10,000 samples across 9 device categories. The dataset includes 297 features extracted from network traffic including packet characteristics, HTTP patterns, SSL certificates, and timing information."
-    
-    # Numerical questions
-    if any(word in user_message for word in ['numerical', 'numbers', 'values', 'metrics']):
-        return random.choice(chatbot_knowledge['numerical'])
-    
-    # DSX questions
-    if 'dsx' in user_message:
-        return random.choice(chatbot_knowledge['dsx'])
-    
-    # Default response
-    return random.choice(chatbot_knowledge['default'])
+    if intent is None:
+        return random.choice(chatbot_knowledge['default'])
+    if isinstance(intent, tuple):
+        device = intent[1]
+        return chatbot_knowledge['device_info'].get(device, f"I can help you identify {device} devices based on their network traffic patterns.")
+    if intent in CHAT_FIXED_RESPONSES:
+        return CHAT_FIXED_RESPONSES[intent]
+    # Several phrasings per intent: only the intent is memoized, the wording still varies
+    return random.choice(chatbot_knowledge[intent])
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    model_registry.ensure_watching()
+    model_registry.sync()
+
+def uses_model(view):
+    """Hold the model read lock for the whole request so a hot swap waits for it to finish"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with model_registry.lock.reading():
+            return view(*args, **kwargs)
+    return wrapper
+
+@app.after_request
+def record_request_metrics(response):
+    """Record latency and status for every request"""
+    endpoint = request.endpoint or 'unknown'
+    if 'request_start' in g:
+        request_seconds.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    requests_total.inc(endpoint=endpoint, status=str(response.status_code))
+    return response
 
 @app.route('/chat/start_session', methods=['POST'])
 def chat_start_session():
@@ -273,6 +916,7 @@ def index():
                          device_categories=device_categories)
 
 @app.route('/predict', methods=['POST'])
+@uses_model
 def predict():
     """Handle prediction requests"""
     try:
@@ -280,47 +924,328 @@ def predict():
         form_data = request.form.to_dict()
         
         # Convert form data to feature array
-        features = []
-        for col in feature_columns:
-            value = form_data.get(col, '0')
-            try:
-                features.append(float(value))
-            except ValueError:
-                features.append(0.0)
+        with timed(stage_seconds, stage='parse_form'):
+            features = []
+            for col in input_columns:
+                value = form_data.get(col, '0')
+                try:
+                    features.append(float(value))
+                except ValueError:
+                    features.append(0.0)
         
         # Make prediction
         predicted_class, confidence_scores = predict_device_category(features)
         
         if predicted_class is None:
             return jsonify({'error': 'Prediction failed'}), 500
+        predicted_rows.inc(endpoint='predict')
         
         # Sort confidence scores by probability
         sorted_confidence = sorted(confidence_scores.items(), 
                                  key=lambda x: x[1], reverse=True)
         
-        return jsonify({
-            'predicted_class': predicted_class,
-            'confidence_scores': confidence_scores,
-            'sorted_confidence': sorted_confidence,
-            'success': True
-        })
+        with timed(stage_seconds, stage='serialize'):
+            return jsonify({
+                'predicted_class': predicted_class,
+                'confidence_scores': confidence_scores,
+                'sorted_confidence': sorted_confidence,
+                'success': True
+            })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/predict/batch', methods=['POST'])
+@uses_model
+def predict_batch():
+    """Handle batch prediction requests (JSON array, CSV or NDJSON body)"""
+    try:
+        try:
+            body = read_body(request, MAX_BATCH_BYTES)
+            with timed(stage_seconds, stage='parse_batch'):
+                features_matrix = parse_batch_request(request, body)
+        except BodyTooLarge:
+            return jsonify({'error': f'Request body too large (max {MAX_BATCH_BYTES} bytes)'}), 413
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except binary_format.ArrowUnavailable as e:
+            return jsonify({'error': str(e)}), 415
+
+        n_rows = features_matrix.shape[0]
+        if n_rows == 0:
+            return jsonify({'error': 'At least one row is required'}), 400
+        if n_rows > MAX_BATCH_ROWS:
+            return jsonify({'error': f'Batch too large (max {MAX_BATCH_ROWS} rows)'}), 413
+
+        proba = predict_proba_rows(features_matrix)
+        predicted_idx = np.argmax(proba, axis=1)
+        predicted_rows.inc(n_rows, endpoint='predict_batch')
+
+        with timed(stage_seconds, stage='serialize'):
+            if request.accept_mimetypes.best == binary_format.MIMETYPE:
+                # Probabilities as an IOTF matrix whose column names are the classes
+                return Response(binary_format.encode_matrix(proba, device_categories),
+                                mimetype=binary_format.MIMETYPE)
+            return jsonify({
+                'classes': device_categories,
+                'predicted_classes': [device_categories[i] for i in predicted_idx],
+                'probabilities': proba.tolist(),
+                'count': n_rows,
+                'success': True
+            })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Get prediction cache size and hit/miss/eviction counters"""
+    if prediction_cache is None:
+        return jsonify({'enabled': False})
+    stats = prediction_cache.stats()
+    stats['enabled'] = True
+    return jsonify(stats)
+
+@app.route('/cache/clear', methods=['POST'])
+def cache_clear():
+    """Drop all cached predictions"""
+    if prediction_cache is not None:
+        prediction_cache.clear()
+    return jsonify({'success': True})
+
+@app.route('/batcher/stats')
+def batcher_stats():
+    """Get micro-batcher configuration, achieved batch sizes and queueing delay"""
+    if micro_batcher is None:
+        return jsonify({'enabled': False})
+    stats = micro_batcher.stats()
+    stats['enabled'] = True
+    return jsonify(stats)
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a CSV upload (multipart 'file' field or raw text/csv body) for background classification"""
+    upload = request.files.get('file')
+    if upload is not None:
+        stream, filename = upload.stream, upload.filename
+    elif (request.mimetype or '').lower() in ('text/csv', 'application/csv'):
+        stream, filename = request.stream, None
+    else:
+        return jsonify({'error': "Upload a CSV as multipart field 'file' or a text/csv body"}), 400
+
+    try:
+        status = job_manager.submit(stream, filename)
+    except QueueFull:
+        response = jsonify({'error': 'Job queue is full, retry later', 'queue_depth': job_manager.max_queue})
+        response.headers['Retry-After'] = '30'
+        return response, 429
+
+    status['status_url'] = url_for('job_status', job_id=status['job_id'])
+    status['result_url'] = url_for('job_result', job_id=status['job_id'])
+    return jsonify(status), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Get a job's state and progress"""
+    try:
+        return jsonify(job_manager.poll(job_id))
+    except KeyError:
+        return jsonify({'error': 'Unknown job'}), 404
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Download a finished job's predictions as CSV"""
+    try:
+        status = job_manager.poll(job_id)
+    except KeyError:
+        return jsonify({'error': 'Unknown job'}), 404
+    if status['state'] != 'done':
+        return jsonify({'error': f"Job is {status['state']}", 'state': status['state']}), 409
+    return send_file(os.path.abspath(job_manager.result_path(job_id)), mimetype='text/csv',
+                     as_attachment=True, download_name=f'{job_id}.csv')
+
+def classify_windows(windows):
+    """Classify closed flow windows in one ensemble pass and return JSON-ready results"""
+    if not windows:
+        return []
+    proba = predict_proba_rows(np.vstack([w['features'] for w in windows]))
+    predicted_idx = np.argmax(proba, axis=1)
+    predicted_rows.inc(len(windows), endpoint='stream')
+    results = []
+    for window, idx, row in zip(windows, predicted_idx, proba):
+        result = {k: v for k, v in window.items() if k != 'features'}
+        result['predicted_class'] = device_categories[idx]
+        result['confidence'] = float(row[idx])
+        results.append(result)
+    return results
+
+@app.route('/stream/events', methods=['POST'])
+@uses_model
+def stream_events():
+    """Fold packet events (JSON array, {"events": [...]} or NDJSON) into per-device state and classify closed windows"""
+    if flow_aggregator is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    if (request.mimetype or '').lower() in ('application/x-ndjson', 'application/jsonl'):
+        events = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+    else:
+        events = request.get_json(force=True, silent=True)
+        if isinstance(events, dict):
+            events = events.get('events')
+    if not isinstance(events, list):
+        return jsonify({'error': "Expected a JSON array of events, or an object with an 'events' array"}), 400
+
+    try:
+        with timed(stage_seconds, stage='aggregate'):
+            windows = flow_aggregator.ingest(events)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid event: {e}'}), 400
+    results = classify_windows(windows)
+    return jsonify({'accepted': len(events), 'windows': results, 'count': len(results)})
+
+@app.route('/stream/flush', methods=['POST'])
+@uses_model
+def stream_flush():
+    """Close and classify every open device window"""
+    if flow_aggregator is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    results = classify_windows(flow_aggregator.flush())
+    return jsonify({'windows': results, 'count': len(results)})
+
+@app.route('/stream/stats')
+def stream_stats():
+    """Get active devices, state size and window/eviction counters of the flow aggregator"""
+    if flow_aggregator is None:
+        return jsonify({'enabled': False})
+    return jsonify(flow_aggregator.stats())
+
+@app.route('/features')
+def features_info():
+    """Get the features the service parses and scales (all of them unless pruning is on)"""
+    used = set(input_columns)
+    return jsonify({
+        'pruning': used_feature_idx is not None,
+        'n_total': len(feature_columns),
+        'n_used': len(input_columns),
+        'used_features': input_columns,
+        'unused_features': [c for c in feature_columns if c not in used]
+    })
+
+@app.route('/cascade/stats')
+def cascade_stats():
+    """Get how many rows exited at each cascade stage"""
+    if cascade is None:
+        return jsonify({'enabled': False})
+    stats = cascade.stats(cascade_full_rounds())
+    stats['enabled'] = True
+    return jsonify(stats)
+
+@app.route('/drift')
+def drift_report():
+    """Get drift scores of live traffic against the reference data, overall and per predicted class"""
+    if drift_monitor is None:
+        return jsonify({'enabled': False})
+    try:
+        top = int(request.args.get('top', '10'))
+    except ValueError:
+        return jsonify({'error': "'top' must be an integer"}), 400
+    report = drift_monitor.report(top=top, all_features=request.args.get('all') == '1')
+    report['enabled'] = True
+    return jsonify(report)
+
+@app.route('/drift/reset', methods=['POST'])
+def drift_reset():
+    """Forget the live drift statistics (e.g. after a known traffic change)"""
+    if drift_monitor is None:
+        return jsonify({'enabled': False})
+    drift_monitor.reset()
+    return jsonify({'enabled': True, 'reset': True})
+
+@app.route('/models')
+def models_status():
+    """Get the active model version, its load/validation/swap timings and the reload history"""
+    status = model_registry.status()
+    status['members'] = [{'files': entry['files'], 'weight': entry['weight'], 'load_ms': entry['load_ms']}
+                         for entry in model_report]
+    return jsonify(status)
+
+@app.route('/models/reload', methods=['POST'])
+def models_reload():
+    """Load, validate and swap in the newest model version now in every worker (?force=1 reloads an unchanged one)"""
+    result = model_registry.request_reload(force=request.args.get('force') == '1')
+    # Other workers pick the reload up on their next request; until then they show their old version
+    result['workers'] = model_registry.worker_versions()
+    status_code = {'error': 500, 'rejected': 409}.get(result.get('status'), 200)
+    return jsonify(result), status_code
+
+@app.route('/memory')
+def memory():
+    """Get this worker's memory footprint (RSS, PSS, shared and private pages)"""
+    return jsonify(memory_report())
+
+def component_metric_lines():
+    """Prometheus lines for the prediction cache, micro-batcher, cascade and drift monitor"""
+    lines = []
+    if prediction_cache is not None:
+        stats = prediction_cache.stats()
+        for key in ('hits', 'misses', 'evictions', 'expirations'):
+            lines += [f'# TYPE iot_cache_{key}_total counter', f'iot_cache_{key}_total {stats[key]}']
+        lines += ['# TYPE iot_cache_entries gauge', f"iot_cache_entries {stats['size']}"]
+    if micro_batcher is not None:
+        stats = micro_batcher.stats()
+        lines += ['# TYPE iot_microbatch_batches_total counter', f"iot_microbatch_batches_total {stats['batches']}",
+                  '# TYPE iot_microbatch_rows_total counter', f"iot_microbatch_rows_total {stats['rows']}"]
+    if cascade is not None:
+        lines.append('# TYPE iot_cascade_exits_total counter')
+        lines += [f'iot_cascade_exits_total{{stage="{s["stage"]}"}} {s["exits"]}' for s in cascade.stats()['stages']]
+    if drift_monitor is not None:
+        overall = drift_monitor.report(top=0)['overall']
+        lines += ['# TYPE iot_drift_psi_max gauge', f"iot_drift_psi_max {overall['psi_max']}",
+                  '# TYPE iot_drift_features_significant gauge',
+                  f"iot_drift_features_significant {overall['features_significant']}"]
+    return lines
+
+@app.route('/metrics')
+def metrics():
+    """Expose latency histograms and counters in Prometheus text format"""
+    body = metrics_registry.render(component_metric_lines())
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@app.route('/profiler', methods=['GET'])
+def profiler_report():
+    """Get the most frequently sampled stacks from the sampling profiler"""
+    if not PROFILER_ENABLED:
+        return jsonify({'error': 'Profiler disabled (set IOT_ENABLE_PROFILER=1)'}), 403
+    top = request.args.get('top', 20, type=int)
+    return jsonify(profiler.report(top))
+
+@app.route('/profiler/<action>', methods=['POST'])
+def profiler_control(action):
+    """Start or stop the sampling profiler at runtime"""
+    if not PROFILER_ENABLED:
+        return jsonify({'error': 'Profiler disabled (set IOT_ENABLE_PROFILER=1)'}), 403
+    if action == 'start':
+        profiler.start(request.args.get('interval_ms', type=float))
+    elif action == 'stop':
+        profiler.stop()
+    else:
+        return jsonify({'error': f"Unknown action '{action}'"}), 404
+    return jsonify({'running': profiler.running, 'interval_ms': profiler.interval * 1000})
+
 @app.route('/sample_data')
 def sample_data():
-    """Get sample data from the dataset"""
+    """Get sample data from the dataset (?category=<name> samples from one class)"""
     try:
-        df = pd.read_csv('iot_device_test_augmented_10k.csv')
         # Get a random sample
-        sample = df.sample(n=1).iloc[0]
+        category = request.args.get('category')
+        if category is not None and category not in dataset_store.info()['category_counts']:
+            return jsonify({'error': f'Unknown category: {category}'}), 400
+        sample, actual_category = dataset_store.sample(category)
         
         sample_data = {}
         for col in feature_columns:
-            sample_data[col] = float(sample[col])
+            sample_data[col] = float(sample.get(col, 0.0))
         
-        sample_data['actual_category'] = sample['device_category']
+        sample_data['actual_category'] = actual_category
         
         return jsonify(sample_data)
     except Exception as e:
@@ -330,18 +1255,9 @@ def sample_data():
 def dataset_info():
     """Get information about the dataset"""
     try:
-        df = pd.read_csv('iot_device_test_augmented_10k.csv')
-        
-        # Count device categories
-        category_counts = df['device_category'].value_counts().to_dict()
-        
-        # Get basic statistics
-        stats = {
-            'total_samples': len(df),
-            'total_features': len(feature_columns),
-            'device_categories': list(category_counts.keys()),
-            'category_counts': category_counts
-        }
+        stats = dataset_store.info()
+        stats['total_features'] = len(feature_columns)
+        stats['storage'] = dataset_store.backend
         
         return jsonify(stats)
     except Exception as e:
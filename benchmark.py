@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Inference benchmark suite for the IoT Device Identification System
+Generates synthetic 297-feature workloads shaped like the augmented dataset and
+measures single-row, batched and concurrent-HTTP latency (p50/p95/p99) and
+throughput across batch sizes and worker counts. Results are emitted as JSON
+so regressions can be tracked over time.
+
+Usage:
+    python benchmark.py [--suites scaler,single,batch,http_single,http_batch,http_concurrent,chatbot,members]
+                        [--repeat 200] [--batch-sizes 1,8,64,512,4096] [--workers 1,2,4,8]
+                        [--url http://localhost:5000] [--output bench.json]
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import contextlib
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+import app
+
+ALL_SUITES = ('scaler', 'single', 'batch', 'http_single', 'http_batch', 'http_concurrent', 'chatbot', 'members')
+CHAT_MESSAGES = (
+    "hello there", "what can you do?", "tell me about security camera traffic",
+    "how accurate are the predictions", "what is in the dataset", "show me numerical metrics",
+    "what is dsx", "is my thermostat vulnerable to attack", "what's the weather like today"
+)
+
+
+def make_workload(n_rows, seed=0):
+    """Draw synthetic rows matching the per-feature mean/variance of the fitted scaler"""
+    rng = np.random.default_rng(seed)
+    mean = np.asarray(app.scaler.mean_, dtype=float)
+    var = np.asarray(app.scaler.var_, dtype=float)
+
+    X = mean + rng.standard_normal((n_rows, mean.shape[0])) * np.sqrt(var)
+    # 0/1 indicator columns (variance ~ p(1-p)) are sampled as Bernoulli
+    binary = (mean >= 0) & (mean <= 1) & np.isclose(var, mean * (1 - mean), rtol=0.05, atol=1e-9)
+    X[:, binary] = rng.random((n_rows, int(binary.sum()))) < mean[binary]
+    # Traffic counts, sizes and durations are never negative
+    return np.clip(X, 0.0, None)
+
+
+def summarize(latencies_s, rows_per_call=1):
+    """Return latency percentiles (ms) and throughput for a list of per-call durations"""
+    lat_ms = np.asarray(latencies_s) * 1000
+    total = float(np.sum(latencies_s))
+    return {
+        'calls': int(lat_ms.size),
+        'rows_per_call': rows_per_call,
+        'p50_ms': float(np.percentile(lat_ms, 50)),
+        'p95_ms': float(np.percentile(lat_ms, 95)),
+        'p99_ms': float(np.percentile(lat_ms, 99)),
+        'mean_ms': float(lat_ms.mean()),
+        'rows_per_sec': rows_per_call * lat_ms.size / total if total > 0 else 0.0
+    }
+
+
+def time_calls(fn, args_list, warmup=3):
+    """Call fn once per args tuple and return the per-call durations in seconds"""
+    for args in args_list[:warmup]:
+        fn(*args)
+    durations = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def bench_scaler(X, repeat, batch_sizes):
+    """scaler.transform alone, per batch size"""
+    return {str(n): summarize(time_calls(app.scaler.transform, [(X[:n],)] * repeat), n)
+            for n in batch_sizes if n <= X.shape[0]}
+
+
+def bench_single(X, repeat):
+    """predict_device_category on one row at a time"""
+    rows = [(X[i % X.shape[0]].tolist(),) for i in range(repeat)]
+    return summarize(time_calls(app.predict_device_category, rows), 1)
+
+
+def bench_batch(X, repeat, batch_sizes):
+    """predict_proba_matrix (scaler + every member) per batch size"""
+    results = {}
+    for n in batch_sizes:
+        if n > X.shape[0]:
+            continue
+        calls = max(3, repeat // max(1, n // 64))
+        results[str(n)] = summarize(time_calls(app.predict_proba_matrix, [(X[:n],)] * calls), n)
+    return results
+
+
+def _form_payload(row):
+    return {col: str(value) for col, value in zip(app.feature_columns, row)}
+
+
+def bench_http_single(client, X, repeat):
+    """POST /predict with form data, including Flask request parsing and JSON serialization"""
+    payloads = [(_form_payload(X[i % X.shape[0]]),) for i in range(repeat)]
+    return summarize(time_calls(lambda data: client.post('/predict', data=data), payloads), 1)
+
+
+def bench_http_batch(client, X, repeat, batch_sizes):
+    """POST /predict/batch with JSON rows, per batch size"""
+    results = {}
+    for n in batch_sizes:
+        if n > X.shape[0]:
+            continue
+        body = X[:n].tolist()
+        calls = max(3, repeat // max(1, n // 64))
+        results[str(n)] = summarize(
+            time_calls(lambda rows: client.post('/predict/batch', json=rows), [(body,)] * calls), n)
+    return results
+
+
+def _http_post_form(url, data):
+    encoded = urllib.parse.urlencode(data).encode()
+    with urllib.request.urlopen(urllib.request.Request(url + '/predict', data=encoded)) as response:
+        response.read()
+
+
+def bench_http_concurrent(client, X, repeat, worker_counts, url=None):
+    """Concurrent single-row /predict calls from a thread pool, per worker count"""
+    if url:
+        post = lambda data: _http_post_form(url.rstrip('/'), data)
+    else:
+        post = lambda data: client.post('/predict', data=data)
+
+    def timed_post(data):
+        start = time.perf_counter()
+        post(data)
+        return time.perf_counter() - start
+
+    payloads = [_form_payload(X[i % X.shape[0]]) for i in range(repeat)]
+    results = {}
+    for workers in worker_counts:
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(timed_post, payloads[:workers]))  # warm-up
+            start = time.perf_counter()
+            durations = list(pool.map(timed_post, payloads))
+            wall = time.perf_counter() - start
+        stats = summarize(durations, 1)
+        # Under concurrency, throughput is rows over wall-clock time, not summed latencies
+        stats['rows_per_sec'] = len(payloads) / wall
+        results[str(workers)] = stats
+    return results
+
+
+def bench_chatbot(client, repeat):
+    """Chatbot replies: intent index scan (memo cleared per call), memoized replies and POST /chat/message"""
+    messages = [(CHAT_MESSAGES[i % len(CHAT_MESSAGES)],) for i in range(repeat)]
+
+    def uncached(message):
+        app.chat_intent.cache_clear()
+        app.get_chatbot_response(message)
+
+    return {
+        'index': summarize(time_calls(uncached, messages), 1),
+        'memoized': summarize(time_calls(app.get_chatbot_response, messages), 1),
+        'http': summarize(time_calls(lambda message: client.post('/chat/message', json={'message': message}),
+                                     messages), 1)
+    }
+
+
+def bench_members(X, repeat, member_counts=(1, 2, 4, 8), n_rows=4096):
+    """Ensembles of k copies of the loaded members, scored one after another and on k threads"""
+    saved = (app.models, app.model_weights, app.model_names, app.PARALLEL_MEMBERS, app.PARALLEL_MIN_ROWS)
+    X_scaled = app.scale_features(X[:n_rows])
+    calls = max(3, repeat // 50)
+    results = {}
+    try:
+        for k in member_counts:
+            app.models = list(saved[0]) * k
+            app.model_weights = list(saved[1]) * k
+            app.model_names = [f'{name}#{i}' for i in range(k) for name in saved[2]]
+            app.PARALLEL_MIN_ROWS = 1
+            runs = {}
+            for mode, threads in (('sequential', 0), ('parallel', len(app.models))):
+                app.PARALLEL_MEMBERS = threads
+                app._member_pool = None
+                runs[mode] = summarize(time_calls(app.ensemble_proba, [(X_scaled,)] * calls), X_scaled.shape[0])
+            runs['speedup'] = runs['sequential']['mean_ms'] / runs['parallel']['mean_ms']
+            results[str(len(app.models))] = runs
+    finally:
+        app.models, app.model_weights, app.model_names, app.PARALLEL_MEMBERS, app.PARALLEL_MIN_ROWS = saved
+        app._member_pool = None
+    return results
+
+
+def run_benchmarks(suites=ALL_SUITES, repeat=200, batch_sizes=(1, 8, 64, 512, 4096),
+                   worker_counts=(1, 2, 4, 8), url=None, seed=0, use_cache=False):
+    """Run the selected suites and return the results as a JSON-serializable dict"""
+    if not use_cache:
+        app.prediction_cache = None
+    X = make_workload(max(max(batch_sizes), repeat), seed=seed)
+    client = app.app.test_client()
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'inference_backend': app.INFERENCE_BACKEND,
+            'inference_precision': app.INFERENCE_PRECISION,
+            'ensemble_members': len(app.models),
+            'n_features': len(app.feature_columns),
+            'n_input_features': len(app.input_columns),
+            'repeat': repeat,
+            'seed': seed,
+            'prediction_cache': app.prediction_cache is not None,
+            'micro_batcher': app.micro_batcher is not None,
+            'cascade': app.cascade.stage_rounds if app.cascade is not None else None,
+            'parallel_members': app.PARALLEL_MEMBERS
+        }
+    }
+    for suite in suites:
+        if suite == 'scaler':
+            results[suite] = bench_scaler(X, repeat, batch_sizes)
+        elif suite == 'single':
+            results[suite] = bench_single(X, repeat)
+        elif suite == 'batch':
+            results[suite] = bench_batch(X, repeat, batch_sizes)
+        elif suite == 'http_single':
+            results[suite] = bench_http_single(client, X, repeat)
+        elif suite == 'http_batch':
+            results[suite] = bench_http_batch(client, X, repeat, batch_sizes)
+        elif suite == 'http_concurrent':
+            results[suite] = bench_http_concurrent(client, X, repeat, worker_counts, url)
+        elif suite == 'chatbot':
+            results[suite] = bench_chatbot(client, repeat)
+        elif suite == 'members':
+            results[suite] = bench_members(X, repeat)
+        else:
+            raise ValueError(f"Unknown suite '{suite}'")
+    return results
+
+
+def _int_list(text):
+    return [int(v) for v in text.split(',') if v]
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark every prediction path and emit JSON")
+    parser.add_argument('--suites', default=','.join(ALL_SUITES), help="comma-separated suites to run")
+    parser.add_argument('--repeat', type=int, default=200, help="timed calls per measurement")
+    parser.add_argument('--batch-sizes', type=_int_list, default=[1, 8, 64, 512, 4096])
+    parser.add_argument('--workers', type=_int_list, default=[1, 2, 4, 8], help="client threads for http_concurrent")
+    parser.add_argument('--url', help="benchmark a running server for http_concurrent instead of the test client")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--with-cache', action='store_true', help="keep the prediction cache enabled")
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        loaded = app.load_model()
+    if not loaded:
+        print("❌ Model loading failed!", file=sys.stderr)
+        return 1
+
+    suites = [s for s in args.suites.split(',') if s]
+    results = run_benchmarks(suites, args.repeat, args.batch_sizes, args.workers, args.url,
+                             args.seed, args.with_cache)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"✅ Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Binary columnar wire format for the IoT Device Identification System
+A float32 matrix with a small header naming its columns, decoded zero-copy
+with np.frombuffer straight into the scaling and scoring pipeline
+
+Layout (all integers little-endian):
+    magic        4 bytes   b'IOTF'
+    version      uint16    1
+    flags        uint16    0 (reserved)
+    n_rows       uint32
+    n_cols       uint32
+    names_len    uint32    bytes of column names that follow (0 = feature_columns order)
+    names        utf-8     column names joined with '\\n'
+    padding      0-3 bytes so the matrix starts on a 4-byte boundary
+    matrix       n_rows * n_cols float32, row-major
+"""
+
+import struct
+import numpy as np
+try:
+    import pyarrow as pa
+except ImportError:
+    # Arrow IPC bodies are optional; IOTF needs only NumPy
+    pa = None
+
+MIMETYPE = 'application/x-iot-f32'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+MAGIC = b'IOTF'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHIII')
+
+
+def encode_matrix(X, names=None):
+    """Serialize a 2-D matrix (and optional column names) to the IOTF format"""
+    X = np.ascontiguousarray(X, dtype='<f4')
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    names_bytes = '\n'.join(names).encode('utf-8') if names else b''
+    if names and len(names) != X.shape[1]:
+        raise ValueError(f"Got {len(names)} column names for {X.shape[1]} columns")
+    header = _HEADER.pack(MAGIC, VERSION, 0, X.shape[0], X.shape[1], len(names_bytes))
+    padding = b'\0' * (-(len(header) + len(names_bytes)) % 4)
+    return header + names_bytes + padding + X.tobytes()
+
+
+def decode_matrix(buf):
+    """Parse an IOTF payload; return (column names or None, read-only float32 view of the matrix)"""
+    if len(buf) < _HEADER.size:
+        raise ValueError("Binary payload shorter than its header")
+    magic, version, _, n_rows, n_cols, names_len = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not an IOTF payload (bad magic)")
+    if version != VERSION:
+        raise ValueError(f"Unsupported IOTF version {version}")
+
+    offset = _HEADER.size
+    names = None
+    if names_len:
+        names = bytes(buf[offset:offset + names_len]).decode('utf-8').split('\n')
+        if len(names) != n_cols:
+            raise ValueError(f"Header names {len(names)} columns but the matrix has {n_cols}")
+    offset += names_len
+    offset += -offset % 4
+
+    expected = offset + n_rows * n_cols * 4
+    if len(buf) != expected:
+        raise ValueError(f"Binary payload is {len(buf)} bytes, expected {expected}")
+    matrix = np.frombuffer(buf, dtype='<f4', count=n_rows * n_cols, offset=offset)
+    return names, matrix.reshape(n_rows, n_cols)
+
+
+class ArrowUnavailable(Exception):
+    """Raised for Arrow IPC bodies when pyarrow is not installed"""
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def decode_arrow(buf, columns):
+    """Parse an Arrow IPC stream; return (names, float32 matrix) of its columns that are in columns
+
+    Other columns (e.g. a string device_category) are never converted. Nulls, NaN and
+    values that are not numbers become 0, like missing values in JSON and CSV bodies.
+    """
+    if pa is None:
+        raise ArrowUnavailable("Arrow IPC bodies need pyarrow installed on the server")
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(buf)).read_all()
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Invalid Arrow IPC stream: {e}")
+    wanted = set(columns)
+    selected = [(i, name) for i, name in enumerate(table.column_names) if name in wanted]
+    matrix = np.empty((table.num_rows, len(selected)), dtype=np.float32)
+    for j, (i, _) in enumerate(selected):
+        column = table.column(i)
+        if pa.types.is_integer(column.type) or pa.types.is_floating(column.type) or pa.types.is_boolean(column.type):
+            matrix[:, j] = column.fill_null(0).to_numpy(zero_copy_only=False)
+        else:
+            matrix[:, j] = [_to_float(value) for value in column.to_pylist()]
+    matrix[np.isnan(matrix)] = 0.0
+    return [name for _, name in selected], matrix
+
+
+def align_columns(names, matrix, feature_columns):
+    """Reorder columns to feature_columns; absent features are 0, unknown columns are dropped"""
+    if names is None or list(names) == list(feature_columns):
+        if matrix.shape[1] != len(feature_columns):
+            raise ValueError(f"Expected {len(feature_columns)} columns, got {matrix.shape[1]}")
+        return matrix
+    position = {name: i for i, name in enumerate(names)}
+    src = [position[name] for name in feature_columns if name in position]
+    dst = [i for i, name in enumerate(feature_columns) if name in position]
+    aligned = np.zeros((matrix.shape[0], len(feature_columns)), dtype=matrix.dtype)
+    aligned[:, dst] = matrix[:, src]
+    return aligned
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Histogram-binned tree inference for the IoT Device Identification System
+Maps every raw feature value to a small integer bin once per row, using the
+ensemble's own split thresholds as bin edges, and evaluates the trees on the bin
+codes. The scaler is folded into the edges: each edge is the smallest raw value
+whose scaled float32 value reaches the split threshold, so binned predictions are
+identical to scaling in float64 and evaluating the compiled trees. A row costs
+one byte per used feature instead of eight. The trees are walked in NumPy, so this
+is a memory option for the compiled backend, not a faster path than xgboost.
+
+Usage (agreement, throughput and memory against the float64 and float32 paths):
+    python binned_forest.py [--rows 4096] [--repeat 5]
+"""
+
+import sys
+import time
+import argparse
+import contextlib
+import numpy as np
+from tree_compiler import CompiledForest
+
+_SIGN = np.int64(-0x8000000000000000)
+# Batches at least this large are binned column by column
+BATCH_BINNING_ROWS = 32
+
+
+def _ordered_keys(values):
+    """Map float64 values to int64 keys with the same order (-0.0 sorts just below +0.0)"""
+    bits = np.ascontiguousarray(values, dtype=np.float64).view(np.int64)
+    return np.where(bits >= 0, bits, -(bits & ~_SIGN) - 1)
+
+
+def _from_ordered_keys(keys):
+    bits = np.where(keys >= 0, keys, (-keys - 1) | _SIGN)
+    return bits.view(np.float64)
+
+
+def raw_split_bounds(threshold, mean, scale):
+    """Smallest float64 x per split with float32((x - mean) / scale) >= threshold, by bisection over all floats"""
+    threshold = np.asarray(threshold, dtype=np.float32)
+    mean = np.asarray(mean, dtype=np.float64)
+    scale = np.asarray(scale, dtype=np.float64)
+    lo = np.full(threshold.shape, _ordered_keys(np.array([-np.inf]))[0])
+    hi = np.full(threshold.shape, _ordered_keys(np.array([np.inf]))[0])
+    # Invariant: scaled(lo) < threshold <= scaled(hi); 64 halvings cover the whole int64 key range
+    for _ in range(64):
+        mid = (lo >> 1) + (hi >> 1) + (lo & hi & 1)
+        with np.errstate(over='ignore', invalid='ignore'):
+            reaches = ((_from_ordered_keys(mid) - mean) / scale).astype(np.float32) >= threshold
+        hi = np.where(reaches, mid, hi)
+        lo = np.where(reaches, lo, mid)
+    return _from_ordered_keys(hi)
+
+
+class FeatureBinner:
+    """Per-feature bin edges shared by every member of an ensemble"""
+
+    def __init__(self, forests, mean, scale):
+        self.num_feature = forests[0].num_feature
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        node_bounds = [(forest.split_feature[~forest.is_leaf], self.split_bounds(forest)) for forest in forests]
+        all_features = np.concatenate([f for f, _ in node_bounds])
+        all_bounds = np.concatenate([b for _, b in node_bounds])
+
+        # Columns of the code matrix: only the features some tree splits on
+        self.used = np.unique(all_features)
+        self._column_of = np.full(self.num_feature, -1, dtype=np.intp)
+        self._column_of[self.used] = np.arange(self.used.shape[0])
+
+        # Edges sorted by (column, value), stored as complex numbers so one searchsorted bins every column
+        pairs = np.unique(np.column_stack([self._column_of[all_features], all_bounds]), axis=0)
+        self._edges = pairs[:, 0] + 1j * pairs[:, 1]
+        self._edge_indptr = np.searchsorted(pairs[:, 0], np.arange(self.used.shape[0] + 1), side='left')
+        self._column_edges = [pairs[lo:hi, 1] for lo, hi in zip(self._edge_indptr[:-1], self._edge_indptr[1:])]
+        n_bins = int(np.diff(self._edge_indptr).max(initial=0)) + 1
+        # Codes are bin counts 0..n_edges; the largest value of the dtype marks a missing value
+        self.dtype = np.uint8 if n_bins < 255 else np.uint16
+        self.missing = np.iinfo(self.dtype).max
+
+    def split_bounds(self, forest):
+        """Raw-space edge of every split node of forest, in node order"""
+        split = ~forest.is_leaf
+        features = forest.split_feature[split]
+        return raw_split_bounds(forest.threshold[split], self.mean[features], self.scale[features])
+
+    @property
+    def n_edges(self):
+        return int(self._edges.shape[0])
+
+    def edge_index(self, features, bounds):
+        """Position of each split's edge within its feature's edges (go right iff code > position)"""
+        columns = self._column_of[features]
+        keys = columns + 1j * np.asarray(bounds, dtype=np.float64)
+        return np.searchsorted(self._edges, keys, side='left') - self._edge_indptr[columns]
+
+    def transform(self, X, columns=None):
+        """Bin codes (n_rows, n_used) for raw rows; columns gives X's feature indices when it is not full width"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if columns is None:
+            values = X[:, self.used]
+        else:
+            source = np.searchsorted(columns, self.used)
+            if np.any(source >= len(columns)) or np.any(np.asarray(columns)[np.minimum(source, len(columns) - 1)] != self.used):
+                raise ValueError("Input columns do not cover every feature the trees split on")
+            values = X[:, source]
+
+        missing = np.isnan(values)
+        if values.shape[0] < BATCH_BINNING_ROWS:
+            # Few rows: one searchsorted over the (column, edge) keys bins every value at once
+            keys = np.arange(self.used.shape[0], dtype=np.float64) + 1j * np.where(missing, 0.0, values)
+            codes = (np.searchsorted(self._edges, keys.ravel(), side='right').reshape(values.shape)
+                     - self._edge_indptr[:-1]).astype(self.dtype)
+        else:
+            # Many rows: a real-valued searchsorted per column is cheaper than complex comparisons
+            codes = np.empty(values.shape, dtype=self.dtype)
+            for j, edges in enumerate(self._column_edges):
+                codes[:, j] = np.searchsorted(edges, values[:, j], side='right')
+        codes[missing] = self.missing
+        return codes
+
+
+def compile_member(member):
+    """CompiledForest for an ensemble member: sklearn wrapper, native booster member or already compiled"""
+    if isinstance(member, BinnedForest):
+        # Binned members walk bin codes; their source forest walks scaled floats
+        return member.forest
+    if isinstance(member, CompiledForest):
+        return member
+    if hasattr(member, 'get_booster'):
+        return CompiledForest.from_model(member)
+    return CompiledForest.from_booster(member.booster, member.iteration_range[1] or None)
+
+
+def bin_ensemble(forests, mean, scale):
+    """Build one FeatureBinner for the forests and wrap each as a BinnedForest"""
+    binner = FeatureBinner(forests, mean, scale)
+    return binner, [BinnedForest(forest, binner) for forest in forests]
+
+
+class BinnedForest(CompiledForest):
+    """CompiledForest that walks its trees on bin codes from a FeatureBinner instead of float features"""
+
+    def __init__(self, forest, binner, bounds=None):
+        super().__init__(forest.split_feature, forest.threshold, forest.left, forest.right,
+                         forest.default_left, forest.is_leaf, forest.roots, forest.tree_group,
+                         forest.iteration_indptr, forest.base_score, forest.max_depth, forest.num_feature)
+        self.binner = binner
+        self.forest = forest
+        split = ~forest.is_leaf
+        # Leaves keep column 0 and edge 0; they point at themselves, so the values are never used
+        self.split_column = np.zeros(forest.split_feature.shape[0], dtype=np.intp)
+        self.split_column[split] = binner._column_of[forest.split_feature[split]]
+        self.split_bin = np.zeros(forest.split_feature.shape[0], dtype=binner.dtype)
+        if bounds is None:
+            bounds = binner.split_bounds(forest)
+        self.split_bin[split] = binner.edge_index(forest.split_feature[split], bounds)
+        # 32-bit node and column indices halve the per-(row, tree) working set of the walk
+        self.split_column = self.split_column.astype(np.int32)
+        self._children32 = self._children.astype(np.int32)
+
+    def predict_leaves(self, codes, iteration_range=None):
+        """Return the leaf node index reached in every tree for binned rows, shape (n_rows, n_trees)"""
+        codes = np.ascontiguousarray(codes)
+        if codes.ndim == 1:
+            codes = codes.reshape(1, -1)
+        first, last, _, _ = self._tree_slice(iteration_range)
+
+        n_rows = codes.shape[0]
+        index_dtype = np.int32 if codes.size < 2 ** 31 else np.intp
+        node = np.broadcast_to(self.roots[first:last].astype(np.int32), (n_rows, last - first)).copy()
+        row_offsets = (np.arange(n_rows, dtype=index_dtype) * codes.shape[1])[:, None]
+        flat_codes = codes.ravel()
+        children = self._children32
+
+        for _ in range(self.max_depth):
+            code = np.take(flat_codes, row_offsets + np.take(self.split_column, node))
+            go_right = code > np.take(self.split_bin, node)
+            # Missing values follow the learned default direction
+            missing = code == self.binner.missing
+            if missing.any():
+                go_right[missing] = ~np.take(self.default_left, node[missing])
+            node = np.take(children, 2 * node + go_right)
+        return node
+
+
+def _ensemble(members, weights, X):
+    proba = sum(w * np.asarray(m.predict_proba(X), dtype=np.float64) for m, w in zip(members, weights))
+    return proba / sum(weights)
+
+
+def compare_precisions(members, weights, mean, scale, X, repeat=5):
+    """Agreement with the float64 path, throughput and memory of the float32, compiled and binned paths"""
+    import tracemalloc
+
+    X = np.asarray(X, dtype=np.float64)
+    mean64, scale64 = np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+    mean32, scale32 = mean64.astype(np.float32), scale64.astype(np.float32)
+    forests = [compile_member(m) for m in members]
+    binner, binned = bin_ensemble(forests, mean64, scale64)
+    X32 = X.astype(np.float32)
+
+    paths = {
+        'float64': (X, lambda A: _ensemble(members, weights, (A - mean64) / scale64)),
+        'float32': (X32, lambda A: _ensemble(members, weights, (A - mean32) / scale32)),
+        'compiled': (X, lambda A: _ensemble(forests, weights, (A - mean64) / scale64)),
+        'binned': (X, lambda A: _ensemble(binned, weights, binner.transform(A)))
+    }
+    reference = None
+    results = {'rows': int(X.shape[0]), 'bin_edges': binner.n_edges,
+               'code_dtype': np.dtype(binner.dtype).name, 'used_features': int(binner.used.shape[0])}
+    for name, (data, score) in paths.items():
+        tracemalloc.start()
+        proba = score(data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            score(data)
+            timings.append(time.perf_counter() - start)
+        if reference is None:
+            reference = proba
+        # Bytes per row handed to the trees: scaled floats, or one bin code per used feature
+        model_input = binner.transform(data[:1]) if name == 'binned' else data[:1]
+        results[name] = {
+            'rows_per_sec': X.shape[0] / min(timings),
+            'peak_bytes_per_row': peak / X.shape[0],
+            'model_input_bytes_per_row': int(model_input.nbytes),
+            'agreement': float(np.mean(proba.argmax(axis=1) == reference.argmax(axis=1))),
+            'max_abs_diff': float(np.abs(proba - reference).max())
+        }
+    return results
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Compare float64, float32 and binned inference on the reference dataset")
+    parser.add_argument('--rows', type=int, default=4096, help="reference rows to score")
+    parser.add_argument('--repeat', type=int, default=5, help="timed passes per path (best is reported)")
+    args = parser.parse_args(argv)
+
+    import json
+    import app
+    with contextlib.redirect_stdout(sys.stderr):
+        loaded = app.load_model()
+    if not loaded:
+        print("❌ Model loading failed!", file=sys.stderr)
+        return 1
+
+    frame = app.dataset_store.rows(np.arange(min(args.rows, len(app.dataset_store))))
+    X = frame.reindex(columns=app.feature_columns).apply(app.pd.to_numeric, errors='coerce').fillna(0.0)
+    weights = app.model_weights if len(app.model_weights) == len(app.models) else [1] * len(app.models)
+    results = compare_precisions(app.models, weights, app.scaler.mean_, app.scaler.scale_,
+                                 X.to_numpy(dtype=np.float64), args.repeat)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
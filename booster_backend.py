@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Native XGBoost inference backend for the IoT Device Identification System
+Scores ensemble members through Booster.inplace_predict on contiguous float32
+arrays, bypassing the sklearn wrapper, with a configurable per-worker thread count
+
+Usage (latency comparison against predict_device_category):
+    python booster_backend.py [--rows 1] [--repeat 500] [--nthread 1]
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import xgboost as xgb
+
+# Default OpenMP threads per booster; keep low so gunicorn workers don't oversubscribe cores
+DEFAULT_NTHREAD = int(os.environ.get('IOT_XGB_NTHREAD', '1'))
+
+
+class NativeBoosterMember:
+    """Ensemble member backed directly by an xgboost.Booster"""
+
+    def __init__(self, booster, nthread=DEFAULT_NTHREAD, iteration_range=(0, 0), name=None):
+        self.booster = booster
+        self.iteration_range = iteration_range
+        self.name = name
+        self.set_nthread(nthread)
+
+    @classmethod
+    def from_model(cls, model, nthread=DEFAULT_NTHREAD):
+        """Extract the booster from a pickled sklearn-wrapper model"""
+        # Match the sklearn wrapper, which stops at best_iteration when early stopping was used
+        best_iteration = getattr(model, 'best_iteration', None)
+        iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+        return cls(model.get_booster().copy(), nthread=nthread, iteration_range=iteration_range,
+                   name=type(model).__name__)
+
+    @classmethod
+    def from_json(cls, path, nthread=DEFAULT_NTHREAD):
+        """Load a booster saved with Booster.save_model (e.g. best_xgb_model.json)"""
+        booster = xgb.Booster()
+        booster.load_model(path)
+        return cls(booster, nthread=nthread, name=os.path.basename(path))
+
+    def set_nthread(self, nthread):
+        """Limit the OpenMP threads this booster uses per prediction call"""
+        self.nthread = nthread
+        if nthread:
+            self.booster.set_param({'nthread': int(nthread)})
+
+    @property
+    def n_rounds(self):
+        """Boosting rounds used at prediction time"""
+        return self.iteration_range[1] or self.booster.num_boosted_rounds()
+
+    def predict_margin(self, X, iteration_range=None, base_margin=None):
+        """Return raw margins; base_margin replaces base_score as the starting margin"""
+        data = np.ascontiguousarray(X, dtype=np.float32)
+        return np.asarray(self.booster.inplace_predict(data, iteration_range=iteration_range or self.iteration_range,
+                                                       predict_type='margin', validate_features=False,
+                                                       base_margin=base_margin))
+
+    def predict_proba(self, X, iteration_range=None, base_margin=None):
+        """Return class probabilities with shape (n_rows, n_classes)"""
+        data = np.ascontiguousarray(X, dtype=np.float32)
+        proba = self.booster.inplace_predict(data, iteration_range=iteration_range or self.iteration_range,
+                                             validate_features=False, base_margin=base_margin)
+        proba = np.asarray(proba)
+        # Binary objectives return P(class 1) only
+        if proba.ndim == 1:
+            proba = np.column_stack([1.0 - proba, proba])
+        return proba
+
+
+def to_native_members(models, nthread=DEFAULT_NTHREAD):
+    """Replace sklearn-wrapper members with native booster members where possible"""
+    return [NativeBoosterMember.from_model(m, nthread=nthread) if hasattr(m, 'get_booster') else m
+            for m in models]
+
+
+def _time_calls(fn, repeat):
+    """Return per-call latencies in microseconds"""
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies[i] = (time.perf_counter() - start) * 1e6
+    return latencies
+
+
+def compare_latency(rows=1, repeat=500, nthread=DEFAULT_NTHREAD):
+    """Time predict_device_category-style scoring through the sklearn wrapper vs the native backend"""
+    import app
+
+    sklearn_members = list(app.models)
+    native_members = to_native_members(sklearn_members, nthread=nthread)
+    # Time the models themselves, not prediction cache hits
+    cache, app.prediction_cache = app.prediction_cache, None
+
+    # Inputs drawn around the scaler means, like real traffic rows
+    rng = np.random.default_rng(0)
+    X = app.scaler.mean_ + rng.standard_normal((rows, len(app.feature_columns))) * app.scaler.scale_
+
+    results = {}
+    outputs = {}
+    for label, members in (('sklearn', sklearn_members), ('native', native_members)):
+        app.models = members
+        if rows == 1:
+            fn = lambda: app.predict_device_category(X[0].tolist())
+        else:
+            fn = lambda: app.predict_proba_matrix(X)
+        fn()  # warm-up
+        latencies = _time_calls(fn, repeat)
+        outputs[label] = app.predict_proba_matrix(X)
+        results[label] = {
+            'mean_us': float(latencies.mean()),
+            'p50_us': float(np.percentile(latencies, 50)),
+            'p95_us': float(np.percentile(latencies, 95)),
+            'rows_per_sec': float(rows / (latencies.mean() / 1e6))
+        }
+    app.models = sklearn_members
+    app.prediction_cache = cache
+
+    results['max_abs_diff'] = float(np.abs(outputs['sklearn'] - outputs['native']).max())
+    results['speedup'] = results['sklearn']['mean_us'] / results['native']['mean_us']
+    return results
+
+
+def main(argv=None):
+    """Print a latency comparison between the sklearn and native inference paths"""
+    parser = argparse.ArgumentParser(description="Compare sklearn-wrapper and native booster latency")
+    parser.add_argument('--rows', type=int, default=1, help="rows per prediction call")
+    parser.add_argument('--repeat', type=int, default=500, help="timed calls per backend")
+    parser.add_argument('--nthread', type=int, default=DEFAULT_NTHREAD, help="threads per native booster")
+    args = parser.parse_args(argv)
+
+    import app
+    if not app.load_model():
+        print("❌ Model loading failed!")
+        return 1
+
+    results = compare_latency(rows=args.rows, repeat=args.repeat, nthread=args.nthread)
+    print(f"\nLatency for {args.rows} row(s) per call, {args.repeat} calls, nthread={args.nthread}:")
+    for label in ('sklearn', 'native'):
+        r = results[label]
+        print(f"  {label:8s} mean {r['mean_us']:9.1f} us   p50 {r['p50_us']:9.1f} us   "
+              f"p95 {r['p95_us']:9.1f} us   {r['rows_per_sec']:12,.0f} rows/s")
+    print(f"  speedup  {results['speedup']:.2f}x   max |Δp| {results['max_abs_diff']:.2e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Early-exit cascade for the IoT Device Identification System
+Scores rows with truncated boosting-round prefixes of the ensemble first and
+only sends rows whose top-two class probabilities are close on to the next,
+more expensive stage. The last stage is always the full ensemble. Each stage
+resumes from the raw margins the previous one reached, so a row that goes all
+the way evaluates every tree once, as it would without the cascade.
+
+Usage (exit rates and accuracy delta on the reference dataset):
+    python cascade.py [--rounds 25,50] [--margins 0.2,0.4,0.6,0.8] [--rows 10000]
+"""
+
+import sys
+import json
+import argparse
+import threading
+import contextlib
+import numpy as np
+
+
+def member_rounds(member):
+    """Boosting rounds a tree-model member uses at prediction time, or None for other models"""
+    if hasattr(member, 'n_rounds'):
+        return member.n_rounds
+    if hasattr(member, 'get_booster'):
+        best_iteration = getattr(member, 'best_iteration', None)
+        if best_iteration is not None:
+            return best_iteration + 1
+        return member.get_booster().num_boosted_rounds()
+    return None
+
+
+def margin_proba(margin):
+    """Class probabilities from raw margins: softmax, or the logistic for a single output"""
+    margin = np.asarray(margin, dtype=np.float64).reshape(margin.shape[0], -1)
+    if margin.shape[1] == 1:
+        p = 1.0 / (1.0 + np.exp(-margin[:, 0]))
+        return np.column_stack([1.0 - p, p])
+    proba = np.exp(margin - margin.max(axis=1, keepdims=True))
+    return proba / proba.sum(axis=1, keepdims=True)
+
+
+def _predict_margin(member, X, start, stop, base_margin):
+    if hasattr(member, 'predict_margin'):
+        # Compiled forests and native boosters
+        return member.predict_margin(X, iteration_range=(start, stop), base_margin=base_margin)
+    return member.predict(X, output_margin=True, iteration_range=(start, stop), base_margin=base_margin)
+
+
+def staged_proba(member, X, start, stop, margin=None):
+    """(proba, margin) of a member after its first `stop` boosting rounds (all of them when stop is None)
+
+    Only rounds [start, stop) are evaluated, on top of margin: the member's raw margins
+    after `start` rounds (None evaluates from round 0). The full stage uses the member's
+    own predict_proba, so its result equals scoring without the cascade.
+    """
+    total = member_rounds(member)
+    if total is None:
+        # Non-tree members have no rounds: score once, then carry the probabilities along
+        proba = member.predict_proba(X) if margin is None else margin
+        return proba, proba
+    if margin is None:
+        start = 0
+    if stop is None:
+        if start < total:
+            return member.predict_proba(X, iteration_range=(start, total), base_margin=margin), None
+        # An earlier stage already covered every round (stages deeper than the model); the
+        # member's own output function keeps the full stage equal to scoring without the cascade
+        return member.predict_proba(X), None
+    stop = total if stop is None else min(stop, total)
+    if start < stop:
+        margin = _predict_margin(member, X, start, stop, margin)
+    return margin_proba(margin), margin
+
+
+def top2_margin(proba):
+    """Difference between the two largest class probabilities of each row"""
+    if proba.shape[1] < 2:
+        return np.ones(proba.shape[0])
+    top2 = np.partition(proba, -2, axis=1)[:, -2:]
+    return top2[:, 1] - top2[:, 0]
+
+
+class EarlyExitCascade:
+    """Runs rows through increasingly expensive stages until one is confident enough"""
+
+    def __init__(self, stage_rounds, margin_threshold=0.5):
+        self.stage_rounds = sorted(int(r) for r in stage_rounds)
+        self.margin_threshold = float(margin_threshold)
+        self._exits = np.zeros(len(self.stage_rounds) + 1, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    @property
+    def stage_names(self):
+        return [f'rounds_{r}' for r in self.stage_rounds] + ['full']
+
+    def run(self, X, stage_fns, margin_threshold=None, record=True):
+        """Score X through stage_fns (one per early stage, then the full model); return (proba, exit stage per row)
+
+        A stage function takes (rows, state carried by the previous stage for those rows, or
+        None) and returns (proba, state); state is a dict of per-row arrays.
+        """
+        threshold = self.margin_threshold if margin_threshold is None else margin_threshold
+        pending = np.arange(X.shape[0])
+        exit_stage = np.zeros(X.shape[0], dtype=np.intp)
+        proba = None
+        state = None
+        for stage, fn in enumerate(stage_fns):
+            stage_proba, state = fn(X[pending], state)
+            if proba is None:
+                proba = np.empty((X.shape[0], stage_proba.shape[1]))
+            last = stage == len(stage_fns) - 1
+            done = np.ones(pending.shape[0], dtype=bool) if last else top2_margin(stage_proba) >= threshold
+            proba[pending[done]] = stage_proba[done]
+            exit_stage[pending[done]] = stage
+            pending = pending[~done]
+            if not pending.size:
+                break
+            # Carry the state of the rows that go on to the next stage
+            state = {key: value[~done] for key, value in state.items()} if state else None
+        if record:
+            with self._lock:
+                self._exits += np.bincount(exit_stage, minlength=self._exits.shape[0])
+        return proba, exit_stage
+
+    def stats(self, full_rounds=None):
+        """Exit counts per stage; with full_rounds, also the boosting rounds rows paid for"""
+        with self._lock:
+            exits = self._exits.copy()
+        total = int(exits.sum())
+        result = {
+            'margin_threshold': self.margin_threshold,
+            'rows': total,
+            'stages': [{'stage': name, 'exits': int(count), 'exit_rate': count / total if total else 0.0}
+                       for name, count in zip(self.stage_names, exits)]
+        }
+        if full_rounds:
+            # Stages resume from the previous prefix, so a row costs the rounds of the stage it
+            # exits at; rows reaching the full ensemble cost full_rounds, as without the cascade
+            rounds = [min(r, full_rounds) for r in self.stage_rounds] + [full_rounds]
+            for entry, stage_rounds in zip(result['stages'], rounds):
+                entry['rounds_per_row'] = stage_rounds
+            mean_rounds = float(np.dot(exits, rounds) / total) if total else float(full_rounds)
+            result['full_rounds'] = full_rounds
+            result['mean_rounds_per_row'] = mean_rounds
+            result['cost_vs_full'] = mean_rounds / full_rounds
+        return result
+
+    def evaluate(self, X, y, stage_fns, margins):
+        """Exit rates and accuracy against the full ensemble for each margin threshold"""
+        full, _ = stage_fns[-1](X, None)
+        full_accuracy = float(np.mean(np.argmax(full, axis=1) == y))
+        results = {'rows': int(X.shape[0]), 'full_accuracy': full_accuracy, 'thresholds': []}
+        for margin in margins:
+            proba, exit_stage = self.run(X, stage_fns, margin_threshold=margin, record=False)
+            predicted = np.argmax(proba, axis=1)
+            counts = np.bincount(exit_stage, minlength=len(stage_fns))
+            accuracy = float(np.mean(predicted == y))
+            results['thresholds'].append({
+                'margin_threshold': margin,
+                'accuracy': accuracy,
+                'accuracy_delta': accuracy - full_accuracy,
+                'agreement_with_full': float(np.mean(predicted == np.argmax(full, axis=1))),
+                'exit_rates': {name: float(c / X.shape[0]) for name, c in zip(self.stage_names, counts)}
+            })
+        return results
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Measure cascade exit rates and accuracy on the reference dataset")
+    parser.add_argument('--rounds', default=None, help="comma-separated round prefixes for the early stages")
+    parser.add_argument('--margins', default='0.2,0.4,0.6,0.8', help="comma-separated thresholds to evaluate")
+    parser.add_argument('--rows', type=int, default=10000, help="reference rows to evaluate on")
+    args = parser.parse_args(argv)
+
+    import app
+    from dataset_store import TARGET_COLUMN
+    with contextlib.redirect_stdout(sys.stderr):
+        loaded = app.load_model()
+    if not loaded:
+        print("❌ Model loading failed!", file=sys.stderr)
+        return 1
+
+    cascade = app.cascade
+    if args.rounds:
+        cascade = EarlyExitCascade([int(r) for r in args.rounds.split(',') if r], app.CASCADE_MARGIN)
+    if cascade is None or not cascade.stage_rounds:
+        print("❌ No early stages: pass --rounds or set IOT_CASCADE_ROUNDS", file=sys.stderr)
+        return 1
+
+    frame = app.dataset_store.rows(np.arange(min(args.rows, len(app.dataset_store))))
+    labels = frame[TARGET_COLUMN].astype(str)
+    known = labels.isin(app.device_categories).to_numpy()
+    y = np.array([app.device_categories.index(c) if c in app.device_categories else -1 for c in labels])
+    X = app.scale_features(app.frame_to_matrix(frame))[known]
+
+    margins = [float(m) for m in args.margins.split(',') if m]
+    results = cascade.evaluate(X, y[known], app.cascade_stage_fns(cascade), margins)
+    results['stage_rounds'] = cascade.stage_rounds
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Bulk classification CLI for the IoT Device Identification System
+Streams a CSV or NDJSON file of flow records in fixed-size chunks, scores each
+chunk in one vectorized ensemble pass and writes predictions as it goes, so
+memory stays bounded whatever the input size
+
+Usage:
+    python classify_bulk.py flows.csv -o predictions.csv [--chunk-size 50000] [--workers 4] [--probabilities]
+                            [--start-method fork|spawn|forkserver]
+"""
+
+import os
+import sys
+import time
+import argparse
+import contextlib
+import multiprocessing as mp
+from collections import deque
+import pandas as pd
+
+import app
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def detect_format(path):
+    """Guess 'csv' or 'ndjson' from the file extension"""
+    lower = path.lower()
+    if lower.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_chunks(path, fmt, chunk_size):
+    """Yield DataFrames of at most chunk_size rows from a CSV or NDJSON file ('-' reads stdin)"""
+    source = sys.stdin if path == '-' else path
+    if fmt == 'ndjson':
+        reader = pd.read_json(source, lines=True, chunksize=chunk_size)
+    else:
+        reader = pd.read_csv(source, chunksize=chunk_size)
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def score_chunk(chunk, keep_columns=(), probabilities=False):
+    """Classify one chunk and return the output DataFrame"""
+    return app.score_frame(chunk, keep_columns, probabilities)
+
+
+def _init_worker():
+    """Load the models in pool workers that did not inherit them through fork"""
+    if app.scaler is None:
+        # Keep the loading banner off stdout, which may be carrying predictions ('-o -')
+        with contextlib.redirect_stdout(sys.stderr):
+            app.load_model()
+
+
+def _score_task(args):
+    return score_chunk(*args)
+
+
+class ChunkWriter:
+    """Append scored chunks to a CSV or NDJSON output ('-' writes stdout)"""
+
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        self._close = path != '-'
+        self._file = open(path, 'w', newline='') if self._close else sys.stdout
+        self._header = True
+
+    def write(self, frame):
+        if self.fmt == 'ndjson':
+            text = frame.rename_axis('row').reset_index().to_json(orient='records', lines=True)
+            self._file.write(text if text.endswith('\n') else text + '\n')
+        else:
+            frame.to_csv(self._file, index=True, index_label='row', header=self._header)
+        self._header = False
+        self._file.flush()
+
+    def close(self):
+        if self._close:
+            self._file.close()
+
+
+def classify_file(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, workers=1,
+                  input_format=None, output_format=None, keep_columns=(), probabilities=False,
+                  start_method=None):
+    """Stream input_path through the ensemble into output_path; return (rows, seconds)"""
+    input_format = input_format or detect_format(input_path)
+    output_format = output_format or detect_format(output_path)
+    writer = ChunkWriter(output_path, output_format)
+    chunks = iter_chunks(input_path, input_format, chunk_size)
+    rows = 0
+    start_time = time.perf_counter()
+
+    try:
+        if workers <= 1:
+            for chunk in chunks:
+                writer.write(score_chunk(chunk, keep_columns, probabilities))
+                rows += len(chunk)
+        else:
+            # Forked workers share the already-loaded models copy-on-write; others load their own
+            method = start_method or ('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+            with mp.get_context(method).Pool(workers, initializer=_init_worker) as pool:
+                # Keep at most two chunks per worker in flight so memory stays bounded
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.apply_async(_score_task, ((chunk, keep_columns, probabilities),)))
+                    if len(pending) >= 2 * workers:
+                        out = pending.popleft().get()
+                        writer.write(out)
+                        rows += len(out)
+                while pending:
+                    out = pending.popleft().get()
+                    writer.write(out)
+                    rows += len(out)
+    finally:
+        writer.close()
+
+    return rows, time.perf_counter() - start_time
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Classify large CSV/NDJSON flow-record files in streaming chunks")
+    parser.add_argument('input', help="input CSV or NDJSON file ('-' for stdin)")
+    parser.add_argument('-o', '--output', default='-', help="output file ('-' for stdout, the default)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="rows scored per chunk")
+    parser.add_argument('--workers', type=int, default=1, help="processes scoring chunks in parallel")
+    parser.add_argument('--input-format', choices=['csv', 'ndjson'], help="override input format detection")
+    parser.add_argument('--output-format', choices=['csv', 'ndjson'], help="override output format detection")
+    parser.add_argument('--keep', default='', help="comma-separated input columns copied to the output")
+    parser.add_argument('--probabilities', action='store_true', help="add one probability column per class")
+    parser.add_argument('--start-method', choices=mp.get_all_start_methods(),
+                        help="how worker processes start (default: fork where available)")
+    args = parser.parse_args(argv)
+
+    if args.input != '-' and not os.path.exists(args.input):
+        print(f"❌ Input not found: {args.input}", file=sys.stderr)
+        return 1
+
+    # Model loading output goes to stderr so stdout can carry predictions
+    with contextlib.redirect_stdout(sys.stderr):
+        loaded = app.load_model()
+    if not loaded:
+        print("❌ Model loading failed!", file=sys.stderr)
+        return 1
+
+    keep_columns = tuple(col for col in args.keep.split(',') if col)
+    rows, seconds = classify_file(args.input, args.output, args.chunk_size, args.workers,
+                                  args.input_format, args.output_format, keep_columns, args.probabilities,
+                                  args.start_method)
+    print(f"✅ Classified {rows:,} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Reference dataset store for the IoT Device Identification System
+Serves the augmented reference set from a memory-mapped binary layout when one
+has been built (shared by every worker through the page cache, O(1) row access),
+otherwise loads the CSV once; either way reloads only when the files change
+
+Memory-mapped layout (a directory next to the CSV, '<name>.mmap/'):
+    features.npy      float32 (n_rows, n_features), row-major
+    labels.npy        int16 label code per row
+    class_order.npy   row indices grouped by label code (stable)
+    class_indptr.npy  class c owns class_order[class_indptr[c]:class_indptr[c + 1]]
+    meta.json         feature_columns, categories (by descending count), counts, source CSV mtime
+
+Usage (one-time conversion, streams the CSV in chunks):
+    python dataset_store.py [--dataset iot_device_test_augmented_10k.csv] [--output DIR] [--chunk-size 100000]
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+DEFAULT_DATASET_PATH = 'iot_device_test_augmented_10k.csv'
+TARGET_COLUMN = 'device_category'
+META_FILE = 'meta.json'
+
+
+def default_mmap_dir(csv_path):
+    return os.path.splitext(csv_path)[0] + '.mmap'
+
+
+def convert_to_mmap(csv_path, output_dir=None, chunk_size=100000):
+    """Convert the reference CSV to the memory-mapped layout in two streaming passes; return the meta dict"""
+    output_dir = output_dir or default_mmap_dir(csv_path)
+
+    # Pass 1: row count and label distribution, reading only the label column
+    counts = pd.Series(dtype='int64')
+    for chunk in pd.read_csv(csv_path, usecols=[TARGET_COLUMN], chunksize=chunk_size):
+        counts = counts.add(chunk[TARGET_COLUMN].astype(str).value_counts(), fill_value=0)
+    counts = counts.astype('int64').sort_values(ascending=False, kind='stable')
+    categories = [str(c) for c in counts.index]
+    code_of = {c: i for i, c in enumerate(categories)}
+    n_rows = int(counts.sum())
+
+    tmp_dir = output_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    # Pass 2: fill the feature matrix and label codes chunk by chunk
+    header = pd.read_csv(csv_path, nrows=0).columns
+    feature_columns = [col for col in header if col != TARGET_COLUMN]
+    features = np.lib.format.open_memmap(os.path.join(tmp_dir, 'features.npy'), mode='w+',
+                                         dtype=np.float32, shape=(n_rows, len(feature_columns)))
+    labels = np.lib.format.open_memmap(os.path.join(tmp_dir, 'labels.npy'), mode='w+',
+                                       dtype=np.int16, shape=(n_rows,))
+    offset = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        end = offset + len(chunk)
+        values = chunk[feature_columns].apply(pd.to_numeric, errors='coerce').fillna(0.0)
+        features[offset:end] = values.to_numpy(dtype=np.float32)
+        labels[offset:end] = chunk[TARGET_COLUMN].astype(str).map(code_of).to_numpy(dtype=np.int16)
+        offset = end
+    features.flush()
+    labels.flush()
+
+    # Per-class row indices in CSR form
+    index_dtype = np.int32 if n_rows < 2 ** 31 else np.int64
+    np.save(os.path.join(tmp_dir, 'class_order.npy'), np.argsort(labels, kind='stable').astype(index_dtype))
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=len(categories)))))
+    np.save(os.path.join(tmp_dir, 'class_indptr.npy'), indptr.astype(np.int64))
+    del features, labels
+
+    meta = {
+        'n_rows': n_rows,
+        'feature_columns': feature_columns,
+        'categories': categories,
+        'category_counts': {c: int(n) for c, n in counts.items()},
+        'source': os.path.basename(csv_path),
+        'source_mtime_ns': os.stat(csv_path).st_mtime_ns
+    }
+    with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.rename(tmp_dir, output_dir)
+    return meta
+
+
+class DatasetStore:
+    """Process-wide cache of the reference dataset and its derived summaries"""
+
+    def __init__(self, path=DEFAULT_DATASET_PATH, mmap_dir=None):
+        self.path = path
+        self.mmap_dir = mmap_dir or default_mmap_dir(path)
+        self._lock = threading.Lock()
+        self._version = None
+        self._source_key = self._source_cached = None
+        # Everything derived from one version of the files, swapped as a unit
+        self._data = None
+
+    def _source(self):
+        """Return ('mmap' | 'csv', mtime) for the preferred current source"""
+        meta_path = os.path.join(self.mmap_dir, META_FILE)
+        meta_mtime = os.stat(meta_path).st_mtime_ns if os.path.exists(meta_path) else None
+        csv_mtime = os.stat(self.path).st_mtime_ns if os.path.exists(self.path) else None
+        key = (meta_mtime, csv_mtime)
+        if key != self._source_key:
+            source = None
+            if meta_mtime is not None:
+                with open(meta_path) as f:
+                    source_mtime = json.load(f)['source_mtime_ns']
+                # A CSV edited after the conversion wins until the layout is rebuilt
+                if csv_mtime is None or csv_mtime == source_mtime:
+                    source = ('mmap', meta_mtime)
+            if source is None:
+                if csv_mtime is None:
+                    raise FileNotFoundError(f"Reference dataset not found: {self.path}")
+                source = ('csv', csv_mtime)
+            self._source_key, self._source_cached = key, source
+        return self._source_cached
+
+    def available(self):
+        return os.path.exists(self.path) or os.path.exists(os.path.join(self.mmap_dir, META_FILE))
+
+    def _load_csv(self):
+        """Parse the CSV and precompute summaries and sampling indices"""
+        frame = pd.read_csv(self.path)
+        feature_columns = [col for col in frame.columns if col != TARGET_COLUMN]
+        counts = frame[TARGET_COLUMN].astype(str).value_counts()
+        categories = [str(c) for c in counts.index]
+        codes = frame[TARGET_COLUMN].astype(str).map({c: i for i, c in enumerate(categories)}).to_numpy(dtype=np.int16)
+        return {
+            'frame': frame,
+            'feature_columns': feature_columns,
+            'features': frame[feature_columns].to_numpy(dtype=float),
+            'labels': codes,
+            'categories': categories,
+            'category_counts': {c: int(n) for c, n in counts.items()},
+            'class_indices': {c: np.flatnonzero(codes == i) for i, c in enumerate(categories)}
+        }
+
+    def _load_mmap(self):
+        """Open the binary layout read-only; pages are shared with every other process mapping it"""
+        with open(os.path.join(self.mmap_dir, META_FILE)) as f:
+            meta = json.load(f)
+        load = lambda name: np.load(os.path.join(self.mmap_dir, name), mmap_mode='r')
+        order, indptr = load('class_order.npy'), np.load(os.path.join(self.mmap_dir, 'class_indptr.npy'))
+        return {
+            'feature_columns': meta['feature_columns'],
+            'features': load('features.npy'),
+            'labels': load('labels.npy'),
+            'categories': meta['categories'],
+            'category_counts': meta['category_counts'],
+            'class_indices': {c: order[indptr[i]:indptr[i + 1]] for i, c in enumerate(meta['categories'])}
+        }
+
+    def _current(self):
+        """Return the cached data, reloading it if the source or its mtime changed"""
+        version = self._source()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._data = self._load_mmap() if version[0] == 'mmap' else self._load_csv()
+                    self._version = version
+        return self._data
+
+    @property
+    def backend(self):
+        """'mmap' or 'csv', whichever serves the data"""
+        return self._source()[0]
+
+    def __len__(self):
+        return int(self._current()['features'].shape[0])
+
+    def get_frame(self):
+        """Return the whole dataset as a DataFrame (materialized from the mapping on first use)"""
+        data = self._current()
+        if 'frame' not in data:
+            data['frame'] = self.rows(np.arange(data['features'].shape[0]))
+        return data['frame']
+
+    def rows(self, indices):
+        """Return the given rows (features and label) as a DataFrame, reading only those rows"""
+        data = self._current()
+        indices = np.asarray(indices, dtype=np.intp)
+        frame = pd.DataFrame(np.asarray(data['features'][indices], dtype=float), columns=data['feature_columns'])
+        frame[TARGET_COLUMN] = np.asarray(data['categories'], dtype=object)[data['labels'][indices]]
+        return frame
+
+    @property
+    def feature_columns(self):
+        return self._current()['feature_columns']
+
+    def info(self):
+        """Return the dataset summary (sample count, feature count, category distribution)"""
+        data = self._current()
+        return {
+            'total_samples': int(data['features'].shape[0]),
+            'total_features': len(data['feature_columns']),
+            'device_categories': list(data['category_counts'].keys()),
+            'category_counts': dict(data['category_counts'])
+        }
+
+    def sample(self, category=None):
+        """Return a random (features dict, label) pair, optionally from a single category"""
+        data = self._current()
+        if category is not None:
+            members = data['class_indices'][category]
+            idx = int(members[np.random.randint(members.shape[0])])
+        else:
+            idx = np.random.randint(data['features'].shape[0])
+        row = dict(zip(data['feature_columns'], data['features'][idx].tolist()))
+        return row, data['categories'][data['labels'][idx]]
+
+    def stratified_indices(self, n_rows, seed=0):
+        """Row indices drawn without replacement, split across classes in proportion to their size"""
+        data = self._current()
+        total = data['features'].shape[0]
+        rng = np.random.default_rng(seed)
+        picked = []
+        for members in data['class_indices'].values():
+            take = min(members.shape[0], max(1, int(round(n_rows * members.shape[0] / total))))
+            picked.append(np.asarray(members)[rng.choice(members.shape[0], take, replace=False)])
+        return np.sort(np.concatenate(picked)) if picked else np.empty(0, dtype=np.intp)
+
+
+def main(argv=None):
+    """Convert the reference CSV into the memory-mapped layout"""
+    parser = argparse.ArgumentParser(description="Build the memory-mapped reference dataset used by DatasetStore")
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH, help="reference CSV to convert")
+    parser.add_argument('--output', help="destination directory (default: '<dataset>.mmap')")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="CSV rows parsed per chunk")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.dataset):
+        print(f"❌ Dataset not found: {args.dataset}")
+        return 1
+
+    output_dir = args.output or default_mmap_dir(args.dataset)
+    meta = convert_to_mmap(args.dataset, output_dir, args.chunk_size)
+    size = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+    print(f"✅ Wrote {output_dir} ({size:,} bytes)")
+    print(f"   Rows:     {meta['n_rows']:,}")
+    print(f"   Features: {len(meta['feature_columns'])}")
+    print(f"   Classes:  {len(meta['categories'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+Drift and out-of-distribution monitoring for the IoT Device Identification System
+Folds the standardized feature vectors of live predictions into running per-feature
+moments and fixed-edge histograms, overall and per predicted class, and compares
+them against the reference distribution: the training dataset scaled by the fitted
+StandardScaler, or the scaler's own N(0, 1) when the dataset is not available.
+Rows are buffered and folded in vectorized batches, so observing a single
+prediction costs one row copy.
+
+Scores per feature:
+    psi         population stability index of the live vs reference histogram
+                (< 0.1 stable, 0.1-0.25 moderate, > 0.25 significant drift)
+    mean_shift  live mean minus reference mean, in reference standard deviations
+    std_ratio   live standard deviation over reference standard deviation
+    tail_rate   share of live values beyond the outermost histogram edges
+"""
+
+import math
+import threading
+import numpy as np
+
+# Bin edges in standardized units, shared by every feature; the two outer bins are open-ended
+DEFAULT_EDGES = np.array([-4.0, -3.0, -2.0, -1.5, -1.0, -0.5, -0.25, 0.0, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 4.0])
+# Floor for bin proportions so empty bins keep the PSI finite
+PSI_EPSILON = 1e-4
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+
+def bin_counts(X, labels, n_labels, edges):
+    """Histogram counts with shape (n_labels, n_features, n_bins) for standardized rows and their labels"""
+    n_rows, n_features = X.shape
+    n_bins = edges.shape[0] + 1
+    # Bin index = number of edges <= x; a few uint8 comparisons beat searchsorted for short edge lists
+    bins = np.zeros(X.shape, dtype=np.uint8)
+    above = np.empty(X.shape, dtype=bool)
+    for edge in edges:
+        np.greater_equal(X, edge, out=above)
+        bins += above.view(np.uint8)
+    offsets = (np.arange(n_labels)[:, None] * n_features + np.arange(n_features)) * n_bins
+    flat = offsets[np.asarray(labels, dtype=np.intp)] + bins
+    return np.bincount(flat.ravel(), minlength=n_labels * n_features * n_bins).reshape(n_labels, n_features, n_bins)
+
+
+def group_moments(X, labels, n_labels):
+    """Per-label row counts, means and sums of squared deviations (M2), all from one pass of matrix products"""
+    onehot = np.zeros((n_labels, X.shape[0]))
+    onehot[labels, np.arange(X.shape[0])] = 1.0
+    count = onehot.sum(axis=1)
+    mean = (onehot @ X) / np.maximum(count, 1)[:, None]
+    m2 = onehot @ (X - mean[labels]) ** 2
+    return count, mean, m2
+
+
+def merge_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """Chan et al. parallel merge of two sets of (count, mean, M2) moments"""
+    count = count_a + count_b
+    safe = np.maximum(count, 1)[..., None]
+    delta = mean_b - mean_a
+    mean = mean_a + delta * (count_b[..., None] / safe)
+    m2 = m2_a + m2_b + delta ** 2 * (count_a * count_b)[..., None] / safe
+    return count, mean, m2
+
+
+def total_moments(count, mean, m2):
+    """Collapse per-label moments into overall moments"""
+    total = count.sum()
+    total_mean = (count[:, None] * mean).sum(axis=0) / max(total, 1)
+    total_m2 = m2.sum(axis=0) + (count[:, None] * (mean - total_mean) ** 2).sum(axis=0)
+    return total, total_mean, total_m2
+
+
+def population_stability_index(live, reference):
+    """PSI over the last axis for histogram counts (or proportions) of the same shape"""
+    live_p = np.maximum(live / np.maximum(live.sum(axis=-1, keepdims=True), 1), PSI_EPSILON)
+    ref_p = np.maximum(reference / np.maximum(reference.sum(axis=-1, keepdims=True), 1e-12), PSI_EPSILON)
+    return np.sum((live_p - ref_p) * np.log(live_p / ref_p), axis=-1)
+
+
+def normal_bin_proportions(edges):
+    """Bin probabilities of N(0, 1) for the edges, the reference a fitted StandardScaler implies"""
+    cdf = np.array([0.0] + [0.5 * (1.0 + math.erf(e / math.sqrt(2.0))) for e in edges] + [1.0])
+    return np.diff(cdf)
+
+
+class DriftMonitor:
+    """Running live statistics of standardized features, scored against a reference distribution"""
+
+    def __init__(self, feature_names, class_names, reference_hist, reference_mean, reference_var,
+                 reference_class=None, edges=DEFAULT_EDGES, batch_rows=256, max_batch_rows=512,
+                 min_rows=30, reference_source='scaler'):
+        # reference_hist: (n_features, n_bins); reference_class: optional per-class
+        # (hist (n_classes, n_features, n_bins), mean, var (n_classes, n_features))
+        self.feature_names = list(feature_names)
+        self.class_names = list(class_names)
+        self.edges = np.asarray(edges, dtype=float)
+        self.batch_rows = int(batch_rows)
+        # Larger batches are thinned with a fixed stride to about this many rows before folding
+        self.max_batch_rows = max(int(max_batch_rows), self.batch_rows)
+        self.min_rows = int(min_rows)
+        self.reference_source = reference_source
+        self.reference_hist = np.asarray(reference_hist, dtype=float)
+        self.reference_mean = np.asarray(reference_mean, dtype=float)
+        self.reference_std = np.sqrt(np.asarray(reference_var, dtype=float))
+        self.reference_class = None
+        if reference_class is not None:
+            hist, mean, var = reference_class
+            self.reference_class = (np.asarray(hist, dtype=float), np.asarray(mean, dtype=float),
+                                    np.sqrt(np.asarray(var, dtype=float)))
+        self._lock = threading.Lock()
+        self._pending = np.empty((self.batch_rows, len(self.feature_names)))
+        self._pending_labels = np.empty(self.batch_rows, dtype=np.intp)
+        self.reset()
+
+    @classmethod
+    def from_reference(cls, X, labels, feature_names, class_names, edges=DEFAULT_EDGES, **kwargs):
+        """Reference statistics from standardized reference rows and their label indices (-1 = unknown class)"""
+        X = np.nan_to_num(np.asarray(X, dtype=float))
+        labels = np.asarray(labels, dtype=np.intp)
+        known = labels >= 0
+        edges = np.asarray(edges, dtype=float)
+        hist = bin_counts(X, np.zeros(X.shape[0], dtype=np.intp), 1, edges)[0]
+        class_hist = bin_counts(X[known], labels[known], len(class_names), edges)
+        count, mean, m2 = group_moments(X[known], labels[known], len(class_names))
+        class_var = m2 / np.maximum(count, 1)[:, None]
+        return cls(feature_names, class_names, hist, X.mean(axis=0), X.var(axis=0),
+                   reference_class=(class_hist, mean, class_var), edges=edges, reference_source='dataset', **kwargs)
+
+    @classmethod
+    def from_scaler(cls, feature_names, class_names, edges=DEFAULT_EDGES, **kwargs):
+        """Reference implied by the fitted scaler alone: every standardized feature ~ N(0, 1)"""
+        n_features = len(feature_names)
+        hist = np.tile(normal_bin_proportions(np.asarray(edges, dtype=float)), (n_features, 1))
+        return cls(feature_names, class_names, hist, np.zeros(n_features), np.ones(n_features),
+                   edges=edges, reference_source='scaler', **kwargs)
+
+    def reset(self):
+        """Forget the live statistics"""
+        n_classes, n_features, n_bins = len(self.class_names), len(self.feature_names), self.edges.shape[0] + 1
+        with self._lock:
+            self._n_pending = 0
+            self.rows_seen = 0
+            self._counts = np.zeros((n_classes, n_features, n_bins), dtype=np.int64)
+            self._count = np.zeros(n_classes)
+            self._mean = np.zeros((n_classes, n_features))
+            self._m2 = np.zeros((n_classes, n_features))
+            self.batches = 0
+
+    def observe(self, X, predicted):
+        """Record standardized rows and their predicted class indices; folded in batches of batch_rows"""
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        predicted = np.asarray(predicted, dtype=np.intp).ravel()
+        with self._lock:
+            self.rows_seen += X.shape[0]
+            if X.shape[0] >= self.batch_rows:
+                # A strided sample keeps every class's share while bounding the cost per call
+                stride = -(-X.shape[0] // self.max_batch_rows)
+                self._fold(np.nan_to_num(X[::stride]), predicted[::stride])
+                return
+            end = self._n_pending + X.shape[0]
+            if end > self.batch_rows:
+                self._flush()
+                end = X.shape[0]
+            self._pending[end - X.shape[0]:end] = X
+            self._pending_labels[end - X.shape[0]:end] = predicted
+            self._n_pending = end
+            if end == self.batch_rows:
+                self._flush()
+
+    def _flush(self):
+        if self._n_pending:
+            n = self._n_pending
+            self._n_pending = 0
+            self._fold(np.nan_to_num(self._pending[:n]), self._pending_labels[:n])
+
+    def _fold(self, X, labels):
+        """Merge one batch into the histograms and moments (caller holds the lock)"""
+        n_classes = len(self.class_names)
+        self._counts += bin_counts(X, labels, n_classes, self.edges)
+        count, mean, m2 = group_moments(X, labels, n_classes)
+        self._count, self._mean, self._m2 = merge_moments(self._count, self._mean, self._m2, count, mean, m2)
+        self.batches += 1
+
+    def _feature_scores(self, counts, count, mean, m2, reference):
+        """Per-feature psi, mean shift, std ratio and tail rate for one set of live statistics"""
+        ref_hist, ref_mean, ref_std = reference
+        # Constant reference features: shifts are in overall standard deviations, no ratio
+        spread = np.where(ref_std > 0, ref_std, np.where(self.reference_std > 0, self.reference_std, 1.0))
+        std = np.sqrt(m2 / max(count, 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std_ratio = np.where(ref_std > 0, std / np.where(ref_std > 0, ref_std, 1.0), np.nan)
+        return {
+            'psi': population_stability_index(counts, ref_hist),
+            'mean_shift': (mean - ref_mean) / spread,
+            'std_ratio': std_ratio,
+            'tail_rate': (counts[:, 0] + counts[:, -1]) / max(count, 1)
+        }
+
+    def _summarize(self, scores, count, top):
+        psi = scores['psi']
+        order = np.argsort(-psi)[:top]
+        return {
+            'rows': int(count),
+            'sufficient': bool(count >= self.min_rows),
+            'psi_max': float(psi.max()) if psi.size else 0.0,
+            'psi_mean': float(psi.mean()) if psi.size else 0.0,
+            'features_moderate': int(np.sum(psi >= PSI_MODERATE)),
+            'features_significant': int(np.sum(psi >= PSI_SIGNIFICANT)),
+            'top_features': [self._feature_entry(scores, i) for i in order]
+        }
+
+    def _feature_entry(self, scores, i):
+        entry = {'feature': self.feature_names[i]}
+        for key, values in scores.items():
+            value = float(values[i])
+            entry[key] = value if math.isfinite(value) else None
+        return entry
+
+    def report(self, top=10, all_features=False):
+        """Drift scores overall and per predicted class (the live rows are compared with the reference)"""
+        with self._lock:
+            self._flush()
+            counts, count, mean, m2 = self._counts.copy(), self._count.copy(), self._mean.copy(), self._m2.copy()
+            batches, rows_seen = self.batches, self.rows_seen
+
+        total_count, total_mean, total_m2 = total_moments(count, mean, m2)
+        overall = self._feature_scores(counts.sum(axis=0), float(total_count), total_mean, total_m2,
+                                       (self.reference_hist, self.reference_mean, self.reference_std))
+        result = {
+            'reference': self.reference_source,
+            'rows_seen': rows_seen,
+            'batches': batches,
+            'edges': self.edges.tolist(),
+            'overall': self._summarize(overall, total_count, top)
+        }
+        if all_features:
+            result['features'] = [self._feature_entry(overall, i) for i in range(len(self.feature_names))]
+
+        classes = {}
+        for c, name in enumerate(self.class_names):
+            if not count[c]:
+                continue
+            # Rows predicted as a class are compared with the reference rows labelled with it
+            reference = (self.reference_hist, self.reference_mean, self.reference_std)
+            if self.reference_class is not None and self.reference_class[0][c].sum():
+                reference = tuple(part[c] for part in self.reference_class)
+            scores = self._feature_scores(counts[c], float(count[c]), mean[c], m2[c], reference)
+            classes[name] = self._summarize(scores, count[c], top)
+        result['classes'] = classes
+        return result
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Feature-usage analysis for the IoT Device Identification System
+Finds the columns the ensemble's trees actually split on. Every other column
+can never change a prediction, so the service may skip parsing and scaling it.
+
+Usage:
+    python feature_pruning.py [--output used_features.json]
+"""
+
+import sys
+import json
+import argparse
+import contextlib
+import numpy as np
+
+
+def used_feature_indices(member):
+    """Indices of the features a tree-model member splits on, or None if they cannot be determined"""
+    if hasattr(member, 'used_features'):
+        return member.used_features()
+    if hasattr(member, 'get_booster'):
+        booster = member.get_booster()
+    else:
+        booster = getattr(member, 'booster', None)
+    if booster is None or not hasattr(booster, 'get_score'):
+        return None
+    # 'weight' counts splits per feature, so every used feature appears (and only those)
+    names = booster.feature_names
+    indices = [names.index(key) if names else int(key[1:])
+               for key in booster.get_score(importance_type='weight')]
+    return np.unique(np.asarray(indices, dtype=np.intp))
+
+
+def ensemble_used_features(models):
+    """Union of the features used by every member, or None if any member is not a known tree model"""
+    used = []
+    for member in models:
+        indices = used_feature_indices(member)
+        if indices is None:
+            return None
+        used.append(indices)
+    if not used:
+        return None
+    return np.unique(np.concatenate(used)).astype(np.intp)
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="List the features the loaded ensemble actually splits on")
+    parser.add_argument('--output', help="also write the feature names as JSON here")
+    args = parser.parse_args(argv)
+
+    import app
+    with contextlib.redirect_stdout(sys.stderr):
+        loaded = app.load_model()
+    if not loaded:
+        print("❌ Model loading failed!", file=sys.stderr)
+        return 1
+
+    for name, member in zip(app.model_names, app.models):
+        indices = used_feature_indices(member)
+        print(f"  - {name}: {'unknown' if indices is None else len(indices)} features used")
+    used = ensemble_used_features(app.models)
+    if used is None:
+        print("❌ Could not determine the features used by every ensemble member")
+        return 1
+
+    names = [app.feature_columns[i] for i in used]
+    print(f"✅ Ensemble splits on {len(names)} of {len(app.feature_columns)} features "
+          f"({len(names) / len(app.feature_columns):.0%})")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'n_total': len(app.feature_columns), 'used_features': names}, f, indent=2)
+        print(f"   Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
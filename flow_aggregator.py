@@ -0,0 +1,348 @@
+"""
+Streaming per-device flow aggregation for the IoT Device Identification System
+Packet events keyed by device (MAC or IP) update running statistics kept in
+preallocated NumPy arrays, one slot per active device. Each ingested batch is
+reduced per device window with vectorized group statistics and merged into the
+slots with Chan's parallel update, so no history is ever re-scanned. When a
+device's window closes, or it goes idle, its statistics become a row in
+feature_columns order ready for the ensemble.
+
+Event fields:
+    device      MAC/IP or any other device key (required)
+    ts          event time in seconds (required)
+    size        packet size in bytes (required)
+    direction   'A' (sent by the device, default) or 'B' (received)
+    ttl         IP time-to-live (optional)
+    ack, push, reset   TCP flags as booleans (optional)
+"""
+
+import math
+import threading
+import numpy as np
+
+# Running-statistic streams, in slot column order
+STREAMS = ('packet_size', 'packet_size_A', 'packet_size_B',
+           'packet_inter_arrivel', 'packet_inter_arrivel_A', 'packet_inter_arrivel_B',
+           'ttl', 'ttl_A', 'ttl_B')
+_SIZE, _IAT, _TTL = 0, 3, 6
+FLAGS = ('ack', 'push', 'reset')
+# Columns of the per-slot time array
+_START, _FIRST, _LAST, _LAST_A, _LAST_B = range(5)
+# z-score of the quartiles of a normal distribution, used to approximate firstQ/thirdQ
+_QUARTILE_Z = 0.6744897501960817
+
+
+def _group_stats(values, ids, n_groups):
+    """Count, mean, M2, min and max of values per group id"""
+    count = np.bincount(ids, minlength=n_groups).astype(float)
+    total = np.bincount(ids, weights=values, minlength=n_groups)
+    mean = np.divide(total, count, out=np.zeros(n_groups), where=count > 0)
+    m2 = np.bincount(ids, weights=(values - mean[ids]) ** 2, minlength=n_groups)
+    low = np.full(n_groups, np.inf)
+    high = np.full(n_groups, -np.inf)
+    np.minimum.at(low, ids, values)
+    np.maximum.at(high, ids, values)
+    return count, mean, m2, low, high
+
+
+def _diffs(ids, ts, carry):
+    """Inter-arrival times within each group of a (group, ts)-sorted sequence, continuing from carry[group]"""
+    same = ids[1:] == ids[:-1]
+    values = [ts[1:][same] - ts[:-1][same]]
+    groups = [ids[1:][same]]
+    first = np.concatenate(([True], ~same)) if ids.size else np.zeros(0, dtype=bool)
+    first_ids, first_ts = ids[first], ts[first]
+    previous = carry[first_ids]
+    ok = ~np.isnan(previous) & (first_ts >= previous)
+    values.append(first_ts[ok] - previous[ok])
+    groups.append(first_ids[ok])
+    return np.concatenate(values), np.concatenate(groups)
+
+
+def _last_per_group(ids, ts, n_groups):
+    """Latest ts per group of a (group, ts)-sorted sequence (NaN for empty groups)"""
+    out = np.full(n_groups, np.nan)
+    if ids.size:
+        last = np.concatenate((ids[1:] != ids[:-1], [True]))
+        out[ids[last]] = ts[last]
+    return out
+
+
+class FlowAggregator:
+    """Incremental per-device statistics with tumbling windows and idle-timeout eviction"""
+
+    def __init__(self, feature_columns, window_s=60.0, idle_timeout_s=120.0, min_packets=2, capacity=1024):
+        self.feature_columns = list(feature_columns)
+        self.window_s = float(window_s)
+        self.idle_timeout_s = float(idle_timeout_s)
+        self.min_packets = int(min_packets)
+        self._positions = {name: i for i, name in enumerate(self.feature_columns)}
+        self._slots = {}
+        self._free = []
+        self._lock = threading.Lock()
+        self._watermark = -math.inf
+        self._events = 0
+        self._windows = 0
+        self._evictions = 0
+        self._capacity = 0
+        self._allocate(int(capacity))
+
+    def _allocate(self, capacity):
+        """Create (or grow, keeping existing slots) the per-device state arrays"""
+        old = self._capacity
+        n = len(STREAMS)
+        fresh = {
+            'count': np.zeros((capacity, n)),
+            'mean': np.zeros((capacity, n)),
+            'm2': np.zeros((capacity, n)),
+            'min': np.full((capacity, n), np.inf),
+            'max': np.full((capacity, n), -np.inf),
+            'flags': np.zeros((capacity, 2 * len(FLAGS))),
+            'times': np.full((capacity, 5), np.nan)
+        }
+        for name, array in fresh.items():
+            if old:
+                array[:old] = getattr(self, f'_{name}')
+            setattr(self, f'_{name}', array)
+        self._free.extend(range(capacity - 1, old - 1, -1))
+        self._capacity = capacity
+
+    def _reset_slots(self, slots):
+        self._count[slots] = 0
+        self._mean[slots] = 0
+        self._m2[slots] = 0
+        self._min[slots] = np.inf
+        self._max[slots] = -np.inf
+        self._flags[slots] = 0
+        self._times[slots] = np.nan
+
+    def _state(self, slots):
+        return (self._count[slots], self._mean[slots], self._m2[slots], self._min[slots],
+                self._max[slots], self._flags[slots], self._times[slots])
+
+    def feature_matrix(self, count, mean, m2, low, high, flags, times):
+        """Turn per-window statistics into rows in feature_columns order (underivable features stay 0)"""
+        rows = np.zeros((count.shape[0], len(self.feature_columns)))
+        has = count > 0
+        var = np.divide(m2, count, out=np.zeros_like(m2), where=has)
+        stdev = np.sqrt(var)
+
+        def put(name, values):
+            position = self._positions.get(name)
+            if position is not None:
+                rows[:, position] = values
+
+        for i, stream in enumerate(STREAMS):
+            present = has[:, i]
+            put(f'{stream}_avg', mean[:, i])
+            put(f'{stream}_min', np.where(present, low[:, i], 0.0))
+            put(f'{stream}_max', np.where(present, high[:, i], 0.0))
+            put(f'{stream}_sum', mean[:, i] * count[:, i])
+            put(f'{stream}_var', var[:, i])
+            put(f'{stream}_stdev', stdev[:, i])
+            # Quartiles are approximated from the running moments
+            put(f'{stream}_median', mean[:, i])
+            put(f'{stream}_firstQ', np.where(present, np.maximum(mean[:, i] - _QUARTILE_Z * stdev[:, i], low[:, i]), 0.0))
+            put(f'{stream}_thirdQ', np.where(present, np.minimum(mean[:, i] + _QUARTILE_Z * stdev[:, i], high[:, i]), 0.0))
+
+        packets_a, packets_b = count[:, _SIZE + 1], count[:, _SIZE + 2]
+        bytes_a, bytes_b = mean[:, _SIZE + 1] * packets_a, mean[:, _SIZE + 2] * packets_b
+        put('packets', count[:, _SIZE])
+        put('packets_A', packets_a)
+        put('packets_B', packets_b)
+        put('packets_A_B_ratio', np.divide(packets_a, packets_b, out=np.zeros_like(packets_a), where=packets_b > 0))
+        put('bytes', bytes_a + bytes_b)
+        put('bytes_A', bytes_a)
+        put('bytes_B', bytes_b)
+        put('bytes_A_B_ratio', np.divide(bytes_a, bytes_b, out=np.zeros_like(bytes_a), where=bytes_b > 0))
+        put('duration', np.nan_to_num(times[:, _LAST] - times[:, _FIRST]))
+        for j, flag in enumerate(FLAGS):
+            put(flag, flags[:, 2 * j] + flags[:, 2 * j + 1])
+            put(f'{flag}_A', flags[:, 2 * j])
+            put(f'{flag}_B', flags[:, 2 * j + 1])
+        return rows
+
+    def _emit(self, devices, stats, reason):
+        """Build window dicts for the windows holding at least min_packets packets"""
+        keep = stats[0][:, _SIZE] >= self.min_packets
+        if not keep.any():
+            return []
+        stats = [array[keep] for array in stats]
+        devices = [device for device, k in zip(devices, keep) if k]
+        features = self.feature_matrix(*stats)
+        times = stats[6]
+        self._windows += len(devices)
+        return [{
+            'device': device,
+            'window_start': float(times[k, _START]),
+            'window_end': float(times[k, _LAST]),
+            'packets': int(stats[0][k, _SIZE]),
+            'reason': reason,
+            'features': features[k]
+        } for k, device in enumerate(devices)]
+
+    def _segment(self, devices, ts_list):
+        """Assign every event to a window segment, allocating slots for new devices
+
+        Returns (segment id per event, slot per segment, continues-slot-state flags, closed flags)
+        """
+        seg = np.empty(len(devices), dtype=np.intp)
+        seg_slot, seg_continues, seg_closed = [], [], []
+        current = {}  # slot -> (segment id, window start)
+
+        def new_segment(slot, continues):
+            seg_slot.append(slot)
+            seg_continues.append(continues)
+            seg_closed.append(False)
+            return len(seg_slot) - 1
+
+        for i, (device, t) in enumerate(zip(devices, ts_list)):
+            slot = self._slots.get(device)
+            if slot is None:
+                if not self._free:
+                    self._allocate(self._capacity * 2)
+                slot = self._slots[device] = self._free.pop()
+            entry = current.get(slot)
+            if entry is None:
+                start = float(self._times[slot, _START])
+                if math.isnan(start):
+                    entry = (new_segment(slot, False), t)
+                elif t - start >= self.window_s:
+                    # The stored window closes before this event; it has no events in this batch
+                    seg_closed[new_segment(slot, True)] = True
+                    entry = (new_segment(slot, False), t)
+                else:
+                    entry = (new_segment(slot, True), start)
+            elif t - entry[1] >= self.window_s:
+                seg_closed[entry[0]] = True
+                entry = (new_segment(slot, False), t)
+            current[slot] = entry
+            seg[i] = entry[0]
+        return (seg, np.array(seg_slot, dtype=np.intp), np.array(seg_continues, dtype=bool),
+                np.array(seg_closed, dtype=bool))
+
+    def ingest(self, events):
+        """Fold a batch of events into device state; return the windows that closed"""
+        devices = [str(e['device']) for e in events]
+        ts = np.array([float(e['ts']) for e in events])
+        size = np.array([float(e['size']) for e in events])
+        direction = np.array([1 if str(e.get('direction', 'A')).upper() == 'A' else 2 for e in events], dtype=np.intp)
+        ttl = np.array([float(e['ttl']) if e.get('ttl') is not None else np.nan for e in events])
+        flags = np.array([[bool(e.get(flag)) for flag in FLAGS] for e in events], dtype=bool).reshape(-1, len(FLAGS))
+
+        with self._lock:
+            closed = []
+            if events:
+                closed = self._fold(devices, ts, size, direction, ttl, flags)
+                self._events += len(events)
+                self._watermark = max(self._watermark, float(ts.max()))
+            closed.extend(self._expire(self._watermark - self.idle_timeout_s))
+        return closed
+
+    def _fold(self, devices, ts, size, direction, ttl, flags):
+        seg, seg_slot, continues, closed = self._segment(devices, ts.tolist())
+        n_seg = seg_slot.shape[0]
+
+        # Sort by (segment, ts) so inter-arrival times are consecutive differences
+        order = np.lexsort((ts, seg))
+        seg, ts, size, direction, ttl, flags = (seg[order], ts[order], size[order], direction[order],
+                                               ttl[order], flags[order])
+        state_times = np.full((n_seg, 5), np.nan)
+        state_times[continues] = self._times[seg_slot[continues]]
+
+        n = len(STREAMS)
+        count, mean, m2 = np.zeros((n_seg, n)), np.zeros((n_seg, n)), np.zeros((n_seg, n))
+        low, high = np.full((n_seg, n), np.inf), np.full((n_seg, n), -np.inf)
+
+        def fold_stream(column, values, ids):
+            count[:, column], mean[:, column], m2[:, column], low[:, column], high[:, column] = \
+                _group_stats(values, ids, n_seg)
+
+        has_ttl = ~np.isnan(ttl)
+        fold_stream(_SIZE, size, seg)
+        fold_stream(_IAT, *_diffs(seg, ts, state_times[:, _LAST]))
+        fold_stream(_TTL, ttl[has_ttl], seg[has_ttl])
+        seg_times = np.full((n_seg, 5), np.nan)
+        seg_flags = np.zeros((n_seg, 2 * len(FLAGS)))
+        for d in (1, 2):
+            mine = direction == d
+            fold_stream(_SIZE + d, size[mine], seg[mine])
+            fold_stream(_IAT + d, *_diffs(seg[mine], ts[mine], state_times[:, _LAST + d]))
+            fold_stream(_TTL + d, ttl[mine & has_ttl], seg[mine & has_ttl])
+            seg_times[:, _LAST + d] = _last_per_group(seg[mine], ts[mine], n_seg)
+            for j in range(len(FLAGS)):
+                seg_flags[:, 2 * j + d - 1] = np.bincount(seg[mine], weights=flags[mine, j], minlength=n_seg)
+        if seg.size:
+            first = np.concatenate(([True], seg[1:] != seg[:-1]))
+            seg_times[seg[first], _START] = seg_times[seg[first], _FIRST] = ts[first]
+        seg_times[:, _LAST] = _last_per_group(seg, ts, n_seg)
+
+        # Chan's parallel update merges continuing segments into the stored slot statistics
+        slots = seg_slot[continues]
+        na, ma, m2a = self._count[slots], self._mean[slots], self._m2[slots]
+        nb, mb, m2b = count[continues], mean[continues], m2[continues]
+        total = na + nb
+        delta = mb - ma
+        ratio = np.divide(nb, total, out=np.zeros_like(total), where=total > 0)
+        mean[continues] = ma + delta * ratio
+        m2[continues] = m2a + m2b + delta ** 2 * na * ratio
+        count[continues] = total
+        low[continues] = np.minimum(self._min[slots], low[continues])
+        high[continues] = np.maximum(self._max[slots], high[continues])
+        seg_flags[continues] += self._flags[slots]
+        kept = state_times[continues]
+        merged = seg_times[continues]
+        merged[:, [_START, _FIRST]] = kept[:, [_START, _FIRST]]
+        merged[:, _LAST:] = np.fmax(kept[:, _LAST:], merged[:, _LAST:])
+        seg_times[continues] = merged
+
+        stats = (count, mean, m2, low, high, seg_flags, seg_times)
+        slot_device = {slot: device for device, slot in self._slots.items()}
+        windows = self._emit([slot_device[s] for s in seg_slot[closed]],
+                             [array[closed] for array in stats], 'window')
+
+        # The open segment of each slot becomes its new state
+        open_ = ~closed
+        slots = seg_slot[open_]
+        for name, array in zip(('count', 'mean', 'm2', 'min', 'max', 'flags', 'times'), stats):
+            getattr(self, f'_{name}')[slots] = array[open_]
+        return windows
+
+    def _expire(self, cutoff):
+        """Evict devices whose last event is older than cutoff, emitting their partial windows"""
+        if not self._slots:
+            return []
+        devices = list(self._slots)
+        slots = np.fromiter(self._slots.values(), dtype=np.intp, count=len(devices))
+        idle = self._times[slots, _LAST] < cutoff
+        if not idle.any():
+            return []
+        idle_slots = slots[idle]
+        idle_devices = [device for device, i in zip(devices, idle) if i]
+        windows = self._emit(idle_devices, self._state(idle_slots), 'idle')
+        self._reset_slots(idle_slots)
+        for device in idle_devices:
+            del self._slots[device]
+        self._free.extend(idle_slots.tolist())
+        self._evictions += len(idle_devices)
+        return windows
+
+    def flush(self):
+        """Close every open window and evict all devices"""
+        with self._lock:
+            return self._expire(math.inf)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active_devices': len(self._slots),
+                'capacity': self._capacity,
+                'state_bytes': sum(getattr(self, f'_{name}').nbytes
+                                   for name in ('count', 'mean', 'm2', 'min', 'max', 'flags', 'times')),
+                'events': self._events,
+                'windows_emitted': self._windows,
+                'evictions': self._evictions,
+                'watermark': self._watermark if self._watermark > -math.inf else None,
+                'window_s': self.window_s,
+                'idle_timeout_s': self.idle_timeout_s
+            }
@@ -0,0 +1,59 @@
+"""
+Gunicorn configuration for the IoT Device Identification System
+Loads all artifacts once in the master (preload_app) so forked workers share
+them copy-on-write, and makes xgboost's thread state safe after fork
+
+Usage:
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+"""
+
+import gc
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Import app and run create_app() in the master before forking
+preload_app = True
+timeout = 120
+
+# Micro-batching only helps when requests run concurrently inside one worker; sync workers
+# serve one request at a time, so every batch would hold a single row after the wait
+if float(os.environ.get('IOT_MICROBATCH_WAIT_MS', '0')) > 0:
+    worker_class = 'gthread'
+    threads = int(os.environ.get('IOT_WORKER_THREADS', '8'))
+
+# Threads each worker's xgboost may use; one per worker avoids oversubscribing cores
+worker_nthread = int(os.environ.get('IOT_XGB_NTHREAD', '1'))
+# OpenMP reads this once at startup, so set it before the app (and xgboost) is imported
+os.environ.setdefault('OMP_NUM_THREADS', str(worker_nthread))
+
+
+def _format_memory(report):
+    return ', '.join(f"{key}={value}" for key, value in report.items())
+
+
+def when_ready(server):
+    """Freeze the loaded objects out of the cyclic GC so collections don't dirty shared pages"""
+    import app
+    gc.collect()
+    gc.freeze()
+    server.log.info("Master memory: %s", _format_memory(app.memory_report()))
+
+
+def post_fork(server, worker):
+    """Reset per-worker xgboost threading; the master never predicts, so no OpenMP pool was forked"""
+    import app
+    app.set_inference_threads(worker_nthread)
+
+
+def post_worker_init(worker):
+    import app
+    worker.log.info("Worker memory: %s", _format_memory(app.memory_report()))
+    if app.micro_batcher is not None and worker.cfg.threads <= 1:
+        worker.log.warning("IOT_MICROBATCH_WAIT_MS is set but this worker serves one request at a time; "
+                           "use a threaded worker (gthread with threads > 1) or batches stay at one row")
+    # Start this worker's job threads now so jobs orphaned by a stopped worker are recovered without waiting for a poll
+    recovered = app.job_manager.start()
+    if recovered and any(recovered.values()):
+        worker.log.info("Recovered orphaned jobs: %d requeued, %d failed", recovered['requeued'], recovered['failed'])
@@ -0,0 +1,61 @@
+"""
+Intent index for the local chatbot of the IoT Device Identification System
+Compiles every intent's keywords into one prefix-trie regular expression, so a
+message is scanned once instead of once per keyword. Matching keeps the original
+rules: plain substring containment, and when keywords from several intents occur,
+the intent listed first wins.
+"""
+
+import re
+
+
+def _trie_pattern(node):
+    """Regex for a trie node: children tried before stopping, so the longest keyword is captured"""
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char != '']
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        body = ('(?:' + body + ')?') if len(branches) > 1 or len(body) > 1 else body + '?'
+    return body
+
+
+class IntentIndex:
+    """Ordered (intent, keywords) table compiled into a single scan"""
+
+    def __init__(self, intents):
+        self.intents = []
+        priority_of = {}
+        for priority, (intent, keywords) in enumerate(intents):
+            self.intents.append(intent)
+            for keyword in keywords:
+                # A keyword shared by two intents belongs to the one listed first
+                if keyword and keyword not in priority_of:
+                    priority_of[keyword] = priority
+
+        # Every keyword found at one position is a prefix of the longest one found
+        # there, so each keyword maps to the best priority among its keyword prefixes
+        self._priority = {keyword: min(p for k, p in priority_of.items() if keyword.startswith(k))
+                          for keyword in priority_of}
+
+        trie = {}
+        for keyword in priority_of:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}
+        # The zero-width lookahead reports a match at every position, overlapping keywords included
+        self.pattern = re.compile('(?=(' + _trie_pattern(trie) + '))') if trie else None
+
+    def match(self, text):
+        """Return the highest-priority intent with a keyword contained in text, or None"""
+        if self.pattern is None:
+            return None
+        best = len(self.intents)
+        for found in self.pattern.finditer(text):
+            priority = self._priority[found.group(1)]
+            if priority < best:
+                best = priority
+                if best == 0:
+                    break
+        return self.intents[best] if best < len(self.intents) else None
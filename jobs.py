@@ -0,0 +1,295 @@
+"""
+Background classification jobs for the IoT Device Identification System
+Large CSV uploads are spooled to disk, queued with a bounded depth and scored
+in chunks by a small local worker pool; results are spooled back to disk.
+Job state lives in a status.json per job so every server process can answer polls.
+Each process holds an flock lease under .owners/ and stamps it on the jobs it queues;
+a job whose owner's lease is free was orphaned by a restart and is recovered: queued
+jobs are queued again, interrupted running jobs are marked failed.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import shutil
+import threading
+import pandas as pd
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): owners are checked by pid only
+    fcntl = None
+
+STATUS_FILE = 'status.json'
+INPUT_FILE = 'input.csv'
+RESULT_FILE = 'result.csv'
+OWNERS_DIR = '.owners'
+# Queued after the pending jobs to tell a worker thread to exit
+_STOP = object()
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at its maximum depth"""
+
+
+class JobManager:
+    """Bounded job queue with a local pool of scoring threads"""
+
+    def __init__(self, spool_dir, score_frame, workers=1, max_queue=8, chunk_size=2000, retention_s=86400):
+        self.spool_dir = spool_dir
+        self.retention_s = retention_s
+        self.score_frame = score_frame
+        self.workers = int(workers)
+        self.max_queue = int(max_queue)
+        self.chunk_size = int(chunk_size)
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._owner = None
+        self._lease = None
+
+    def start(self):
+        """Start this process's workers and recover jobs orphaned by stopped processes; return the recovery counts"""
+        return self._ensure_workers()
+
+    def _ensure_workers(self):
+        """Start the worker threads lazily, and again in each forked server process"""
+        if self._pid == os.getpid():
+            return None
+        with self._lock:
+            if self._pid == os.getpid():
+                return None
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._take_lease()
+            self._pid = os.getpid()
+            self._threads = [threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+                             for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+        return self.recover()
+
+    def stop(self, timeout=None):
+        """Let the workers finish the jobs already queued, join them and release this process's lease"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            threads, self._threads = self._threads, []
+            self._pid = None
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+        # Jobs still queued here (no workers) become orphans that the next process recovers
+        self._lease.close()
+        self._lease = None
+
+    def _lease_path(self, owner):
+        return os.path.join(self.spool_dir, OWNERS_DIR, f'{owner}.lock')
+
+    def _take_lease(self):
+        """Hold an exclusive lock for as long as this process lives; the OS drops it when the process dies"""
+        os.makedirs(os.path.join(self.spool_dir, OWNERS_DIR), exist_ok=True)
+        self._owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        # A lease inherited through fork belongs to the parent; this process takes its own.
+        # Lock it before it becomes visible so no scan ever sees it free.
+        path = self._lease_path(self._owner)
+        self._lease = open(path + '.tmp', 'w')
+        if fcntl is not None:
+            fcntl.flock(self._lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.replace(path + '.tmp', path)
+
+    def _owner_alive(self, owner):
+        """Whether the process that queued a job still holds its lease"""
+        if not owner:
+            return False
+        if owner == self._owner and self._pid == os.getpid():
+            return True
+        path = self._lease_path(owner)
+        if fcntl is None:
+            try:
+                os.kill(int(owner.split('-')[0]), 0)
+            except (ProcessLookupError, ValueError):
+                return False
+            except PermissionError:
+                pass
+            return os.path.exists(path)
+        try:
+            lease = open(path, 'r+')
+        except FileNotFoundError:
+            return False
+        with lease:
+            try:
+                fcntl.flock(lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            # Nobody holds it any more: the owner stopped
+            os.remove(path)
+            return False
+
+    def recover(self):
+        """Re-queue queued jobs and fail running ones whose owning process stopped; return the counts"""
+        if self._pid != os.getpid():
+            # Starting the workers runs the recovery
+            return self._ensure_workers()
+        recovered = {'requeued': 0, 'failed': 0}
+        # One process at a time, so an orphaned job is taken over once
+        with open(os.path.join(self.spool_dir, OWNERS_DIR, 'recover.lock'), 'w') as guard:
+            if fcntl is not None:
+                fcntl.flock(guard, fcntl.LOCK_EX)
+            for job_id in os.listdir(self.spool_dir):
+                try:
+                    status = self.status(job_id)
+                except (KeyError, ValueError):
+                    continue
+                if status['state'] not in ('queued', 'running') or self._owner_alive(status.get('owner')):
+                    continue
+                if status['state'] == 'queued' and not self._queue.full():
+                    status['owner'] = self._owner
+                    self._write_status(job_id, status)
+                    self._queue.put_nowait(job_id)
+                    recovered['requeued'] += 1
+                    continue
+                error = ('interrupted: the server process running it stopped' if status['state'] == 'running'
+                         else 'not resumed after a restart: the job queue was full')
+                status.update(state='failed', error=error, finished_at=time.time())
+                self._write_status(job_id, status)
+                recovered['failed'] += 1
+            # Checking a stopped owner removes its lease
+            for name in os.listdir(os.path.join(self.spool_dir, OWNERS_DIR)):
+                if name.endswith('.lock') and name != 'recover.lock':
+                    self._owner_alive(name[:-len('.lock')])
+        return recovered
+
+    def job_dir(self, job_id):
+        if not _JOB_ID.match(job_id or ''):
+            raise KeyError(job_id)
+        return os.path.join(self.spool_dir, job_id)
+
+    def _write_status(self, job_id, status):
+        """Atomically replace the job's status file"""
+        path = os.path.join(self.job_dir(job_id), STATUS_FILE)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(status, f)
+        os.replace(tmp_path, path)
+
+    def status(self, job_id):
+        """Return the job's status dict; raise KeyError for unknown jobs"""
+        try:
+            with open(os.path.join(self.job_dir(job_id), STATUS_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(job_id)
+
+    def poll(self, job_id):
+        """status() for clients: a job orphaned by a stopped process is recovered before it is reported"""
+        status = self.status(job_id)
+        if status['state'] in ('queued', 'running') and not self._owner_alive(status.get('owner')):
+            if self._ensure_workers() is None:
+                self.recover()
+            status = self.status(job_id)
+        return status
+
+    def result_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), RESULT_FILE)
+
+    def submit(self, stream, filename=None):
+        """Spool an uploaded CSV stream to disk and queue it; raise QueueFull when saturated"""
+        self._ensure_workers()
+        if self._queue.full():
+            raise QueueFull()
+        self.purge()
+
+        job_id = uuid.uuid4().hex
+        job_dir = self.job_dir(job_id)
+        os.makedirs(job_dir)
+        input_path = os.path.join(job_dir, INPUT_FILE)
+        with open(input_path, 'wb') as f:
+            shutil.copyfileobj(stream, f, length=1024 * 1024)
+
+        status = {
+            'job_id': job_id,
+            'filename': filename,
+            'state': 'queued',
+            'rows_total': None,
+            'rows_done': 0,
+            'progress': 0.0,
+            'input_bytes': os.path.getsize(input_path),
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None,
+            'owner': self._owner
+        }
+        self._write_status(job_id, status)
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise QueueFull()
+        return status
+
+    def purge(self):
+        """Delete finished jobs older than the retention period; return how many were removed"""
+        if not os.path.isdir(self.spool_dir):
+            return 0
+        cutoff = time.time() - self.retention_s
+        removed = 0
+        for job_id in os.listdir(self.spool_dir):
+            try:
+                status = self.status(job_id)
+            except (KeyError, ValueError):
+                continue
+            if status['state'] in ('done', 'failed') and (status['finished_at'] or 0) < cutoff:
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+                removed += 1
+        return removed
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is _STOP:
+                return
+            try:
+                self._process(job_id)
+            except Exception as e:
+                try:
+                    status = self.status(job_id)
+                    status.update(state='failed', error=str(e), finished_at=time.time())
+                    self._write_status(job_id, status)
+                except (KeyError, OSError):
+                    pass
+
+    def _process(self, job_id):
+        job_dir = self.job_dir(job_id)
+        input_path = os.path.join(job_dir, INPUT_FILE)
+        status = self.status(job_id)
+
+        # Count data rows up front so polls can report progress
+        with open(input_path, 'rb') as f:
+            rows_total = max(sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1024 * 1024), b'')) - 1, 0)
+        status.update(state='running', started_at=time.time(), rows_total=rows_total)
+        self._write_status(job_id, status)
+
+        partial_path = os.path.join(job_dir, RESULT_FILE + '.partial')
+        rows_done = 0
+        with open(partial_path, 'w', newline='') as out, \
+                pd.read_csv(input_path, chunksize=self.chunk_size) as reader:
+            for i, chunk in enumerate(reader):
+                self.score_frame(chunk).to_csv(out, index=True, index_label='row', header=(i == 0))
+                rows_done += len(chunk)
+                status.update(rows_done=rows_done,
+                              progress=min(rows_done / rows_total, 1.0) if rows_total else 1.0)
+                self._write_status(job_id, status)
+        os.replace(partial_path, self.result_path(job_id))
+
+        status.update(state='done', rows_done=rows_done, progress=1.0, finished_at=time.time())
+        self._write_status(job_id, status)
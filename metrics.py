@@ -0,0 +1,216 @@
+"""
+Lightweight metrics for the IoT Device Identification System
+Thread-safe counters and fixed-bucket histograms rendered in Prometheus text
+format, a stage timer for the prediction hot path and an optional sampling
+profiler that can be started and stopped at runtime
+"""
+
+import os
+import sys
+import time
+import bisect
+import threading
+import traceback
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+
+# Seconds; spans sub-millisecond scaling up to multi-second batches
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = []
+    for name, value in zip(labelnames, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def add_labels(line, labels):
+    """Append constant labels (a dict) to one rendered sample line; comments pass through"""
+    if not labels or not line or line.startswith('#'):
+        return line
+    series, value = line.rsplit(' ', 1)
+    extra = _format_labels(tuple(labels), tuple(labels.values()))[1:-1]
+    if series.endswith('}'):
+        return f'{series[:-1]},{extra}}} {value}'
+    return f'{series}{{{extra}}} {value}'
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self, const_labels=None):
+        const_labels = const_labels or {}
+        names = self.labelnames + tuple(const_labels)
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(names, key + tuple(const_labels.values()))} {value}')
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, const_labels=None):
+        const_labels = const_labels or {}
+        names = self.labelnames + tuple(const_labels)
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                key = key + tuple(const_labels.values())
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    labels = _format_labels(names + ('le',), key + (le,))
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(names, key)
+                lines.append(f'{self.name}_sum{labels} {total}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together at /metrics
+
+    Values live in the process that recorded them, so every series carries a
+    worker="<pid>" label: a scrape answered by another gunicorn worker shows that
+    worker's series instead of making one series jump backwards.
+    """
+
+    def __init__(self, worker_label='worker'):
+        self.worker_label = worker_label
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, extra_lines=()):
+        """Return all metrics in Prometheus text exposition format"""
+        # The pid is read per render: workers are forked after the registry is created
+        const_labels = {self.worker_label: os.getpid()} if self.worker_label else {}
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(const_labels))
+        lines.extend(add_labels(line, const_labels) for line in extra_lines)
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe the wall-clock duration of the with-block into a histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+class SamplingProfiler:
+    """Statistical profiler: periodically samples every thread's stack from a background thread"""
+
+    def __init__(self, interval_ms=5.0, max_depth=30):
+        self.interval = interval_ms / 1000.0
+        self.max_depth = max_depth
+        self._stacks = _StackCounter()
+        self._samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms=None):
+        """Start sampling (clears previous results)"""
+        if self.running:
+            return
+        if interval_ms:
+            self.interval = interval_ms / 1000.0
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling; results stay available until the next start"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            collapsed = []
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                stack = traceback.extract_stack(frame, limit=self.max_depth)
+                collapsed.append(';'.join(f'{fs.name} ({fs.filename.rsplit("/", 1)[-1]}:{fs.lineno})'
+                                          for fs in stack))
+            with self._lock:
+                self._samples += 1
+                self._stacks.update(collapsed)
+
+    def report(self, top=20):
+        """Return the most frequently sampled stacks (collapsed, root first)"""
+        with self._lock:
+            return {
+                'running': self.running,
+                'interval_ms': self.interval * 1000,
+                'samples': self._samples,
+                'started_at': self.started_at,
+                'top_stacks': [{'stack': stack, 'count': count}
+                               for stack, count in self._stacks.most_common(top)]
+            }
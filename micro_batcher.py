@@ -0,0 +1,114 @@
+"""
+Micro-batching scheduler for the IoT Device Identification System
+Collects concurrent single-row prediction requests for a short window and
+scores them as one matrix, handing each row's result back to its caller
+"""
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+
+class MicroBatcher:
+    """Dynamic batcher: flush after max_wait_ms or once max_batch_size rows are queued"""
+
+    def __init__(self, score_fn, max_batch_size=64, max_wait_ms=2.0):
+        self.score_fn = score_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = float(max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.batches = 0
+        self.rows = 0
+        self.max_batch_seen = 0
+        self.total_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+        # Batch size -> number of batches of that size
+        self.batch_size_counts = {}
+
+    def _ensure_worker(self):
+        """Start the scoring thread lazily, and again in each forked worker process"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        """Queue one feature row; return a Future resolving to its probability row"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((np.asarray(row, dtype=float).ravel(), future, time.perf_counter()))
+        return future
+
+    def predict(self, row, timeout=None):
+        """Score one feature row through the batcher and wait for the result"""
+        return self.submit(row).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            futures = [future for _, future, _ in batch]
+            try:
+                proba = self.score_fn(np.vstack([row for row, _, _ in batch]))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for i, future in enumerate(futures):
+                    future.set_result(proba[i])
+            self._record(batch, started)
+
+    def _record(self, batch, started):
+        delays = [started - enqueued for _, _, enqueued in batch]
+        with self._lock:
+            size = len(batch)
+            self.batches += 1
+            self.rows += size
+            self.max_batch_seen = max(self.max_batch_seen, size)
+            self.batch_size_counts[size] = self.batch_size_counts.get(size, 0) + 1
+            self.total_queue_delay += sum(delays)
+            self.max_queue_delay = max(self.max_queue_delay, max(delays))
+
+    def stats(self):
+        """Return configuration, achieved batch sizes and queueing delay"""
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batches': self.batches,
+                'rows': self.rows,
+                'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+                'max_batch_seen': self.max_batch_seen,
+                'batch_size_counts': {str(k): v for k, v in sorted(self.batch_size_counts.items())},
+                'mean_queue_delay_ms': self.total_queue_delay / self.rows * 1000 if self.rows else 0.0,
+                'max_queue_delay_ms': self.max_queue_delay * 1000,
+                'queued': self._queue.qsize()
+            }
@@ -0,0 +1,323 @@
+"""
+Model registry for the IoT Device Identification System
+Watches the model directory, loads a changed version in the background,
+validates it on a holdout sample and swaps it in atomically. Requests that use
+the model hold a read lock, so a swap waits for in-flight predictions to finish
+and no request ever sees parts of two versions.
+
+Layouts:
+    flat        'trained model final/*.pkl' (+ label_encoder.pkl, preprocessing.npz);
+                the version is a content hash of the directory
+    versioned   '<root>/<version>/*.pkl', ...; the lexicographically greatest
+                sub-directory is the candidate, so write a new version under a
+                temporary name and rename it into place
+
+Each server process has its own registry. A reload requested in one of them is
+broadcast through '<root>/.reload', which every process checks per request, and each
+process records its active version in '<root>/.workers/<pid>.json'.
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+
+MODEL_SUFFIXES = ('.pkl', '.json', '.npz')
+HISTORY_SIZE = 20
+RELOAD_FILE = '.reload'
+WORKERS_DIR = '.workers'
+
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer; a waiting writer blocks new readers"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def reading(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+def _has_models(path):
+    return any(name.endswith(MODEL_SUFFIXES) for name in os.listdir(path))
+
+
+def resolve_model_dir(root):
+    """Return the directory holding the candidate version under root (root itself in the flat layout)"""
+    versions = sorted(name for name in os.listdir(root)
+                      if not name.startswith('.') and os.path.isdir(os.path.join(root, name))
+                      and _has_models(os.path.join(root, name)))
+    if versions:
+        return os.path.join(root, versions[-1])
+    return root
+
+
+def fingerprint(model_dir):
+    """Cheap change detector: (name, size, mtime) of every model artifact"""
+    entries = []
+    for name in sorted(os.listdir(model_dir)):
+        if name.endswith(MODEL_SUFFIXES):
+            st = os.stat(os.path.join(model_dir, name))
+            entries.append((name, st.st_size, st.st_mtime_ns))
+    return tuple(entries)
+
+
+def _write_json(path, data):
+    """Write a small JSON file atomically, so readers never see a partial one"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def content_version(model_dir):
+    """Version label: the directory name plus a short hash of the artifacts' contents"""
+    digest = hashlib.sha256()
+    for name, _, _ in fingerprint(model_dir):
+        digest.update(name.encode())
+        with open(os.path.join(model_dir, name), 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return f"{os.path.basename(os.path.normpath(model_dir))}@{digest.hexdigest()[:12]}"
+
+
+class ModelRegistry:
+    """Tracks the active model version and hot-swaps validated new versions"""
+
+    def __init__(self, root, load_fn, validate_fn, activate_fn, poll_interval=0.0):
+        # load_fn(model_dir) -> state; validate_fn(state) -> dict with an 'ok' key;
+        # activate_fn(state) makes it live and is called under the write lock
+        self.root = root
+        self.load_fn = load_fn
+        self.validate_fn = validate_fn
+        self.activate_fn = activate_fn
+        self.poll_interval = float(poll_interval)
+        self.lock = ReadWriteLock()
+        self.active = None
+        self.history = []
+        self.last_error = None
+        self._seen = None
+        self._pending = None
+        self._check_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._sync_lock = threading.Lock()
+        self._reload_seen = None
+        self._reload_token = None
+        self._reported = None
+
+    def _record(self, entry):
+        self.history.append(entry)
+        del self.history[:-HISTORY_SIZE]
+
+    def activate(self, state, model_dir, load_ms, validation=None):
+        """Swap state in under the write lock and make it the active version"""
+        wait_start = time.perf_counter()
+        with self.lock.writing():
+            swap_start = time.perf_counter()
+            self.activate_fn(state)
+            swap_ms = (time.perf_counter() - swap_start) * 1000
+        entry = {
+            'version': content_version(model_dir),
+            'model_dir': model_dir,
+            'activated_at': time.time(),
+            'load_ms': load_ms,
+            'validation': validation,
+            'drain_ms': (swap_start - wait_start) * 1000,
+            'swap_ms': swap_ms,
+            'status': 'active'
+        }
+        self.active = entry
+        self._seen = (model_dir, fingerprint(model_dir))
+        if self._reload_token is None:
+            # Reload requests made before this version was loaded are already reflected in it
+            self._reload_seen = self._reload_stat()
+            self._reload_token = (self._read_reload() or {}).get('token', '')
+        self._record(entry)
+        return entry
+
+    def check(self, force=False, debounce=True):
+        """Load, validate and activate the candidate version if it changed (or force); return the outcome"""
+        with self._check_lock:
+            try:
+                model_dir = resolve_model_dir(self.root)
+                current = fingerprint(model_dir)
+                if not force and self._seen == (model_dir, current):
+                    return {'status': 'unchanged', 'active': self.active['version'] if self.active else None}
+                # Files still being copied in: wait until the fingerprint is stable across two polls
+                if debounce and not force and self._pending != (model_dir, current):
+                    self._pending = (model_dir, current)
+                    return {'status': 'pending', 'model_dir': model_dir}
+                self._pending = None
+
+                start = time.perf_counter()
+                state = self.load_fn(model_dir)
+                load_ms = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                validation = self.validate_fn(state)
+                validation['validate_ms'] = (time.perf_counter() - start) * 1000
+                if not validation.get('ok'):
+                    # Remember the rejected files so they are not reloaded on every poll
+                    self._seen = (model_dir, current)
+                    entry = {'version': content_version(model_dir), 'model_dir': model_dir,
+                             'load_ms': load_ms, 'validation': validation, 'status': 'rejected',
+                             'checked_at': time.time()}
+                    self._record(entry)
+                    return entry
+                self.last_error = None
+                return self.activate(state, model_dir, load_ms, validation)
+            except Exception as e:
+                self.last_error = str(e)
+                return {'status': 'error', 'error': str(e)}
+
+    def _reload_stat(self):
+        try:
+            st = os.stat(os.path.join(self.root, RELOAD_FILE))
+            return st.st_ino, st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _read_reload(self):
+        try:
+            with open(os.path.join(self.root, RELOAD_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def request_reload(self, force=False):
+        """Check for a new version here, then ask every other server process to do the same"""
+        with self._sync_lock:
+            result = self.check(force=force, debounce=False)
+            token = uuid.uuid4().hex
+            try:
+                _write_json(os.path.join(self.root, RELOAD_FILE),
+                            {'token': token, 'force': bool(force), 'requested_at': time.time(), 'pid': os.getpid()})
+                self._reload_seen, self._reload_token = self._reload_stat(), token
+                result['broadcast'] = True
+            except OSError as e:
+                result['broadcast'] = False
+                result['broadcast_error'] = str(e)
+        self._report_version()
+        return result
+
+    def sync(self):
+        """Follow a reload requested in another process and record this process's version; call per request
+
+        Costs one stat() when nothing changed. After a broadcast, the first request in each
+        process runs the same check, and concurrent requests wait for it, so no request
+        after the reload is served by the old version.
+        """
+        if self._reload_stat() != self._reload_seen:
+            with self._sync_lock:
+                stat = self._reload_stat()
+                if stat != self._reload_seen:
+                    self._reload_seen = stat
+                    request = self._read_reload()
+                    if request and request.get('token') != self._reload_token:
+                        self._reload_token = request.get('token')
+                        self.check(force=bool(request.get('force')), debounce=False)
+        self._report_version()
+
+    def _report_version(self):
+        version = self.active['version'] if self.active else None
+        if self._reported == (os.getpid(), version):
+            return
+        try:
+            workers_dir = os.path.join(self.root, WORKERS_DIR)
+            os.makedirs(workers_dir, exist_ok=True)
+            _write_json(os.path.join(workers_dir, f'{os.getpid()}.json'),
+                        {'pid': os.getpid(), 'version': version, 'reported_at': time.time()})
+        except OSError:
+            # A read-only model directory: versions are only visible per process
+            pass
+        self._reported = (os.getpid(), version)
+
+    def worker_versions(self):
+        """The active version of every live server process that has served a request, by pid"""
+        workers_dir = os.path.join(self.root, WORKERS_DIR)
+        try:
+            names = os.listdir(workers_dir)
+        except OSError:
+            return []
+        workers = []
+        for name in sorted(names):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(workers_dir, name)
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+                os.kill(int(entry['pid']), 0)
+            except ProcessLookupError:
+                # The process exited (e.g. a recycled gunicorn worker)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            except (OSError, ValueError, KeyError):
+                continue
+            workers.append(entry)
+        return workers
+
+    def ensure_watching(self):
+        """Start the polling thread lazily, and again in each forked server process"""
+        if self.poll_interval <= 0 or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._thread_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+                self._thread.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.sync()
+            self.check()
+
+    def status(self):
+        workers = self.worker_versions()
+        return {
+            'root': self.root,
+            'active': self.active,
+            'workers': workers,
+            'consistent': len({w['version'] for w in workers}) <= 1,
+            'watching': self._thread is not None and self._pid == os.getpid(),
+            'poll_interval_s': self.poll_interval,
+            'last_error': self.last_error,
+            'history': list(reversed(self.history))
+        }
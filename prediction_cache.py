@@ -0,0 +1,113 @@
+"""
+Prediction cache for the IoT Device Identification System
+Bounded LRU cache with TTL in front of the ensemble, keyed by a hash of the
+(optionally quantized) raw feature vector
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class PredictionCache:
+    """Thread-safe LRU + TTL cache mapping feature vectors to probability rows"""
+
+    def __init__(self, maxsize=10000, ttl=300.0, decimals=None):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl) if ttl else None
+        # Round features to this many decimals before hashing so near-identical vectors share an entry
+        self.decimals = decimals
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def keys(self, X):
+        """Return one cache key per row of X"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.decimals is not None:
+            X = np.round(X, self.decimals)
+        # Adding 0.0 folds -0.0 into 0.0 so they hash alike
+        X = np.ascontiguousarray(X + 0.0)
+        return [hashlib.blake2b(row.tobytes(), digest_size=16).digest() for row in X]
+
+    def get_many(self, keys):
+        """Look up keys; return a list with the cached probability row or None per key"""
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and self.ttl is not None and now - entry[0] > self.ttl:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    results.append(entry[1])
+        return results
+
+    def put_many(self, keys, rows):
+        """Store probability rows, evicting least recently used entries beyond maxsize"""
+        now = time.monotonic()
+        with self._lock:
+            for key, row in zip(keys, rows):
+                self._entries[key] = (now, np.array(row, dtype=float))
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return size, configuration and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'decimals': self.decimals,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def predict(self, X, predict_fn):
+        """Return probabilities for X, calling predict_fn only on rows that miss the cache"""
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        keys = self.keys(X)
+        cached = self.get_many(keys)
+        missing = [i for i, row in enumerate(cached) if row is None]
+        if not missing:
+            return np.vstack(cached)
+
+        # Score all misses together in one vectorized call
+        fresh = predict_fn(X[missing])
+        self.put_many([keys[i] for i in missing], fresh)
+        if len(missing) == len(keys):
+            return fresh
+        proba = np.empty((X.shape[0], fresh.shape[1]))
+        proba[missing] = fresh
+        for i, row in enumerate(cached):
+            if row is not None:
+                proba[i] = row
+        return proba
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Preprocessing artifact for the IoT Device Identification System
+Persists the fitted StandardScaler statistics and the ordered feature schema
+next to the models so workers can start without reading the reference dataset
+
+Usage:
+    python preprocessing.py [--dataset iot_device_test_augmented_10k.csv] [--output "trained model final/preprocessing.npz"]
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from dataset_store import DatasetStore, DEFAULT_DATASET_PATH, TARGET_COLUMN
+
+ARTIFACT_NAME = 'preprocessing.npz'
+DEFAULT_ARTIFACT_PATH = os.path.join('trained model final', ARTIFACT_NAME)
+
+
+def fit_preprocessing(frame):
+    """Fit a StandardScaler on the feature columns of the reference DataFrame"""
+    feature_columns = [col for col in frame.columns if col != TARGET_COLUMN]
+    scaler = StandardScaler()
+    scaler.fit(frame[feature_columns])
+    return scaler, feature_columns
+
+
+def save_preprocessing(path, scaler, feature_columns):
+    """Write the scaler statistics and ordered feature names to a compact .npz file"""
+    np.savez(
+        path,
+        mean=np.asarray(scaler.mean_, dtype=np.float64),
+        scale=np.asarray(scaler.scale_, dtype=np.float64),
+        var=np.asarray(scaler.var_, dtype=np.float64),
+        n_samples_seen=np.asarray(scaler.n_samples_seen_),
+        feature_names=np.asarray(feature_columns, dtype=str)
+    )
+
+
+def load_preprocessing(path):
+    """Rebuild a fitted StandardScaler and the feature column order from an .npz artifact"""
+    with np.load(path, allow_pickle=False) as data:
+        mean = data['mean']
+        scale = data['scale']
+        var = data['var']
+        n_samples_seen = data['n_samples_seen']
+        feature_columns = [str(name) for name in data['feature_names']]
+
+    if not (len(feature_columns) == mean.shape[0] == scale.shape[0] == var.shape[0]):
+        raise ValueError(f"Inconsistent preprocessing artifact '{path}'")
+
+    scaler = StandardScaler()
+    scaler.mean_ = mean
+    scaler.scale_ = scale
+    scaler.var_ = var
+    scaler.n_samples_seen_ = n_samples_seen.item() if n_samples_seen.ndim == 0 else n_samples_seen
+    scaler.n_features_in_ = len(feature_columns)
+    return scaler, feature_columns
+
+
+def main(argv=None):
+    """Regenerate the preprocessing artifact from the reference dataset"""
+    parser = argparse.ArgumentParser(description="Build the scaler/feature-schema artifact used by load_model")
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH, help="reference CSV to fit the scaler on")
+    parser.add_argument('--output', default=DEFAULT_ARTIFACT_PATH, help="destination .npz file")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.dataset):
+        print(f"❌ Dataset not found: {args.dataset}")
+        return 1
+
+    frame = DatasetStore(args.dataset).get_frame()
+    scaler, feature_columns = fit_preprocessing(frame)
+    save_preprocessing(args.output, scaler, feature_columns)
+
+    print(f"✅ Wrote {args.output} ({os.path.getsize(args.output):,} bytes)")
+    print(f"   Features: {len(feature_columns)}")
+    print(f"   Samples:  {len(frame)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
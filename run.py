@@ -41,13 +41,16 @@ def check_files():
     required_files = [
         'app.py',
         'best_xgb_model.json',
-        'iot_device_test_augmented_10k.csv',
         'requirements.txt',
         'templates/index.html',
         'static/css/style.css',
         'static/js/app.js'
     ]
     
+    # The dataset is only needed when no preprocessing artifact has been built
+    if not os.path.exists(os.path.join('trained model final', 'preprocessing.npz')):
+        required_files.insert(2, 'iot_device_test_augmented_10k.csv')
+    
     missing_files = []
     
     for file_path in required_files:
@@ -87,8 +90,9 @@ def main():
     print("=" * 60)
     
     try:
-        # Import and run the app
-        from app import app
+        # Import the app and load the models
+        from app import create_app
+        app = create_app()
         app.run(debug=True, host='0.0.0.0', port=5000)
     except KeyboardInterrupt:
         print("\n\n👋 Application stopped by user.")
@@ -6,12 +6,16 @@ This script tests the model loading and basic functionality
 
 import sys
 import os
+import unittest
 import pandas as pd
 import numpy as np
 
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Reference dataset the model and endpoint tests score rows from
+DATASET = 'iot_device_test_augmented_10k.csv'
+
 def test_model_loading():
     """Test if the model can be loaded successfully"""
     print("Testing model loading...")
@@ -85,6 +89,937 @@ def test_dataset_info():
         print(f"❌ Error loading dataset: {str(e)}")
         return False
 
+
+def require_dataset():
+    """Skip a test that needs the reference dataset when it is not in the working directory"""
+    if not os.path.exists(DATASET):
+        raise unittest.SkipTest(f"{DATASET} not found")
+
+def run_test(test):
+    """Run an asserting test for main(): print why it failed and return whether it passed"""
+    try:
+        test()
+        return True
+    except unittest.SkipTest as e:
+        print(f"⚠️  Skipped: {e}")
+        return True
+    except AssertionError as e:
+        print(f"❌ {e}")
+        return False
+    except Exception as e:
+        print(f"❌ Error during {test.__name__}: {type(e).__name__}: {e}")
+        return False
+
+def test_app_factory():
+    """Test that create_app() loads the artifacts once and /memory reports this worker's footprint"""
+    print("\nTesting app factory...")
+    require_dataset()
+    import app
+    
+    assert app.create_app() is app.app and app.models, "create_app() did not load the models"
+    load_model = app.load_model
+    loads = []
+    app.load_model = lambda: loads.append(1) or load_model()
+    saved_models = app.models
+    try:
+        # Already loaded (as in a preloaded gunicorn worker): nothing is reloaded
+        assert app.create_app() is app.create_app() is app.app and not loads, f"create_app() reloaded {len(loads)} time(s)"
+        app.models = []
+        assert app.create_app() is app.app and len(loads) == 1 and app.models, "create_app() did not load exactly once"
+    finally:
+        app.load_model = load_model
+        if not app.models:
+            app.models = saved_models
+    
+    report = app.app.test_client().get('/memory').get_json()
+    assert report['pid'] == os.getpid(), f"/memory reported pid {report['pid']}"
+    keys = ('rss_kb', 'pss_kb', 'shared_clean_kb', 'private_dirty_kb') if os.path.exists('/proc/self/smaps_rollup') \
+        else ('max_rss_kb',)
+    assert all(isinstance(report.get(key), int) and report[key] >= 0 for key in keys), f"Missing memory fields: {report}"
+    
+    print(f"✅ create_app() loads once; /memory reports {', '.join(keys)} for worker {report['pid']}")
+
+def test_batch_prediction():
+    """Test that /predict/batch matches single-row predictions"""
+    print("\nTesting batch prediction...")
+    require_dataset()
+    import io
+    from app import app, load_model, predict_device_category
+    
+    assert load_model(), "Model loading failed!"
+    
+    df = pd.read_csv(DATASET)
+    rows = df.drop(columns=['device_category']).iloc[:20]
+    
+    client = app.test_client()
+    response = client.post('/predict/batch', json=rows.values.tolist())
+    result = response.get_json()
+    assert response.status_code == 200 and result['count'] == len(rows), f"Batch request failed: {result}"
+    
+    # Every batch row must agree with the single-row path
+    for i, (_, row) in enumerate(rows.iterrows()):
+        predicted_class, _ = predict_device_category(row.tolist())
+        assert predicted_class == result['predicted_classes'][i], \
+            f"Row {i}: batch={result['predicted_classes'][i]} single={predicted_class}"
+    
+    # CSV bodies go through the same pipeline
+    response = client.post('/predict/batch', data=rows.to_csv(index=False), content_type='text/csv')
+    assert response.get_json()['predicted_classes'] == result['predicted_classes'], "CSV batch disagrees with JSON batch!"
+    
+    # Oversized bodies are refused before parsing, whether or not they declare a length
+    import app as app_module
+    csv_body = rows.to_csv(index=False).encode()
+    limit = app_module.MAX_BATCH_BYTES
+    app_module.MAX_BATCH_BYTES = len(csv_body) - 1
+    try:
+        declared = client.post('/predict/batch', data=csv_body, content_type='text/csv')
+        chunked = client.post('/predict/batch', input_stream=io.BytesIO(csv_body), content_type='text/csv',
+                              headers={'Transfer-Encoding': 'chunked'},
+                              environ_overrides={'wsgi.input_terminated': True})
+    finally:
+        app_module.MAX_BATCH_BYTES = limit
+    assert declared.status_code == 413 and chunked.status_code == 413, \
+        f"Oversized bodies accepted: {declared.status_code}, {chunked.status_code}"
+    
+    print(f"✅ Batch prediction matches single-row predictions for {len(rows)} rows")
+
+def test_prediction_cache():
+    """Test LRU eviction, TTL expiry and partial-hit scoring in the prediction cache"""
+    print("\nTesting prediction cache...")
+    import time
+    from prediction_cache import PredictionCache
+    
+    calls = []
+    def fake_predict(X):
+        calls.append(len(X))
+        return np.column_stack([X[:, 0], 1 - X[:, 0]])
+    
+    cache = PredictionCache(maxsize=2, ttl=0.05, decimals=3)
+    X = np.array([[0.1, 5.0], [0.2, 5.0], [0.3, 5.0]])
+    cache.predict(X[:2], fake_predict)
+    
+    # Quantized near-duplicate hits; the new row is scored alone
+    proba = cache.predict(np.array([[0.1001, 5.0], [0.3, 5.0]]), fake_predict)
+    stats = cache.stats()
+    assert calls == [2, 1] and stats['hits'] == 1 and stats['evictions'] == 1 and np.allclose(proba[:, 0], [0.1, 0.3]), \
+        f"Unexpected cache behaviour: calls={calls} stats={stats}"
+    
+    time.sleep(0.06)
+    cache.predict(X[2:], fake_predict)
+    assert cache.stats()['expirations'] == 1, f"TTL expiry not applied: {cache.stats()}"
+    
+    print("✅ Prediction cache hits, evicts and expires entries correctly")
+
+def test_compiled_forest():
+    """Test that compiled margins equal xgboost's, for the shipped model and other objectives"""
+    print("\nTesting compiled forest...")
+    import xgboost as xgb
+    from tree_compiler import CompiledForest
+    
+    rng = np.random.default_rng(0)
+    booster = xgb.Booster()
+    booster.load_model('best_xgb_model.json')
+    X = rng.standard_normal((500, booster.num_features())).astype(np.float32)
+    X[rng.random(X.shape) < 0.01] = np.nan
+    
+    # binary:logistic stores base_score as a probability; num_parallel_tree repeats groups in a round
+    y = (np.nan_to_num(X[:, 0]) > 0.5).astype(int)
+    forest_booster = xgb.train({'objective': 'binary:logistic', 'max_depth': 3, 'num_parallel_tree': 3,
+                                'subsample': 0.8}, xgb.DMatrix(X[:, :5], label=y), 5)
+    
+    for model, data in [(booster, X), (forest_booster, X[:, :5])]:
+        expected = model.predict(xgb.DMatrix(data), output_margin=True).reshape(len(data), -1)
+        margin = CompiledForest.from_booster(model).predict_margin(data)
+        assert np.array_equal(margin, expected), \
+            f"Compiled margins differ from xgboost by {np.abs(margin - expected).max():.3e}"
+    
+    # An early-stopped model scores only up to best_iteration, as the sklearn wrapper does
+    early = xgb.XGBClassifier(n_estimators=200, max_depth=3, learning_rate=0.5, early_stopping_rounds=3)
+    early.fit(X[:400, :5], y[:400], eval_set=[(X[400:, :5], y[400:])], verbose=False)
+    compiled = CompiledForest.from_model(early)
+    assert early.best_iteration + 1 < early.get_booster().num_boosted_rounds(), "Model did not stop early"
+    assert compiled.n_rounds == early.best_iteration + 1 and \
+        np.allclose(compiled.predict_proba(X[:, :5]), early.predict_proba(X[:, :5]), atol=1e-6), \
+        "Compiled early-stopped model does not stop at best_iteration"
+    
+    print("✅ Compiled margins equal xgboost's output_margin predictions")
+
+def test_micro_batching():
+    """Test that concurrent rows coalesce, keep their own results and all see a batch's error"""
+    print("\nTesting micro-batching...")
+    import time
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from micro_batcher import MicroBatcher
+    
+    def score(X):
+        if (X < 0).any():
+            raise ValueError("negative feature")
+        return np.column_stack([X[:, 0], -X[:, 0]])
+    
+    def submit_together(batcher, rows):
+        start = threading.Barrier(len(rows))
+        def submit(row):
+            start.wait()
+            return batcher.submit(row)
+        with ThreadPoolExecutor(len(rows)) as pool:
+            return list(pool.map(submit, rows))
+    
+    # Concurrent rows share batches of at most max_batch_size, and each caller gets its own row back
+    batcher = MicroBatcher(score, max_batch_size=8, max_wait_ms=200)
+    rows = [[float(i), 1.0] for i in range(16)]
+    results = [future.result(timeout=10) for future in submit_together(batcher, rows)]
+    assert all(np.array_equal(result, [i, -i]) for i, result in enumerate(results)), "Results returned to the wrong callers"
+    stats = batcher.stats()
+    assert stats['rows'] == 16 and stats['batches'] < 16 and stats['max_batch_seen'] <= 8, f"Rows were not coalesced: {stats}"
+    
+    # A lone row is flushed once the window closes
+    started = time.perf_counter()
+    batcher.predict([1.0, 1.0], timeout=10)
+    assert 0.15 <= time.perf_counter() - started < 5, "Lone row was not flushed at max_wait_ms"
+    
+    # One failing batch reports its error to every waiter, and the batcher keeps serving
+    futures = submit_together(batcher, [[-1.0, float(i)] for i in range(6)])
+    errors = [future.exception(timeout=10) for future in futures]
+    assert all(isinstance(e, ValueError) for e in errors), f"Not every waiter saw the batch error: {errors}"
+    assert np.array_equal(batcher.predict([2.0, 0.0], timeout=10), [2.0, -2.0]), "Batcher stopped after an error"
+    
+    # Concurrent /predict requests through the app match unbatched predictions
+    require_dataset()
+    import app
+    assert app.load_model(), "Model loading failed!"
+    frame = pd.read_csv(DATASET)[app.feature_columns].iloc[:12]
+    forms = [{col: str(value) for col, value in row.items()} for _, row in frame.iterrows()]
+    
+    def post_all():
+        start = threading.Barrier(len(forms))
+        def post(form):
+            client = app.app.test_client()
+            start.wait()
+            response = client.post('/predict', data=form)
+            return response.status_code, response.get_json()
+        with ThreadPoolExecutor(len(forms)) as pool:
+            return list(pool.map(post, forms))
+    
+    saved = app.micro_batcher
+    try:
+        app.micro_batcher = None
+        unbatched = post_all()
+        app.micro_batcher = MicroBatcher(lambda X: app.predict_proba_rows(X), max_batch_size=8, max_wait_ms=100)
+        batched = post_all()
+        stats = app.micro_batcher.stats()
+        app.micro_batcher = MicroBatcher(score, max_batch_size=8, max_wait_ms=100)
+        failed = post_all()
+    finally:
+        app.micro_batcher = saved
+    assert stats['batches'] < len(forms), f"/predict rows were not coalesced: {stats}"
+    for (status, expected), (batched_status, result) in zip(unbatched, batched):
+        assert status == batched_status == 200 and result['predicted_class'] == expected['predicted_class'] and \
+            np.allclose(list(result['confidence_scores'].values()), list(expected['confidence_scores'].values())), \
+            f"Batched prediction differs: {result['predicted_class']} vs {expected['predicted_class']}"
+    assert all(status == 500 for status, _ in failed), "A failing batch did not fail every request"
+    
+    print(f"✅ Micro-batching coalesced {len(forms)} requests into {stats['batches']} batches with unchanged results")
+
+def test_metrics_endpoint():
+    """Test that /metrics is valid exposition text, labels each series with the worker pid and counts /predict"""
+    print("\nTesting metrics endpoint...")
+    require_dataset()
+    import re
+    import app
+    
+    assert app.load_model(), "Model loading failed!"
+    client = app.app.test_client()
+    sample = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+    
+    def scrape():
+        response = client.get('/metrics')
+        assert response.status_code == 200 and response.mimetype == 'text/plain', f"Bad /metrics response: {response.status}"
+        values, typed = {}, set()
+        for line in response.get_data(as_text=True).splitlines():
+            if line.startswith('# TYPE '):
+                _, _, name, kind = line.split(' ')
+                assert kind in ('counter', 'gauge', 'histogram'), f"Unknown metric type: {line}"
+                typed.add(name)
+                continue
+            if line.startswith('#'):
+                continue
+            match = sample.match(line)
+            assert match, f"Malformed sample line: {line!r}"
+            name, labels, value = match.groups()
+            float(value)
+            assert re.sub(r'_(bucket|sum|count)$', '', name) in typed or name in typed, f"Sample before its TYPE: {line}"
+            values[name + (labels or '')] = float(value)
+        return values
+    
+    worker = f'worker="{os.getpid()}"'
+    form = pd.read_csv(DATASET)[app.feature_columns].iloc[0].astype(str).to_dict()
+    predicted = f'iot_predicted_rows_total{{endpoint="predict",{worker}}}'
+    requests = f'iot_requests_total{{endpoint="predict",status="200",{worker}}}'
+    latency = f'iot_request_seconds_count{{endpoint="predict",{worker}}}'
+    
+    before = scrape()
+    for _ in range(3):
+        assert client.post('/predict', data=form).status_code == 200, "/predict failed"
+    after = scrape()
+    assert all(worker in series for series in after), "Series without the worker label"
+    for series in (predicted, requests, latency):
+        assert after.get(series, 0) - before.get(series, 0) == 3, \
+            f"{series}: {before.get(series, 0)} -> {after.get(series)}"
+    
+    print(f"✅ /metrics parsed ({len(after)} series) and counted 3 /predict calls for {worker}")
+
+def test_binary_format():
+    """Test IOTF encode/decode round trip and column alignment"""
+    print("\nTesting binary request format...")
+    from binary_format import encode_matrix, decode_matrix, align_columns
+    
+    X = np.arange(12, dtype=np.float32).reshape(3, 4)
+    names, decoded = decode_matrix(encode_matrix(X, ['c', 'a', 'x', 'b']))
+    assert names == ['c', 'a', 'x', 'b'] and np.array_equal(decoded, X), "Round trip changed the matrix!"
+    
+    # Columns are reordered to the model's order; unknown ones dropped, missing ones zero
+    aligned = align_columns(names, decoded, ['a', 'b', 'c', 'd'])
+    expected = np.column_stack([X[:, 1], X[:, 3], X[:, 0], np.zeros(3)])
+    assert np.array_equal(aligned, expected), f"Unexpected column alignment: {aligned}"
+    
+    # Arrow bodies may carry a text label column and nulls; they score like the same rows as CSV
+    require_dataset()
+    import app
+    from binary_format import ARROW_MIMETYPE
+    assert app.load_model(), "Model loading failed!"
+    rows = pd.read_csv(DATASET).iloc[:20]
+    rows.iloc[::3, 5] = np.nan
+    client = app.app.test_client()
+    try:
+        import pyarrow as pa
+    except ImportError:
+        pa = None
+    if pa is None:
+        response = client.post('/predict/batch', data=b'ARROW1', content_type=ARROW_MIMETYPE)
+        assert response.status_code == 415, f"Arrow body without pyarrow returned {response.status_code}, expected 415"
+    else:
+        sink = pa.BufferOutputStream()
+        table = pa.Table.from_pandas(rows, preserve_index=False)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        response = client.post('/predict/batch', data=sink.getvalue().to_pybytes(), content_type=ARROW_MIMETYPE)
+        expected = client.post('/predict/batch', data=rows.to_csv(index=False), content_type='text/csv').get_json()
+        assert response.status_code == 200 and response.get_json()['predicted_classes'] == expected['predicted_classes'], \
+            f"Arrow batch failed or disagrees with CSV: {response.status_code} {response.get_json()}"
+    
+    print("✅ Binary format round-trips and aligns columns")
+
+def test_bulk_cli():
+    """Test that classify_bulk.py with spawned workers writes only predictions to stdout, matching /predict/batch"""
+    print("\nTesting bulk classification CLI...")
+    require_dataset()
+    import io
+    import tempfile
+    import subprocess
+    from app import app, load_model
+    
+    assert load_model(), "Model loading failed!"
+    rows = pd.read_csv(DATASET).iloc[:30]
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'classify_bulk.py')
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'flows.csv')
+        rows.to_csv(path, index=False)
+        run = subprocess.run([sys.executable, cli, path, '-o', '-', '--chunk-size', '10', '--workers', '2',
+                              '--start-method', 'spawn', '--probabilities'],
+                             capture_output=True, text=True, timeout=300)
+    assert run.returncode == 0, f"CLI failed: {run.stderr}"
+    # Any loading banner on stdout would break the CSV
+    out = pd.read_csv(io.StringIO(run.stdout), index_col='row')
+    assert list(out.index) == list(range(len(rows))), f"Unexpected rows in CLI output: {list(out.index)}"
+    
+    result = app.test_client().post('/predict/batch', json=rows.drop(columns=['device_category']).values.tolist()).get_json()
+    assert out['predicted_class'].tolist() == result['predicted_classes'], "CLI disagrees with /predict/batch!"
+    cli_proba = out[[f'p_{c}' for c in result['classes']]].to_numpy()
+    assert np.allclose(cli_proba, result['probabilities']), "CLI probabilities disagree with /predict/batch!"
+    
+    print(f"✅ Bulk CLI output matches /predict/batch for {len(rows)} rows")
+
+def test_job_queue():
+    """Test background job spooling, progress and queue backpressure"""
+    print("\nTesting background job queue...")
+    import io
+    import time
+    import tempfile
+    import threading
+    from jobs import JobManager, QueueFull
+    
+    release = threading.Event()
+    
+    def score(frame):
+        release.wait(10)
+        return pd.DataFrame({'predicted_class': ['x'] * len(frame)}, index=frame.index)
+    
+    with tempfile.TemporaryDirectory() as spool:
+        manager = JobManager(spool, score, workers=1, max_queue=1, chunk_size=2)
+        csv_bytes = b"a,b\n1,2\n3,4\n5,6\n"
+        first = manager.submit(io.BytesIO(csv_bytes))
+        # Wait for the worker to pick up the first job, then fill the single queue slot
+        while manager.status(first['job_id'])['state'] == 'queued':
+            time.sleep(0.01)
+        second = manager.submit(io.BytesIO(csv_bytes))
+        try:
+            manager.submit(io.BytesIO(csv_bytes))
+            raise AssertionError("Full queue accepted another job!")
+        except QueueFull:
+            pass
+        
+        # Every submitted job must finish, and the workers must exit, before the spool is removed
+        release.set()
+        deadline = time.time() + 10
+        while any(manager.status(job['job_id'])['state'] not in ('done', 'failed') for job in (first, second)) \
+                and time.time() < deadline:
+            time.sleep(0.01)
+        workers = list(manager._threads)
+        manager.stop(timeout=10)
+        assert not any(thread.is_alive() for thread in workers), "Job workers still running after stop()"
+        status = manager.status(first['job_id'])
+        result = pd.read_csv(manager.result_path(first['job_id']))
+        assert status['rows_done'] == 3 and status['progress'] == 1.0 and len(result) == 3, \
+            f"Unexpected job outcome: {status}"
+        assert manager.status(second['job_id'])['state'] == 'done', f"Second job did not finish: {manager.status(second['job_id'])}"
+    
+    print("✅ Jobs spool results, report progress and apply backpressure")
+
+def test_job_recovery():
+    """Test that jobs orphaned by a stopped server process are re-queued or failed"""
+    print("\nTesting job recovery after a restart...")
+    import io
+    import time
+    import tempfile
+    from jobs import JobManager
+    
+    def score(frame):
+        return pd.DataFrame({'predicted_class': ['x'] * len(frame)}, index=frame.index)
+    
+    with tempfile.TemporaryDirectory() as spool:
+        # A process without workers queues one job and is interrupted mid-way through another
+        stopped = JobManager(spool, score, workers=0, max_queue=2, chunk_size=2)
+        queued = stopped.submit(io.BytesIO(b"a,b\n1,2\n3,4\n"))['job_id']
+        running = stopped.submit(io.BytesIO(b"a,b\n1,2\n"))['job_id']
+        status = stopped.status(running)
+        status.update(state='running', started_at=time.time())
+        stopped._write_status(running, status)
+        # Stopping releases the lease, as the OS does when a process dies
+        stopped.stop()
+        
+        restarted = JobManager(spool, score, workers=1, max_queue=2, chunk_size=2)
+        recovered = restarted.start()
+        assert recovered == {'requeued': 1, 'failed': 1}, f"Unexpected recovery: {recovered}"
+        deadline = time.time() + 10
+        while restarted.poll(queued)['state'] != 'done' and time.time() < deadline:
+            time.sleep(0.01)
+        assert restarted.poll(queued)['rows_done'] == 2 and restarted.poll(running)['state'] == 'failed', \
+            f"Orphaned jobs not recovered: {restarted.poll(queued)} {restarted.poll(running)}"
+        
+        # A live process's jobs are left alone
+        live = JobManager(spool, score, workers=0, max_queue=1, chunk_size=2)
+        waiting = live.submit(io.BytesIO(b"a,b\n1,2\n"))['job_id']
+        assert restarted.recover() == {'requeued': 0, 'failed': 0} and restarted.poll(waiting)['state'] == 'queued', \
+            "Recovery took over a live process's job!"
+        live.stop()
+        restarted.stop(timeout=10)
+    
+    print("✅ Orphaned queued jobs resume and interrupted jobs fail after a restart")
+
+def test_flow_aggregator():
+    """Test that streamed packet events aggregate to the expected window statistics"""
+    print("\nTesting streaming flow aggregation...")
+    from flow_aggregator import FlowAggregator
+    
+    columns = ['packets', 'packets_A', 'bytes', 'packet_size_var', 'packet_inter_arrivel_avg', 'duration']
+    events = [{'device': 'cam', 'ts': float(i), 'size': 100 + 10 * i, 'direction': 'AB'[i % 3 == 0]}
+              for i in range(12)]
+    
+    # Windows must not depend on how events are split into batches
+    aggregator = FlowAggregator(columns, window_s=6, idle_timeout_s=100, min_packets=1)
+    windows = aggregator.ingest(events[:4]) + aggregator.ingest(events[4:]) + aggregator.flush()
+    assert len(windows) == 2, f"Expected 2 windows, got {len(windows)}"
+    
+    sizes = np.array([100 + 10 * i for i in range(6)], dtype=float)
+    expected = [6, 4, sizes.sum(), sizes.var(), 1.0, 5.0]
+    assert np.allclose(windows[0]['features'], expected), f"Unexpected window features: {windows[0]['features']}"
+    
+    print("✅ Flow aggregation matches the batch statistics")
+
+def test_feature_pruning():
+    """Test that scoring only the features the trees use leaves predictions unchanged"""
+    print("\nTesting feature pruning...")
+    require_dataset()
+    import app
+    from feature_pruning import ensemble_used_features
+    
+    assert app.load_model(), "Model loading failed!"
+    
+    df = pd.read_csv(DATASET)
+    X = df[app.feature_columns].iloc[:200].to_numpy(dtype=float)
+    full = app.predict_proba_matrix(X)
+    
+    used = ensemble_used_features(app.models)
+    assert used is not None and 0 < len(used) <= len(app.feature_columns), \
+        "Could not determine the features the ensemble uses"
+    
+    try:
+        app.used_feature_idx = used
+        app.input_columns = [app.feature_columns[i] for i in used]
+        # Full-width and pruned inputs must both score exactly like the unpruned path
+        assert np.array_equal(app.predict_proba_matrix(X), full) and \
+            np.array_equal(app.predict_proba_matrix(X[:, used]), full), "Pruned predictions differ from full predictions!"
+    finally:
+        app.used_feature_idx = None
+        app.input_columns = list(app.feature_columns)
+    
+    print(f"✅ Pruning to {len(used)} of {len(app.feature_columns)} features keeps predictions identical")
+
+def test_cascade():
+    """Test that the early-exit cascade falls back to the full ensemble for unconfident rows"""
+    print("\nTesting early-exit cascade...")
+    require_dataset()
+    import app
+    from cascade import EarlyExitCascade, staged_proba
+    
+    assert app.load_model(), "Model loading failed!"
+    
+    df = pd.read_csv(DATASET)
+    X = app.scale_features(df[app.feature_columns].iloc[:100].to_numpy(dtype=float))
+    full = app.ensemble_proba(X)
+    
+    cascade = EarlyExitCascade([5, 20], margin_threshold=1.1)
+    stages = app.cascade_stage_fns(cascade)
+    # A margin above 1 can never be reached, so every row must get the full ensemble's answer,
+    # resumed from the margins the earlier stages carried
+    proba, exit_stage = cascade.run(X, stages)
+    assert np.array_equal(proba, full) and exit_stage.min() == 2, "Unconfident rows did not reach the full ensemble!"
+    
+    # Margins carried from the first stage give the same prefix probabilities as scoring from round 0
+    member = app.models[0]
+    resumed, _ = staged_proba(member, X, 5, 20, staged_proba(member, X, 0, 5)[1])
+    assert np.allclose(resumed, staged_proba(member, X, 0, 20)[0]), \
+        "Resumed stage differs from scoring the prefix from the first round!"
+    
+    # A zero margin exits every row at the first stage
+    _, exit_stage = cascade.run(X, stages, margin_threshold=0.0)
+    stats = cascade.stats(full_rounds=app.cascade_full_rounds())
+    assert exit_stage.max() == 0 and stats['rows'] == 200 and 0 < stats['cost_vs_full'] < 1, \
+        f"Confident rows did not exit early: {stats}"
+    
+    print("✅ Cascade exits early when confident and falls back to the full ensemble")
+
+def test_model_registry():
+    """Test version detection, validation gating and swapping in the model registry"""
+    print("\nTesting model registry...")
+    import tempfile
+    from model_registry import ModelRegistry
+    
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, 'v1'))
+        with open(os.path.join(root, 'v1', 'model.pkl'), 'w') as f:
+            f.write('good')
+        
+        def load(path):
+            with open(os.path.join(path, 'model.pkl')) as f:
+                return {'dir': path, 'content': f.read()}
+        
+        live, other_live = {}, {}
+        registry = ModelRegistry(root, load_fn=load, validate_fn=lambda state: {'ok': state['content'] == 'good'},
+                                 activate_fn=live.update)
+        # A second server process with its own registry over the same directory
+        other = ModelRegistry(root, load_fn=load, validate_fn=lambda state: {'ok': state['content'] == 'good'},
+                              activate_fn=other_live.update)
+        
+        assert registry.check(debounce=False)['status'] == 'active' and live['dir'].endswith('v1'), \
+            "First version was not activated!"
+        other.check(debounce=False)
+        assert registry.check()['status'] == 'unchanged', "Unchanged version was reloaded!"
+        
+        # A newer version that fails validation must not replace the active one
+        os.makedirs(os.path.join(root, 'v2'))
+        with open(os.path.join(root, 'v2', 'model.pkl'), 'w') as f:
+            f.write('bad')
+        assert registry.check()['status'] == 'pending' and registry.check()['status'] == 'rejected', \
+            "Invalid version was not debounced and rejected!"
+        assert live['dir'].endswith('v1') and registry.active['version'].startswith('v1@'), \
+            "Rejected version replaced the active one!"
+        
+        # A reload requested in one process is followed by the others on their next request
+        os.makedirs(os.path.join(root, 'v3'))
+        with open(os.path.join(root, 'v3', 'model.pkl'), 'w') as f:
+            f.write('good')
+        result = registry.request_reload()
+        assert result['status'] == 'active' and result['broadcast'], f"Reload was not broadcast: {result}"
+        assert other_live['dir'].endswith('v1'), "Other process reloaded before its next request"
+        other.sync()
+        assert other_live['dir'].endswith('v3') and other.active['version'] == registry.active['version'], \
+            "Other process did not follow the broadcast reload!"
+        other.sync()
+        assert len(other.history) == 2, "A seen broadcast was applied twice"
+        workers = registry.status()['workers']
+        assert [w['pid'] for w in workers] == [os.getpid()] and workers[0]['version'].startswith('v3@'), \
+            f"Worker versions not reported: {workers}"
+    
+    print("✅ Registry activates new versions and rejects ones that fail validation")
+
+def test_dataset_cache():
+    """Test that DatasetStore parses the CSV once and reloads only when the file changes"""
+    print("\nTesting dataset cache...")
+    import tempfile
+    from dataset_store import DatasetStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'reference.csv')
+        frame = pd.DataFrame({'bytes': [1.0, 2.0, 3.0], 'packets': [4.0, 5.0, 6.0],
+                              'device_category': ['TV', 'watch', 'TV']})
+        frame.to_csv(path, index=False)
+        store = DatasetStore(path, mmap_dir=os.path.join(tmp, 'missing'))
+        
+        parses = []
+        load_csv = store._load_csv
+        store._load_csv = lambda: parses.append(1) or load_csv()
+        
+        first = store.get_frame()
+        assert store.get_frame() is first and len(parses) == 1, f"Second load re-read the CSV ({len(parses)} parses)"
+        assert store.info()['category_counts'] == {'TV': 2, 'watch': 1} and len(parses) == 1, \
+            "Summary did not come from the cached frame"
+        
+        # A rewritten file (new mtime) is picked up on the next access
+        pd.concat([frame, frame.iloc[:1]]).to_csv(path, index=False)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert len(store.get_frame()) == 4 and len(parses) == 2, "Changed CSV was not reloaded"
+        assert store.get_frame() is store.get_frame() and len(parses) == 2, "Reloaded frame is not cached"
+    
+    print("✅ Dataset store parses the CSV once per file version")
+
+def test_preprocessing_artifact():
+    """Test that the scaler/schema .npz round-trips to identical transforms and rejects bad files"""
+    print("\nTesting preprocessing artifact...")
+    import tempfile
+    from preprocessing import fit_preprocessing, save_preprocessing, load_preprocessing
+    
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(rng.normal(50, 20, (200, 4)), columns=['bytes', 'packets', 'ttl', 'rtt'])
+    frame['device_category'] = rng.choice(['TV', 'watch'], 200)
+    scaler, columns = fit_preprocessing(frame)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'preprocessing.npz')
+        save_preprocessing(path, scaler, columns)
+        loaded, loaded_columns = load_preprocessing(path)
+        assert loaded_columns == ['bytes', 'packets', 'ttl', 'rtt'], f"Feature schema changed: {loaded_columns}"
+        X = pd.DataFrame(rng.normal(50, 20, (50, 4)), columns=columns)
+        assert np.array_equal(loaded.transform(X.to_numpy()), scaler.transform(X)), "Loaded scaler transforms differently!"
+        assert np.array_equal(loaded.inverse_transform(X.to_numpy()), scaler.inverse_transform(X)), \
+            "Loaded scaler inverts differently!"
+        
+        # An artifact whose statistics do not match its schema is refused
+        save_preprocessing(path, scaler, columns[:3])
+        try:
+            load_preprocessing(path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Inconsistent artifact was accepted")
+    
+    print("✅ Preprocessing artifact round-trips to identical transforms")
+
+def test_mmap_dataset():
+    """Test that the memory-mapped reference layout serves the same data as the CSV"""
+    print("\nTesting memory-mapped dataset store...")
+    require_dataset()
+    import tempfile
+    from dataset_store import DatasetStore, convert_to_mmap
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        mmap_dir = os.path.join(tmp, 'reference.mmap')
+        convert_to_mmap(DATASET, mmap_dir, chunk_size=3000)
+        
+        mapped = DatasetStore(mmap_dir=mmap_dir)
+        parsed = DatasetStore(mmap_dir=os.path.join(tmp, 'missing'))
+        assert mapped.backend == 'mmap' and mapped.info() == parsed.info(), "Memory-mapped summary differs from the CSV!"
+        
+        idx = mapped.stratified_indices(90)
+        a, b = mapped.rows(idx), parsed.rows(idx)
+        assert (a['device_category'] == b['device_category']).all() and \
+            np.allclose(a.drop(columns='device_category'), b.drop(columns='device_category'), rtol=1e-6), \
+            "Memory-mapped rows differ from the CSV!"
+        
+        category = a['device_category'].iloc[0]
+        assert mapped.sample(category)[1] == category, "Stratified sample returned the wrong category!"
+    
+    print("✅ Memory-mapped store matches the CSV")
+
+def test_chatbot_intents():
+    """Test the compiled intent index: substring matching, priority order and class changes"""
+    print("\nTesting chatbot intent index...")
+    import app
+    
+    expectations = {
+        'Tell me about smart lights': app.chatbot_knowledge['device_info']['lights'],
+        'is the baby monitor secure?': app.chatbot_knowledge['device_info']['baby_monitor'],
+        'how good is your model accuracy': None,  # 'features' is listed before 'accuracy'
+        'what is the DATASET size': app.CHAT_FIXED_RESPONSES['dataset']
+    }
+    for message, expected in expectations.items():
+        reply = app.get_chatbot_response(message)
+        expected_set = app.chatbot_knowledge['features'] if expected is None else [expected]
+        assert reply in expected_set, f"Unexpected reply to '{message}': {reply}"
+    
+    # A class added by a reloaded model gets its own intent
+    original = app.device_categories
+    try:
+        app.device_categories = list(original) + ['printer']
+        assert 'printer devices' in app.get_chatbot_response('what about my printer'), \
+            "Intent index was not rebuilt for new device categories!"
+    finally:
+        app.device_categories = original
+    
+    hits = app.chat_intent.cache_info().hits
+    app.get_chatbot_response('Tell me about smart lights')
+    assert app.chat_intent.cache_info().hits == hits + 1, "Repeated question was not memoized!"
+    
+    print("✅ Chatbot intents resolved in priority order and memoized")
+
+def test_member_dedup():
+    """Test that byte-identical model files load once and count as a weighted member"""
+    print("\nTesting ensemble member deduplication...")
+    import pickle
+    import tempfile
+    import app
+    from sklearn.linear_model import LogisticRegression
+    
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(120, 4))
+    y = rng.integers(0, 3, 120)
+    first = LogisticRegression(max_iter=500).fit(X, y)
+    second = LogisticRegression(C=0.01, max_iter=500).fit(X, y)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, obj in (('a.pkl', first), ('b.pkl', first), ('c.pkl', second),
+                          ('label_encoder.pkl', first), ('notes.pkl', {'not': 'a model'})):
+            with open(os.path.join(tmp, name), 'wb') as f:
+                pickle.dump(obj, f)
+        members, weights, report = app.load_ensemble_members(tmp)
+    
+    assert len(members) == 2 and weights == [2, 1], f"Identical files were not merged: weights={weights}"
+    assert [entry['files'] for entry in report] == [['a.pkl', 'b.pkl'], ['c.pkl']], f"Unexpected report: {report}"
+    assert report[0]['sha256'] != report[1]['sha256'] and all(entry['weight'] == w for entry, w in zip(report, weights)), \
+        "Report digests or weights are wrong"
+    
+    # The weighted member scores like the duplicated files did
+    saved = (app.models, app.model_weights, app.device_categories)
+    try:
+        app.models, app.model_weights, app.device_categories = members, weights, ['x', 'y', 'z']
+        merged = app.ensemble_proba(X)
+    finally:
+        app.models, app.model_weights, app.device_categories = saved
+    expected = (2 * first.predict_proba(X) + second.predict_proba(X)) / 3
+    assert np.allclose(merged, expected), "Weighted member differs from scoring each file!"
+    
+    print("✅ Identical model files load once and keep their weight")
+
+def test_native_backend():
+    """Test that native booster members match the sklearn wrapper, honour best_iteration and set nthread"""
+    print("\nTesting native booster backend...")
+    import json
+    import xgboost as xgb
+    from sklearn.linear_model import LogisticRegression
+    from booster_backend import NativeBoosterMember, to_native_members
+    
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 5))
+    y = (X[:, 0] > 0).astype(int) + (X[:, 1] + rng.normal(scale=0.5, size=300) > 0)
+    model = xgb.XGBClassifier(n_estimators=80, max_depth=2, early_stopping_rounds=3)
+    model.fit(X[:200], y[:200], eval_set=[(X[200:], y[200:])], verbose=False)
+    other = LogisticRegression(max_iter=500).fit(X, y)
+    
+    native, kept = to_native_members([model, other], nthread=2)
+    assert isinstance(native, NativeBoosterMember) and kept is other, "Only booster members should be converted"
+    assert native.n_rounds == model.best_iteration + 1, f"Native member uses {native.n_rounds} rounds"
+    assert np.allclose(native.predict_proba(X), model.predict_proba(X), atol=1e-6), "Native proba differs from sklearn!"
+    assert np.allclose(native.predict_proba(X, iteration_range=(0, 5)),
+                       model.predict_proba(X, iteration_range=(0, 5)), atol=1e-6), "Iteration range ignored!"
+    
+    config = json.loads(native.booster.save_config())['learner']['generic_param']
+    assert config['nthread'] == '2', f"nthread not applied: {config['nthread']}"
+    native.set_nthread(1)
+    config = json.loads(native.booster.save_config())['learner']['generic_param']
+    assert config['nthread'] == '1', f"nthread not updated: {config['nthread']}"
+    
+    print(f"✅ Native booster matches the sklearn wrapper over {native.n_rounds} rounds")
+
+def test_parallel_members():
+    """Test that scoring members on the thread pool matches scoring them one after another"""
+    print("\nTesting parallel member evaluation...")
+    require_dataset()
+    import threading
+    import app
+    
+    assert app.load_model(), "Model loading failed!"
+    
+    df = pd.read_csv(DATASET)
+    X = app.scale_features(df[app.feature_columns].iloc[:300].to_numpy(dtype=float))
+    saved = (app.models, app.model_weights, app.model_names, app.PARALLEL_MEMBERS, app.PARALLEL_MIN_ROWS)
+    threads = set()
+    
+    def member_proba(m, Xs):
+        threads.add(threading.current_thread().name)
+        return m.predict_proba(Xs)
+    
+    try:
+        # Three weighted copies of the loaded members form a larger ensemble
+        app.models = list(saved[0]) * 3
+        app.model_weights = [1, 2, 3] * len(saved[0])
+        app.model_names = [f'member_{i}' for i in range(len(app.models))]
+        app.PARALLEL_MEMBERS, app.PARALLEL_MIN_ROWS = 0, 1
+        sequential = app.ensemble_proba(X)
+        app.PARALLEL_MEMBERS = 3
+        parallel = app.ensemble_proba(X, member_proba)
+    finally:
+        app.models, app.model_weights, app.model_names, app.PARALLEL_MEMBERS, app.PARALLEL_MIN_ROWS = saved
+    
+    assert np.array_equal(sequential, parallel), "Parallel ensemble probabilities differ from sequential ones!"
+    assert any(name.startswith('ensemble-member') for name in threads), "Members were not scored on the thread pool!"
+    
+    print(f"✅ Parallel evaluation on {len(threads)} threads matches sequential scoring")
+
+def test_binned_inference():
+    """Test that uint8 split-bin inference matches the float64 path and float32 stays in agreement"""
+    print("\nTesting float32 and binned inference...")
+    require_dataset()
+    import app
+    from binned_forest import bin_ensemble, compile_member
+    
+    assert app.load_model(), "Model loading failed!"
+    
+    df = pd.read_csv(DATASET)
+    X = df[app.feature_columns].iloc[:500].to_numpy(dtype=float)
+    X[::7, ::5] = np.nan  # missing values take each split's default direction
+    forests = [compile_member(m) for m in app.models]
+    binner, binned = bin_ensemble(forests, app.scaler.mean_, app.scaler.scale_)
+    
+    codes = binner.transform(X)
+    assert codes.dtype == np.uint8 and codes.shape == (X.shape[0], binner.used.shape[0]), \
+        f"Unexpected bin codes: {codes.dtype} {codes.shape}"
+    X_scaled = app.scaler.transform(X)
+    for forest, binned_forest in zip(forests, binned):
+        assert np.array_equal(forest.predict_proba(X_scaled), binned_forest.predict_proba(codes)), \
+            "Binned predictions differ from float64 predictions!"
+    
+    # float32 end to end: same classes, probabilities within float32 rounding
+    X = np.nan_to_num(X)
+    full = np.asarray(forests[0].predict_proba(app.scaler.transform(X)))
+    X32 = X.astype(np.float32)
+    mean32, scale32 = app.scaler.mean_.astype(np.float32), app.scaler.scale_.astype(np.float32)
+    single = np.asarray(forests[0].predict_proba((X32 - mean32) / scale32))
+    assert np.mean(single.argmax(axis=1) == full.argmax(axis=1)) >= 0.99 and np.abs(single - full).max() < 1e-3, \
+        "float32 predictions disagree with float64 predictions!"
+    
+    # Binned mode is an option of the compiled backend only
+    precision, backend = app.INFERENCE_PRECISION, app.INFERENCE_BACKEND
+    model_dir = app.resolve_model_dir(os.path.join(os.getcwd(), app.MODEL_ROOT))
+    try:
+        app.INFERENCE_PRECISION, app.INFERENCE_BACKEND = 'binned', 'sklearn'
+        try:
+            app.load_model_state(model_dir)
+            raise AssertionError("Binned mode was accepted without the compiled backend")
+        except RuntimeError:
+            pass
+        # Reloading the same model in binned mode must agree with the active binned models
+        app.INFERENCE_BACKEND = 'compiled'
+        app.activate_model_state(app.load_model_state(model_dir))
+        validation = app.validate_model_state(app.load_model_state(model_dir))
+    finally:
+        app.INFERENCE_PRECISION, app.INFERENCE_BACKEND = precision, backend
+        app.load_model()
+    assert validation['ok'] and validation.get('agreement_with_active') == 1.0 \
+        and validation.get('accuracy') == validation.get('active_accuracy'), \
+        f"Binned reload of the same model disagrees with the active one: {validation}"
+    
+    print(f"✅ Binned inference matches float64 exactly ({binner.n_edges} bin edges over {binner.used.shape[0]} features)")
+
+def test_drift_monitor():
+    """Test that the drift monitor stays quiet on reference traffic and flags a shifted feature"""
+    print("\nTesting drift monitor...")
+    require_dataset()
+    import app
+    from drift_monitor import DriftMonitor
+    from prediction_cache import PredictionCache
+    
+    assert app.load_model(), "Model loading failed!"
+    
+    df = pd.read_csv(DATASET)
+    X = app.scaler.transform(df[app.feature_columns].to_numpy(dtype=float))
+    labels = df['device_category'].map({c: i for i, c in enumerate(app.device_categories)}).fillna(-1).astype(int)
+    monitor = DriftMonitor.from_reference(X[::2], labels.to_numpy()[::2], app.feature_columns,
+                                          app.device_categories, batch_rows=64)
+    
+    # Live rows from the other half, in uneven chunks so single rows, buffers and batches all fold
+    live, live_labels = X[1::2][:3000], labels.to_numpy()[1::2][:3000].clip(0)
+    for start, end in zip([0, 1, 2, 50, 700], [1, 2, 50, 700, 3000]):
+        monitor.observe(live[start:end], live_labels[start:end])
+    quiet = monitor.report()
+    assert quiet['rows_seen'] == 3000 and quiet['overall']['features_significant'] == 0, \
+        f"Reference traffic reported as drifting: {quiet['overall']}"
+    
+    monitor.reset()
+    shifted = live.copy()
+    column = app.feature_columns.index(quiet['overall']['top_features'][0]['feature'])
+    shifted[:, column] += 3.0
+    monitor.observe(shifted, live_labels)
+    top = monitor.report(top=1)['overall']['top_features'][0]
+    assert top['feature'] == app.feature_columns[column] and top['psi'] >= 0.25 and abs(top['mean_shift']) >= 1.0, \
+        f"Shifted feature not flagged: {top}"
+    
+    # Served rows are observed whether they were scored or answered from the prediction cache
+    saved = app.prediction_cache, app.drift_monitor, app.drift_columns
+    try:
+        app.prediction_cache = PredictionCache(maxsize=1000)
+        app.drift_monitor = DriftMonitor.from_scaler(app.feature_columns, app.device_categories, batch_rows=64)
+        app.drift_columns = None
+        rows = df[app.feature_columns].iloc[:100].to_numpy(dtype=float)
+        app.predict_proba_rows(rows)
+        app.predict_proba_rows(rows)
+        cached = app.drift_monitor.report()
+    finally:
+        app.prediction_cache, app.drift_monitor, app.drift_columns = saved
+    assert cached['rows_seen'] == 200 and cached['overall']['rows'] == 200, \
+        f"Cache hits were not observed: {cached['rows_seen']} rows seen for 200 served"
+    
+    print(f"✅ Drift monitor flags a shifted feature (PSI {top['psi']:.2f}) and stays quiet otherwise")
+
+# Series tests in the order main() runs them, with their summary labels
+ASSERTING_TESTS = [
+    ('Factory', test_app_factory),
+    ('Batch', test_batch_prediction),
+    ('Cache', test_prediction_cache),
+    ('Compile', test_compiled_forest),
+    ('Batcher', test_micro_batching),
+    ('Metrics', test_metrics_endpoint),
+    ('Binary', test_binary_format),
+    ('Bulk', test_bulk_cli),
+    ('Jobs', test_job_queue),
+    ('Restart', test_job_recovery),
+    ('Stream', test_flow_aggregator),
+    ('Pruning', test_feature_pruning),
+    ('Cascade', test_cascade),
+    ('Reload', test_model_registry),
+    ('Dataset', test_dataset_cache),
+    ('Preproc', test_preprocessing_artifact),
+    ('Mmap', test_mmap_dataset),
+    ('Chatbot', test_chatbot_intents),
+    ('Dedup', test_member_dedup),
+    ('Native', test_native_backend),
+    ('Members', test_parallel_members),
+    ('Binned', test_binned_inference),
+    ('Drift', test_drift_monitor)
+]
+
 def main():
     """Run all tests"""
     print("=" * 50)
@@ -97,13 +1032,18 @@ def main():
     # Test model
     model_ok = test_model_loading()
     
+    # Test serving, inference paths and supporting components
+    results = [(label, run_test(test)) for label, test in ASSERTING_TESTS]
+    
     print("\n" + "=" * 50)
     print("Test Results Summary")
     print("=" * 50)
     print(f"Dataset: {'✅ PASS' if dataset_ok else '❌ FAIL'}")
     print(f"Model:   {'✅ PASS' if model_ok else '❌ FAIL'}")
+    for label, ok in results:
+        print(f"{label + ':':<9}{'✅ PASS' if ok else '❌ FAIL'}")
     
-    if dataset_ok and model_ok:
+    if dataset_ok and model_ok and all(ok for _, ok in results):
         print("\n🎉 All tests passed! The application is ready to run.")
         print("\nTo start the web application, run:")
         print("   python app.py")
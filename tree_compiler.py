@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Array-backed tree ensemble predictor for the IoT Device Identification System
+Flattens an XGBoost gbtree model (e.g. best_xgb_model.json) into contiguous NumPy
+arrays and evaluates whole batches level-by-level with vectorized gathers.
+Needs only NumPy at serving time, so it suits small, fork-heavy containers.
+
+Usage:
+    python tree_compiler.py [--model best_xgb_model.json] [--output "trained model final/compiled_forest.npz"] [--verify]
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+COMPILED_ARTIFACT_NAME = 'compiled_forest.npz'
+
+# How each supported objective maps its stored base_score (output space) to a margin
+_IDENTITY_OBJECTIVES = ('multi:softprob', 'multi:softmax', 'binary:logitraw',
+                        'reg:squarederror', 'reg:linear', 'reg:pseudohubererror', 'reg:absoluteerror')
+_LOGIT_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+_LOG_OBJECTIVES = ('count:poisson', 'reg:gamma', 'reg:tweedie')
+
+
+def _parse_base_score(value, n_groups):
+    """Parse base_score, stored as '5E-1' or '[5E-1,5E-1,...]' depending on the xgboost version"""
+    text = str(value).strip().strip('[]')
+    scores = np.array([float(v) for v in text.split(',') if v.strip()], dtype=np.float32)
+    if scores.size == 1:
+        scores = np.repeat(scores, n_groups)
+    return scores
+
+
+def _base_margin(base_score, objective):
+    """Margin-space base score; xgboost stores base_score in the objective's output space"""
+    if objective is None or objective in _IDENTITY_OBJECTIVES:
+        return base_score
+    if objective in _LOGIT_OBJECTIVES:
+        return (-np.log(1.0 / base_score.astype(np.float64) - 1.0)).astype(np.float32)
+    if objective in _LOG_OBJECTIVES:
+        return np.log(base_score.astype(np.float64)).astype(np.float32)
+    raise ValueError(f"Objective '{objective}' is not supported by the compiled predictor")
+
+
+class CompiledForest:
+    """Tree ensemble stored as flat node arrays (all trees concatenated)"""
+
+    def __init__(self, split_feature, threshold, left, right, default_left, is_leaf,
+                 roots, tree_group, iteration_indptr, base_score, max_depth, num_feature):
+        self.split_feature = split_feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.is_leaf = is_leaf
+        self.roots = roots
+        self.tree_group = tree_group
+        self.iteration_indptr = iteration_indptr
+        self.base_score = base_score
+        self.max_depth = int(max_depth)
+        self.num_feature = int(num_feature)
+        self.n_groups = int(base_score.shape[0])
+        # Interleaved (left, right) pairs so each level needs a single child gather
+        self._children = np.column_stack([left, right]).astype(np.intp).ravel()
+        # num_parallel_tree > 1 puts several trees of one group in a round
+        rounds = np.repeat(np.arange(self.n_rounds), np.diff(iteration_indptr))
+        round_group = rounds * self.n_groups + tree_group[:rounds.shape[0]]
+        self._repeated_groups = np.unique(round_group).shape[0] != round_group.shape[0]
+
+    @property
+    def n_trees(self):
+        return int(self.roots.shape[0])
+
+    @property
+    def n_rounds(self):
+        return int(self.iteration_indptr.shape[0] - 1)
+
+    def used_features(self):
+        """Sorted indices of the features some split node reads"""
+        return np.unique(self.split_feature[~self.is_leaf])
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self._ARRAYS)
+
+    _ARRAYS = ('split_feature', 'threshold', 'left', 'right', 'default_left', 'is_leaf',
+               'roots', 'tree_group', 'iteration_indptr', 'base_score')
+
+    @classmethod
+    def from_dict(cls, model, n_rounds=None):
+        """Compile a parsed xgboost JSON model, keeping only its first n_rounds boosting rounds if given"""
+        learner = model['learner']
+        booster = learner['gradient_booster']
+        if booster.get('name') != 'gbtree':
+            raise ValueError(f"Only gbtree models can be compiled, got '{booster.get('name')}'")
+        gbtree = booster['model']
+        trees = gbtree['trees']
+        n_groups = max(int(learner['learner_model_param'].get('num_class', '0')), 1)
+        tree_group = np.asarray(gbtree.get('tree_info', [0] * len(trees)), dtype=np.int32)
+        iteration_indptr = gbtree.get('iteration_indptr')
+        if iteration_indptr is None:
+            # Older models: one tree per output group per round
+            iteration_indptr = list(range(0, len(trees) + 1, n_groups))
+        iteration_indptr = np.asarray(iteration_indptr, dtype=np.int32)
+        if n_rounds is not None and 0 < n_rounds < iteration_indptr.shape[0] - 1:
+            iteration_indptr = iteration_indptr[:n_rounds + 1]
+            trees = trees[:iteration_indptr[-1]]
+            tree_group = tree_group[:iteration_indptr[-1]]
+        objective = learner.get('objective', {}).get('name')
+        base_score = _base_margin(_parse_base_score(learner['learner_model_param']['base_score'], n_groups), objective)
+
+        split_feature, threshold, left, right, default_left, is_leaf, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for tree in trees:
+            if any(tree.get('split_type', [])):
+                raise ValueError("Categorical splits are not supported by the compiled predictor")
+            tree_left = np.asarray(tree['left_children'], dtype=np.int32)
+            tree_right = np.asarray(tree['right_children'], dtype=np.int32)
+            n_nodes = tree_left.shape[0]
+            leaf = tree_left == -1
+            node_ids = np.arange(n_nodes, dtype=np.int32)
+
+            # Leaves point at themselves so extra levels leave finished rows in place
+            left.append(np.where(leaf, node_ids, tree_left) + offset)
+            right.append(np.where(leaf, node_ids, tree_right) + offset)
+            split_feature.append(np.where(leaf, 0, np.asarray(tree['split_indices'], dtype=np.int32)))
+            # For leaves xgboost stores the leaf value in split_conditions
+            threshold.append(np.asarray(tree['split_conditions'], dtype=np.float32))
+            default_left.append(np.asarray(tree['default_left'], dtype=bool))
+            is_leaf.append(leaf)
+            roots.append(offset)
+
+            depth = np.zeros(n_nodes, dtype=np.int32)
+            for node in range(n_nodes):
+                if not leaf[node]:
+                    depth[tree_left[node]] = depth[node] + 1
+                    depth[tree_right[node]] = depth[node] + 1
+            max_depth = max(max_depth, int(depth.max()))
+            offset += n_nodes
+
+        return cls(
+            split_feature=np.concatenate(split_feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float32),
+            left=np.concatenate(left).astype(np.int32),
+            right=np.concatenate(right).astype(np.int32),
+            default_left=np.concatenate(default_left),
+            is_leaf=np.concatenate(is_leaf),
+            roots=np.asarray(roots, dtype=np.int32),
+            tree_group=tree_group,
+            iteration_indptr=iteration_indptr,
+            base_score=base_score,
+            max_depth=max_depth,
+            num_feature=int(learner['learner_model_param']['num_feature'])
+        )
+
+    @classmethod
+    def from_json(cls, path):
+        """Compile a model file written by Booster.save_model(...json)"""
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_booster(cls, booster, n_rounds=None):
+        """Compile an in-memory xgboost.Booster (requires xgboost)"""
+        return cls.from_dict(json.loads(bytes(booster.save_raw(raw_format='json'))), n_rounds)
+
+    @classmethod
+    def from_model(cls, model):
+        """Compile the booster behind a pickled sklearn-wrapper model"""
+        # Match the sklearn wrapper, which stops at best_iteration when early stopping was used
+        best_iteration = getattr(model, 'best_iteration', None)
+        return cls.from_booster(model.get_booster(), best_iteration + 1 if best_iteration is not None else None)
+
+    def save(self, path):
+        """Write the compiled arrays to an .npz file"""
+        np.savez(path, max_depth=self.max_depth, num_feature=self.num_feature,
+                 **{name: getattr(self, name) for name in self._ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        """Load a compiled forest written by save(); needs NumPy only"""
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in cls._ARRAYS}
+            return cls(max_depth=int(data['max_depth']), num_feature=int(data['num_feature']), **arrays)
+
+    def _tree_slice(self, iteration_range):
+        """Return (first_tree, last_tree, first_round, last_round) for an iteration range"""
+        begin, end = iteration_range if iteration_range else (0, 0)
+        if end <= 0 or end > self.n_rounds:
+            end = self.n_rounds
+        return int(self.iteration_indptr[begin]), int(self.iteration_indptr[end]), begin, end
+
+    def predict_leaves(self, X, iteration_range=None):
+        """Return the leaf node index reached in every tree, shape (n_rows, n_trees)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        first, last, _, _ = self._tree_slice(iteration_range)
+
+        n_rows = X.shape[0]
+        node = np.broadcast_to(self.roots[first:last].astype(np.intp), (n_rows, last - first)).copy()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * X.shape[1])[:, None]
+        flat_X = X.ravel()
+        children = self._children
+
+        for _ in range(self.max_depth):
+            fvalue = np.take(flat_X, row_offsets + np.take(self.split_feature, node))
+            go_right = ~(fvalue < np.take(self.threshold, node))
+            # Missing values follow the learned default direction
+            missing = np.isnan(fvalue)
+            if missing.any():
+                go_right[missing] = ~np.take(self.default_left, node[missing])
+            node = np.take(children, 2 * node + go_right)
+        return node
+
+    def predict_margin(self, X, iteration_range=None, base_margin=None):
+        """Return raw margins with shape (n_rows, n_groups), summed in float32 in tree order like xgboost
+
+        base_margin replaces base_score as the starting margin, e.g. the margins of earlier rounds.
+        """
+        first, last, begin, end = self._tree_slice(iteration_range)
+        leaf_values = self.threshold[self.predict_leaves(X, iteration_range)]
+
+        margin = np.empty((leaf_values.shape[0], self.n_groups), dtype=np.float32)
+        margin[:] = self.base_score if base_margin is None else np.reshape(base_margin, margin.shape)
+        for it in range(begin, end):
+            lo, hi = self.iteration_indptr[it], self.iteration_indptr[it + 1]
+            if self._repeated_groups:
+                # A fancy-indexed += would keep only one tree per repeated group
+                for tree in range(lo, hi):
+                    margin[:, self.tree_group[tree]] += leaf_values[:, tree - first]
+            else:
+                margin[:, self.tree_group[lo:hi]] += leaf_values[:, lo - first:hi - first]
+        return margin
+
+    def predict_proba(self, X, iteration_range=None, base_margin=None):
+        """Return softmax class probabilities with shape (n_rows, n_classes)"""
+        margin = self.predict_margin(X, iteration_range, base_margin)
+        if self.n_groups == 1:
+            p = 1.0 / (1.0 + np.exp(-margin[:, 0]))
+            return np.column_stack([1.0 - p, p])
+        margin = margin - margin.max(axis=1, keepdims=True)
+        proba = np.exp(margin)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+
+def verify_against_booster(forest, model_path, n_rows=2000, seed=0):
+    """Return the max absolute margin difference between the forest and xgboost"""
+    import xgboost as xgb
+
+    booster = xgb.Booster()
+    booster.load_model(model_path)
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n_rows, forest.num_feature)).astype(np.float32)
+    X[rng.random(X.shape) < 0.01] = np.nan
+    expected = booster.inplace_predict(X, predict_type='margin', validate_features=False)
+    return float(np.abs(forest.predict_margin(X) - expected.reshape(n_rows, -1)).max())
+
+
+def main(argv=None):
+    """Compile an xgboost JSON model into a NumPy-only .npz artifact"""
+    parser = argparse.ArgumentParser(description="Compile an XGBoost JSON model into flat NumPy arrays")
+    parser.add_argument('--model', default='best_xgb_model.json', help="xgboost JSON model to compile")
+    parser.add_argument('--output', default=os.path.join('trained model final', COMPILED_ARTIFACT_NAME),
+                        help="destination .npz file")
+    parser.add_argument('--verify', action='store_true', help="check margins against xgboost (needs xgboost)")
+    args = parser.parse_args(argv)
+
+    forest = CompiledForest.from_json(args.model)
+    forest.save(args.output)
+    print(f"✅ Compiled {forest.n_trees} trees ({forest.n_rounds} rounds × {forest.n_groups} classes, "
+          f"max depth {forest.max_depth}) into {args.output} ({forest.nbytes:,} bytes)")
+
+    if args.verify:
+        diff = verify_against_booster(forest, args.model)
+        print(f"{'✅' if diff == 0 else '❌'} Max margin difference vs xgboost: {diff:.3e}")
+        return 0 if diff == 0 else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())